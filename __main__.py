@@ -1,13 +1,19 @@
 #!/usr/bin/env python
 
 import sys
-from PyQt5.QtWidgets import QApplication
-from gui import NoiserGUI
 
 def main():
     """
-        Runs the Noisr singleton instance
+        Runs the Noisr singleton instance, or a headless acquisition when given --headless
+        (see `python . --headless --help`)
     """
+    if '--headless' in sys.argv[1:]:
+        import headless     # keeps PyQt5 and pyqtgraph out of unattended captures
+        headless.main()
+        return
+
+    from PyQt5.QtWidgets import QApplication
+    from gui import NoiserGUI
 
     App = QApplication(sys.argv)
     Noisr = NoiserGUI()
@@ -16,4 +22,4 @@ def main():
     sys.exit(App.exec_())
 
 if  __name__ == '__main__':
-    main()
\ No newline at end of file
+    main()
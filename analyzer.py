@@ -1,12 +1,75 @@
+import time
+import numpy as np
 import pyqtgraph as pg
 
+from PyQt5.QtCore import (
+        Qt, QAbstractTableModel, QModelIndex
+        )
 from PyQt5.QtWidgets import (
-        QTableWidget, QTableWidgetItem
+        QTableView, QHeaderView
         )
 
+######################################################################
+# Rendering modes (settings.performance)
+#
+#   'full'      every buffered sample is drawn, every block
+#   'high'      the visible window is min/max decimated to the plot width and
+#               redrawn at most at the screen refresh rate
+#   'essential' same decimation, at most ESSENTIAL_FRAME_RATE redraws per second
+#
+# Decimation keeps the extremes of the samples under each pixel column, so
+# spikes stay visible however many samples the window holds.
+######################################################################
+
+PERFORMANCE_MODES = ('full', 'high', 'essential')
+ESSENTIAL_FRAME_RATE = 10
+
+
+def minMaxDecimate(times, values, connect, bucket: int):
+    """
+        Keeps the smallest and largest sample of every @bucket consecutive ones, in time order
+        (the samples left over at the end are kept as they are)
+
+        Returns:
+            The decimated times, values and connect mask (a bucket holding a gap is not
+            connected to the next one)
+    """
+    n = len(values)
+    m = n // bucket
+    if m < 2:
+        return times, values, connect
+    head = values[:m * bucket].reshape(m, bucket)
+    low, high = head.argmin(axis=1), head.argmax(axis=1)
+    offsets = np.arange(m) * bucket
+    index = np.column_stack((np.minimum(low, high) + offsets, np.maximum(low, high) + offsets)).ravel()
+    index = np.concatenate((index, np.arange(m * bucket, n)))
+
+    joined = np.repeat(connect[:m * bucket].reshape(m, bucket).all(axis=1), 2)
+    return times[index], values[index], np.concatenate((joined, connect[m * bucket:]))
+
+
 class Plotter(pg.PlotWidget):
-    def __init__(self):
+    def __init__(self, performance: str='high', refresh_rate: float=60.):
+        """
+            Args:
+                performance: rendering mode, one of PERFORMANCE_MODES
+                refresh_rate: redraws per second of the screen, the cap of the 'high' mode
+        """
         super(Plotter, self).__init__(useOpenGL=True)
+        if performance not in PERFORMANCE_MODES:
+            raise ValueError(f'Unknown performance mode {performance}, choose from {PERFORMANCE_MODES}')
+        self.performance = performance
+        self.decimate = performance != 'full'
+        self.frame_interval = {
+            'full': 0.,
+            'high': 1 / refresh_rate,
+            'essential': 1 / ESSENTIAL_FRAME_RATE}[performance]
+        self.last_frame = 0.
+        self.x_range = None
+        self.y_range = None
+        self.capture = None     # capture browsed through its overview, see browse()
+        self.overview = None
+        self.browse_curves = []
 
         self.setLabel('left', 'Voltage', units='V', size='18pt')
         self.setLabel('bottom', 'Time', units='s', size='18pt')
@@ -18,12 +81,290 @@ class Plotter(pg.PlotWidget):
         vb.setAspectLocked(lock = False)
         vb.setAutoVisible(y = 1.0)
         vb.enableAutoRange(axis = 'y', enable = True)
+        vb.sigXRangeChanged.connect(self.showCapture)
+
+    def frameDelay(self) -> float:
+        """
+            Returns:
+                Seconds left before the next redraw is allowed (0 if it is due)
+        """
+        return max(0., self.last_frame + self.frame_interval - time.monotonic())
+
+    def firstVisible(self, n: int, display_memory: int) -> int:
+        """
+            Returns:
+                Index of the first of @n buffered samples worth drawing when the last
+                @display_memory are shown
+        """
+        return max(0, n - display_memory) if self.decimate else 0
+
+    def drawCurve(self, curve, times, values, connect):
+        """
+            Sets the samples of @curve, decimated to the plot width unless in 'full' mode
+            (non-finite values are drawn as breaks)
+        """
+        if self.decimate:
+            bucket = len(values) // max(1, int(self.getViewBox().width()))
+            if bucket > 1:
+                times, values, connect = minMaxDecimate(times, values, connect, bucket)
+        curve.setData(times, values, connect=connect & np.isfinite(values))
+
+    def scroll(self, x_range, y_range):
+        """
+            Shows @x_range x @y_range, touching the view only for what changed
+        """
+        if self.y_range != y_range or not self.decimate:
+            self.setYRange(*y_range, padding=0)
+            self.y_range = y_range
+        if self.x_range != x_range or not self.decimate:
+            self.setXRange(*x_range, padding=0)
+            self.x_range = x_range
+        self.last_frame = time.monotonic()
+
+    ############################
+    # Browsing a capture
+    ############################
+    def browse(self, capture, overview, curves):
+        """
+            Keeps @curves in sync with the view over @capture: the overview level matching the
+            zoom serves them, or the samples themselves once zoomed in enough
+
+            Args:
+                capture: iad.Capture browsed
+                overview: overview.Overview of the capture
+                curves: (curve, channel, transform) of each curve to serve; transform maps the
+                    voltages to what the curve shows, None for the voltages themselves
+        """
+        self.capture = capture
+        self.overview = overview
+        self.browse_curves = list(curves)
+        self.showCapture()
+
+    def stopBrowsing(self):
+        self.capture = self.overview = None
+        self.browse_curves = []
+        self.x_range = self.y_range = None
+
+    def showCapture(self, *_args):
+        """
+            Draws the part of the browsed capture in view, at a few buckets per pixel
+            (each drawn as its min and max)
+        """
+        if self.capture is None or len(self.capture) < 2:
+            return
+        start, end = self.viewRange()[0]
+        first = max(0, self.capture.sampleAt(start) - 1)
+        last = min(len(self.capture), self.capture.sampleAt(end) + 1)
+        level = self.overview.levelFor((last - first) / max(1, int(self.getViewBox().width())))
+
+        if level is None:
+            times = self.capture.continuousTimes(first, last)
+            channels = self.capture.channels[first:last]
+            connect = np.ones(len(times), dtype=bool)
+            for curve, channel, transform in self.browse_curves:
+                values = channels[:, channel]
+                self.drawCurve(curve, times, transform(values) if transform else values, connect)
+            return
+
+        positions, buckets = self.overview.window(level, first, last)
+        times = np.repeat(buckets['time'] + self.capture.offsetsAt(positions), 2)
+        minima = buckets['min'].reshape(len(buckets), -1)
+        maxima = buckets['max'].reshape(len(buckets), -1)
+        for curve, channel, transform in self.browse_curves:
+            values = np.column_stack((minima[:, channel], maxima[:, channel])).ravel()
+            if transform:
+                values = transform(values)
+            curve.setData(times, values, connect=np.isfinite(values))
+
+class SpectrumPlotter(pg.PlotWidget):
+    def __init__(self):
+        super(SpectrumPlotter, self).__init__(useOpenGL=True)
+
+        self.setLabel('left', 'PSD', units='V²/Hz', size='18pt')
+        self.setLabel('bottom', 'Frequency', units='Hz', size='18pt')
+        self.showGrid(x=True, y=True, alpha=0.7)
+        self.setLogMode(x=False, y=True)
+        self.setMouseEnabled(x=True, y=False)
+
+class ChainedColumn:
+    """
+        Read-only column made of consecutive parts (e.g. a memory-mapped capture followed by the
+        rows read since): slicing it only copies the rows sliced
+    """
+    def __init__(self, *parts):
+        self.parts = parts
+        self.starts = np.cumsum([0] + [len(part) for part in parts])
+
+    def __len__(self):
+        return int(self.starts[-1])
+
+    def __getitem__(self, key):
+        if not isinstance(key, slice):
+            index = key + len(self) if key < 0 else key
+            part = int(np.searchsorted(self.starts, index, side='right')) - 1
+            return self.parts[part][index - self.starts[part]]
 
-class Table(QTableWidget):
-    def __init__(self, rows, columns):
-        super(Table, self).__init__(rows, columns)
+        start, stop, step = key.indices(len(self))
+        pieces = [part[max(start - first, 0):max(stop - first, 0)] for part, first in zip(self.parts, self.starts)]
+        return np.concatenate(pieces)[::step]
+
+
+class SampleTableModel(QAbstractTableModel):
+    """
+        Spreadsheet model backed by columnar NumPy storage, so each sample costs a few bytes
+        and the view only builds the cells it actually shows
+
+        Rows loaded from a capture stay in its memory map: the rows appended afterwards go to
+        columns of their own, so reading on after loading never copies the capture
+    """
+    HEADERS = ['Time', 'Voltage', 'Moving Average', 'Comment']
+    INITIAL_CAPACITY = 4096
+
+    def __init__(self, parent=None):
+        super(SampleTableModel, self).__init__(parent)
+        self.size = 0
+        self.loaded = 0         # first rows, shown from loaded_times and loaded_voltages
+        self.loaded_times = np.empty(0)
+        self.loaded_voltages = np.empty(0)
+        self.times = np.empty(self.INITIAL_CAPACITY)
+        self.voltages = np.empty(self.INITIAL_CAPACITY)
+        self.averages = np.empty(self.INITIAL_CAPACITY)
+        self.comments = np.empty(self.INITIAL_CAPACITY, dtype=np.uint16)   # index into comment_texts
+
+        # comments repeat a lot (e.g. 'Signal is stabilized;'), so each text is stored once
+        self.comment_texts = ['']
+        self.comment_codes = {'': 0}
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else self.size
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.HEADERS)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return self.HEADERS[section]
+        return None
+
+    def data(self, index, role=Qt.DisplayRole):
+        if role != Qt.DisplayRole or not index.isValid():
+            return None
+
+        row, column = index.row(), index.column()
+        if row < self.loaded:
+            if column == 0:
+                return str(round(self.loaded_times[row], 2))
+            return str(self.loaded_voltages[row]) if column == 1 else ''
+
+        row -= self.loaded
+        if column == 0:
+            return str(round(self.times[row], 2))
+        if column == 1:
+            return str(self.voltages[row])
+        if column == 2:
+            return '' if np.isnan(self.averages[row]) else str(self.averages[row])
+        return self.comment_texts[self.comments[row]]
+
+    def append(self, times, voltages, averages=None, comments=None):
+        """
+            Appends a block of rows with a single rowsInserted notification
+
+            Args:
+                averages: moving average for each row (left blank if not given)
+                comments: comment for each row (blank if not given)
+        """
+        n = len(times)
+        if not n:
+            return
+        first, last = self.size - self.loaded, self.size - self.loaded + n
+        self.reserve(last)
+
+        self.beginInsertRows(QModelIndex(), self.size, self.size + n - 1)
+        self.times[first:last] = times
+        self.voltages[first:last] = voltages
+        self.averages[first:last] = np.nan if averages is None else averages
+        self.comments[first:last] = 0 if comments is None else self.encodeComments(comments)
+        self.size += n
+        self.endInsertRows()
+
+    def encodeComments(self, comments) -> np.ndarray:
+        """
+            Maps the comment texts of a block into their codes
+        """
+        texts, inverse = np.unique(np.asarray(comments, dtype=object), return_inverse=True)
+        codes = np.empty(len(texts), dtype=np.uint16)
+        for i, text in enumerate(texts):
+            if text not in self.comment_codes:
+                self.comment_codes[text] = len(self.comment_texts)
+                self.comment_texts.append(text)
+            codes[i] = self.comment_codes[text]
+        return codes[inverse.ravel()]
+
+    def reserve(self, capacity):
+        """
+            Grows the appended columns (doubling) so that they hold at least @capacity rows
+        """
+        if capacity <= len(self.times):
+            return
+        new_capacity = max(capacity, 2 * len(self.times))
+        appended = self.size - self.loaded
+        for name in ('times', 'voltages', 'averages', 'comments'):
+            column = getattr(self, name)
+            grown = np.empty(new_capacity, dtype=column.dtype)
+            grown[:appended] = column[:appended]
+            setattr(self, name, grown)
+
+    def column(self, name):
+        """
+            Returns the filled part of column @name ('times', 'voltages', 'averages', 'comments'):
+            a view, or a ChainedColumn after a load
+        """
+        appended = getattr(self, name)[:self.size - self.loaded]
+        if not self.loaded:
+            return appended
+        if name in ('times', 'voltages'):
+            loaded = getattr(self, f'loaded_{name}')
+        else:
+            loaded = np.broadcast_to(np.nan if name == 'averages' else np.uint16(0), (self.loaded,))   # no memory per row
+        return ChainedColumn(loaded, appended)
+
+    def load(self, times, voltages):
+        """
+            Shows existing columns (e.g. memory-mapped from a capture) without copying them
+        """
+        self.beginResetModel()
+        self.size = self.loaded = len(times)
+        self.loaded_times = times
+        self.loaded_voltages = voltages
+        self.endResetModel()
+
+    def comment(self, row) -> str:
+        return '' if row < self.loaded else self.comment_texts[self.comments[row - self.loaded]]
+
+    def clear(self):
+        self.beginResetModel()
+        self.size = self.loaded = 0
+        self.loaded_times = self.loaded_voltages = np.empty(0)
+        self.endResetModel()
+
+class Table(QTableView):
+    def __init__(self):
+        super(Table, self).__init__()
+
+        self.samples = SampleTableModel(self)
+        self.setModel(self.samples)
 
         self.setStyleSheet('background-color: rgb(0, 0, 0);')
         self.horizontalHeader().setStretchLastSection(True)
-        self.setHorizontalHeaderLabels(['Time', 'Voltage', 'Moving Average', 'Comment'])
-        self.verticalHeader().setVisible(False)
\ No newline at end of file
+        self.verticalHeader().setVisible(False)
+
+        # uniform rows, so the view never measures the (possibly millions of) rows
+        self.verticalHeader().setSectionResizeMode(QHeaderView.Fixed)
+        self.verticalHeader().setDefaultSectionSize(self.fontMetrics().height() + 4)
+
+    def append(self, times, voltages, averages=None, comments=None):
+        """
+            Appends a block of samples and keeps the last one in sight
+        """
+        self.samples.append(times, voltages, averages, comments)
+        self.scrollToBottom()
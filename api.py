@@ -0,0 +1,300 @@
+import time
+import asyncio
+from typing import NamedTuple
+import numpy as np
+import serial
+
+import protocol
+import recorder
+import transport
+
+######################################################################
+# Programmatic acquisition API (no Qt)
+#
+# The engine the GUI and headless mode run, as a library:
+#
+#   with api.Session('/dev/ttyACM0', pin=0, rate=5000) as session:
+#       for block in session.blocks(duration=10):
+#           process(block.times, block.voltages)
+#
+#   async with api.Session(port) as session:     # the event loop watches the port
+#       async for block in session.stream(duration=10):
+#           ...
+######################################################################
+
+class Block(NamedTuple):
+    """
+        Samples read together: times [s], voltages [V] and samples lost right before each one
+
+        Voltages are (samples x pins) when the session reads several pins
+    """
+    times: np.ndarray
+    voltages: np.ndarray
+    lost: np.ndarray
+
+    def __len__(self):
+        return self.times.size
+
+
+class SessionError(Exception):
+    def __init__(self, message='Session error'):
+        self.message = message
+        super().__init__(self.message)
+
+
+class Session:
+    """
+        One board, one or more pins: opens the port, handshakes, starts and stops the stream and reads
+        sample blocks as NumPy arrays
+
+        Usage:
+            session = Session(port, pin=0, rate=1000).open()
+            session.start()
+            times, voltages, lost = session.read()
+            session.close()
+    """
+    def __init__(self, port: str=None, pin=0, rate: int=protocol.DEFAULT_RATE, baudrate: int=protocol.BAUDRATE,
+                 timeout: float=1.):
+        """
+            Args:
+                port: serial port of the board (None for the first board found)
+                pin: analog pin to read, or a list of pins to read together
+                rate: samples per second asked to the board, at most protocol.maxRate(@baudrate, pins)
+                    (start raises protocol.RateTooHighError otherwise)
+                baudrate, timeout: serial settings (a read waits at most @timeout seconds)
+        """
+        self.port = port
+        self.pins = [pin] if isinstance(pin, int) else sorted(set(pin))
+        self.pin = self.pins[0]
+        self.rate = rate
+        self.baudrate = baudrate
+        self.timeout = timeout
+
+        self.connection = None
+        self.reader = None
+        self.recorder = None
+        self.protocol_mode = protocol.MODE_ASCII
+        self.firmware_version = 0
+        self.handshake_response = None
+        self.is_streaming = False
+
+    ############################
+    # Lifecycle
+    ############################
+    def open(self):
+        """
+            Handshakes the board and keeps its port open
+
+            Returns:
+                The session itself, so it can be chained
+        """
+        if self.connection:
+            return self
+        if not self.port:
+            ports = protocol.getPorts()
+            if not ports:
+                raise protocol.NoPortError()
+            self.port = ports[0]
+
+        self.handshake_response, self.protocol_mode, self.firmware_version = protocol.handshake(
+            self.port, self.baudrate, self.pin, timeout=self.timeout)
+        self.connection = serial.Serial(self.port, self.baudrate, timeout=self.timeout)
+        return self
+
+    def close(self):
+        """
+            Stops streaming (and recording) and releases the port
+        """
+        if self.is_streaming:
+            self.stop()
+        if self.connection:
+            self.connection.close()
+            self.connection = None
+
+    def start(self, rate: int=None):
+        """
+            Asks the board to stream, at @rate samples per second if given (the session rate otherwise)
+        """
+        if not self.connection:
+            raise SessionError('Open the session before starting it')
+        if self.is_streaming:
+            return
+        if rate:
+            self.rate = rate
+        selection = protocol.pinSelection(self.pins, self.protocol_mode, self.firmware_version)
+        protocol.startStream(self.connection, selection, self.rate, self.protocol_mode)
+        # the board restarts its clock on every START: the times carry on from the previous run instead
+        start = self.reader.next_time if self.reader else 0.
+        self.reader = protocol.SampleReader(self.connection, self.rate, self.protocol_mode, len(self.pins), start)
+        self.is_streaming = True
+
+    def stop(self):
+        if not self.is_streaming:
+            return
+        protocol.stopStream(self.connection)
+        self.is_streaming = False
+        if self.recorder:
+            self.stopRecording()
+
+    def __enter__(self):
+        self.open()
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    async def __aenter__(self):
+        await asyncio.get_running_loop().run_in_executor(None, self.__enter__)
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await asyncio.get_running_loop().run_in_executor(None, self.close)
+
+    ############################
+    # Reading
+    ############################
+    def read(self) -> Block:
+        """
+            Reads whatever the board sent (waits up to the serial timeout for the first sample)
+
+            Returns:
+                The block read, possibly empty
+        """
+        if not self.is_streaming:
+            raise SessionError('Start the session before reading')
+        block = Block(*self.reader.readSamples())
+        self.recordBlock(block)
+        return block
+
+    def recordBlock(self, block: Block):
+        if self.recorder and len(block):
+            if self.recorder.error:
+                raise self.recorder.error
+            self.recorder.write(block.times, block.voltages)
+
+    def blocks(self, duration: float=0., min_samples: int=1):
+        """
+            Yields blocks of at least @min_samples samples for @duration seconds (0 for ever);
+            the last one may be shorter
+        """
+        deadline = time.monotonic() + duration if duration > 0 else float('inf')
+        pending = []
+        n_pending = 0
+        while time.monotonic() < deadline:
+            block = self.read()
+            if not len(block):
+                continue
+            pending.append(block)
+            n_pending += len(block)
+            if n_pending >= min_samples:
+                yield concatenate(pending)
+                pending, n_pending = [], 0
+        if pending:
+            yield concatenate(pending)
+
+    def __iter__(self):
+        return self.blocks()
+
+    async def stream(self, duration: float=0., min_samples: int=1):
+        """
+            Async variant of blocks(): the event loop watches the port (see transport.SerialTransport),
+            so any number of sessions share one thread; where it cannot, reads run in the default executor
+        """
+        loop = asyncio.get_running_loop()
+        if not self.is_streaming:
+            raise SessionError('Start the session before reading')
+        if not transport.supported(self.connection, loop):
+            iterator = self.blocks(duration, min_samples)
+            done = object()
+            while True:
+                block = await loop.run_in_executor(None, next, iterator, done)
+                if block is done:
+                    return
+                yield block
+
+        queue = asyncio.Queue()
+        port = transport.SerialTransport(
+            self.connection, self.reader, lambda *samples: queue.put_nowait(Block(*samples)), queue.put_nowait, loop)
+        deadline = loop.time() + duration if duration > 0 else None
+        pending = []
+        n_pending = 0
+        port.start()
+        try:
+            while True:
+                try:
+                    block = await asyncio.wait_for(queue.get(), deadline and deadline - loop.time())
+                except asyncio.TimeoutError:
+                    break
+                if isinstance(block, Exception):
+                    raise block
+                self.recordBlock(block)
+                pending.append(block)
+                n_pending += len(block)
+                if n_pending >= min_samples:
+                    yield concatenate(pending)
+                    pending, n_pending = [], 0
+            if pending:
+                yield concatenate(pending)
+        finally:
+            port.close()
+            self.connection.timeout = self.timeout
+
+    def __aiter__(self):
+        return self.stream()
+
+    ############################
+    # Recording
+    ############################
+    def record(self, path: str, metadata: dict=None, **recorder_settings):
+        """
+            Appends every block read from now on to the .iad capture at @path
+            (see recorder.Recorder for @recorder_settings)
+        """
+        if self.recorder:
+            self.stopRecording()
+        header = self.metadata()
+        header.update(metadata or {})
+        self.recorder = recorder.Recorder(path, header, **recorder_settings)
+        self.recorder.start()
+
+    def stopRecording(self) -> int:
+        """
+            Returns:
+                The number of samples recorded
+        """
+        capture, self.recorder = self.recorder, None
+        capture.stop()
+        if capture.error:
+            raise capture.error
+        return capture.samples
+
+    def metadata(self) -> dict:
+        """
+            Returns the acquisition settings stored in .iad headers (same keys as the GUI)
+        """
+        return {
+            'name': 'noisr',
+            'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'pin': self.pin,
+            'pins': self.pins,
+            'rate': self.rate,
+            'protocol_mode': self.protocol_mode,
+            'firmware_version': self.firmware_version,
+            'notes': []
+        }
+
+    @property
+    def statistics(self) -> protocol.StreamStatistics:
+        return self.reader.statistics if self.reader else None
+
+    def __str__(self):
+        state = 'streaming' if self.is_streaming else 'open' if self.connection else 'closed'
+        pins = ', '.join(f'A{pin}' for pin in self.pins)
+        return f'{self.port} {pins} @ {self.rate} samples/s ({self.protocol_mode}, {state})'
+
+
+def concatenate(blocks) -> Block:
+    if len(blocks) == 1:
+        return blocks[0]
+    return Block(*(np.concatenate(column) for column in zip(*blocks)))
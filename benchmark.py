@@ -0,0 +1,258 @@
+#!/usr/bin/env python
+
+import io
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import tracemalloc
+import numpy as np
+
+import connection
+import exporter
+import recorder
+import simulator
+
+######################################################################
+# Throughput and latency benchmarks of the acquisition pipeline
+#
+#   python benchmark.py                         # runs everything
+#   python benchmark.py --save baseline.json    # stores the results
+#   python benchmark.py --baseline baseline.json --tolerance 0.2
+#                                               # fails on >20% throughput regressions
+######################################################################
+
+class Result:
+    """
+        Throughput, latency percentiles and memory growth of one benchmarked stage
+    """
+    def __init__(self, name, samples, latencies, memory=0):
+        self.name = name
+        self.samples = samples
+        self.latencies = np.asarray(latencies)
+        self.memory = memory    # bytes still allocated at the end of the run
+
+    @property
+    def throughput(self) -> float:
+        total = self.latencies.sum()
+        return self.samples / total if total > 0 else float('inf')
+
+    def percentile(self, q) -> float:
+        return float(np.percentile(self.latencies, q)) * 1e3 if self.latencies.size else 0.
+
+    def asdict(self):
+        return {
+            'samples_per_s': self.throughput,
+            'p50_ms': self.percentile(50),
+            'p95_ms': self.percentile(95),
+            'p99_ms': self.percentile(99),
+            'bytes_per_sample': self.memory / self.samples if self.samples else 0.
+        }
+
+    def __str__(self):
+        stats = self.asdict()
+        return (f'{self.name:<28} {stats["samples_per_s"]:>14,.0f} {stats["p50_ms"]:>9.3f} '
+                f'{stats["p95_ms"]:>9.3f} {stats["p99_ms"]:>9.3f} {stats["bytes_per_sample"]:>9.1f}')
+
+
+class StreamPort:
+    """
+        Serial port stand-in that serves a prerecorded byte stream in chunks, like a busy board would
+    """
+    def __init__(self, stream: bytes, chunk: int):
+        self.stream = io.BytesIO(stream)
+        self.chunk = chunk
+        self.in_waiting = chunk
+
+    def read(self, size=1):
+        return self.stream.read(size)
+
+    def readline(self):
+        return self.stream.readline()
+
+
+def syntheticCounts(n_samples, seed=0) -> np.ndarray:
+    counts = np.random.default_rng(seed).normal(287, 100, n_samples)  # ~1.4V +- 0.5V
+    return np.clip(np.rint(counts), 0, connection.ADC_RESOLUTION).astype(np.uint16)
+
+
+def timed(function, *args):
+    started = time.perf_counter()
+    function(*args)
+    return time.perf_counter() - started
+
+
+######################################################################
+# Stages
+######################################################################
+
+def benchParser(n_samples, chunk=4096):
+    """
+        PinReaderThread.readSamples decoding binary frames and legacy ASCII lines
+    """
+    results = []
+    counts = syntheticCounts(n_samples)
+
+    frames = simulator.encodeFrames(0, counts).tobytes()
+    reader = connection.NOISRProtocol.PinReaderThread(StreamPort(frames, chunk), 1000, connection.MODE_BINARY)
+    latencies = [timed(reader.readSamples) for _ in range(-(-len(frames) // chunk))]
+    results.append(Result('parser (binary frames)', n_samples, latencies))
+
+    n_lines = min(n_samples, 100000)
+    voltages = connection.toVoltage(counts[:n_lines])
+    lines = ''.join(f'{voltage:.8f}\r\n' for voltage in voltages).encode()
+    reader = connection.NOISRProtocol.PinReaderThread(StreamPort(lines, chunk), 1000, connection.MODE_ASCII)
+    latencies = [timed(reader.readSamples) for _ in range(n_lines)]
+    results.append(Result('parser (ascii lines)', n_lines, latencies))
+
+    return results
+
+
+def benchPipeline(n_samples, block):
+    """
+        NoiserGUI.update_plot per block, split into its stages
+    """
+    os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+    from PyQt5.QtWidgets import QApplication
+    import gui
+
+    app = QApplication.instance() or QApplication(sys.argv)
+    window = gui.NoiserGUI()
+
+    stages = {
+        'ring buffer': (window.buffer, 'extend'),
+        'clamp': (window, 'clampValue'),
+        'stabilization': (window, 'checkStabilization'),
+        'bit writer': (window, 'writeBits'),
+        'table append': (window, 'updateTable'),
+        'redraw': (window, 'redraw'),
+        'render': (window, 'render')
+    }
+    latencies = {name: [] for name in stages}
+    for name, (owner, method) in stages.items():
+        setattr(owner, method, stopwatch(getattr(owner, method), latencies[name]))
+
+    counts = syntheticCounts(n_samples)
+    voltages = connection.toVoltage(counts)
+    times = np.arange(n_samples) / 1000
+    lost = np.zeros(n_samples, dtype=np.int64)
+
+    total = []
+    tracemalloc.start()
+    for start in range(0, n_samples, block):
+        end = min(start + block, n_samples)
+        total.append(timed(window.update_plot, times[start:end], voltages[start:end], lost[start:end]))
+    memory, _peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    app.processEvents()
+    window.close()
+
+    results = [Result(f'update_plot (block={block})', n_samples, total, memory)]
+    results += [Result(f'  {name}', n_samples, stage_latencies) for name, stage_latencies in latencies.items()]
+    return results
+
+
+def stopwatch(function, latencies):
+    """
+        Wraps @function, appending the duration of each call to @latencies
+    """
+    def timedFunction(*args, **kwargs):
+        started = time.perf_counter()
+        result = function(*args, **kwargs)
+        latencies.append(time.perf_counter() - started)
+        return result
+    return timedFunction
+
+
+def benchExport(n_samples, block=4096):
+    """
+        Streaming recorder and CSV export
+    """
+    counts = syntheticCounts(n_samples)
+    voltages = connection.toVoltage(counts)
+    times = np.arange(n_samples) / 1000
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'benchmark.iad')
+        capture = recorder.Recorder(path, {'rate': 1000})
+        capture.start()
+        started = time.perf_counter()
+        for start in range(0, n_samples, block):
+            capture.write(times[start:start + block], voltages[start:start + block])
+        capture.stop()
+        recorded = Result('recorder (.iad)', n_samples, [time.perf_counter() - started])
+
+        # progress is reported once per chunk, so chunk latencies are the gaps between calls
+        marks = [time.perf_counter()]
+        exporter.exportText(os.path.join(directory, 'benchmark.csv'), times, voltages, delimiter=',',
+                            progress=lambda fraction: marks.append(time.perf_counter()))
+        exported = Result('export (csv)', n_samples, np.diff(marks))
+
+    return [recorded, exported]
+
+
+def maxSafeRate(frame_rate, headroom=0.5, blocks=(1, 10, 100, 1000, 10000)):
+    """
+        Estimates the highest read rate the GUI keeps up with: at @frame_rate refreshes per second,
+        a block of rate / frame_rate samples must be handled within @headroom of the frame period
+    """
+    safe_rate = 0
+    for block in blocks:
+        result = benchPipeline(max(20 * block, 2000), block)[0]
+        per_block = float(np.median(result.latencies))
+        if per_block <= headroom / frame_rate:
+            safe_rate = block * frame_rate
+    return safe_rate
+
+
+######################################################################
+# Entry point
+######################################################################
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmarks the noisr acquisition pipeline')
+    parser.add_argument('--samples', type=int, default=200000, help='samples per stage')
+    parser.add_argument('--block', type=int, default=100, help='samples per GUI block')
+    parser.add_argument('--frame-rate', type=int, default=30, help='GUI refreshes per second')
+    parser.add_argument('--save', help='stores the results as JSON')
+    parser.add_argument('--baseline', help='JSON results to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='allowed throughput drop vs. the baseline')
+    args = parser.parse_args()
+
+    results = benchParser(args.samples)
+    results += benchPipeline(args.samples, args.block)
+    results += benchExport(args.samples)
+
+    print(f'{"stage":<28} {"samples/s":>14} {"p50 [ms]":>9} {"p95 [ms]":>9} {"p99 [ms]":>9} {"B/sample":>9}')
+    for result in results:
+        print(result)
+
+    safe_rate = maxSafeRate(args.frame_rate)
+    print(f'\nmax safe read rate at {args.frame_rate} fps: ~{safe_rate:,} samples/s')
+
+    report = {result.name.strip(): result.asdict() for result in results}
+    report['max_safe_rate'] = safe_rate
+
+    if args.save:
+        with open(args.save, 'w') as output:
+            json.dump(report, output, indent=4)
+
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            baseline = json.load(baseline_file)
+        regressions = [
+            name for name, stats in report.items()
+            if isinstance(stats, dict) and name in baseline
+            and stats['samples_per_s'] < (1 - args.tolerance) * baseline[name]['samples_per_s']
+        ]
+        for name in regressions:
+            print(f'REGRESSION {name}: {report[name]["samples_per_s"]:,.0f} samples/s '
+                  f'(baseline {baseline[name]["samples_per_s"]:,.0f})')
+        sys.exit(1 if regressions else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,415 @@
+import time
+import asyncio
+from queue import Queue, Full, Empty
+from threading import Thread
+from typing import Tuple
+import numpy as np
+
+import api
+import protocol
+import recorder
+import transport
+from ringbuffer import RingBuffer
+
+######################################################################
+# Multi-board acquisition (no Qt)
+#
+# One reader thread per board feeds a shared queue; the manager aligns the
+# boards on a common clock and merges them into (samples x channels) blocks,
+# channels ordered by board, then by pin:
+#
+#   manager = BoardManager(pin=[0, 1], rate=1000)   # every board found
+#   manager.start(); manager.record('rack.iad')
+#   times, voltages, lost = manager.read()
+#   manager.stop(); print(manager)
+#
+#   async for times, voltages, lost in manager.stream(duration=60):
+#       ...                                         # same, one thread for every board
+######################################################################
+
+class BoardReader(Thread):
+    """
+        Streams one board through an api.Session, stamping its blocks on the manager's clock
+    """
+    def __init__(self, index: int, session: api.Session, queue: Queue, origin: float):
+        """
+            Args:
+                index: position of the board in the manager
+                queue: shared by every reader, receives (index, times, voltages, lost)
+                origin: time.monotonic() of the manager start, time 0 of every board
+        """
+        super().__init__(daemon=True)
+        self.index = index
+        self.session = session
+        self.queue = queue
+        self.origin = origin
+        self.offset = 0.        # [s] board start on the manager's clock
+        self.blocks_dropped = 0 # because the manager was not reading
+        self.errors = 0
+        self.error = None
+        self._should_run = True
+
+    def stop(self):
+        self._should_run = False
+
+    def run(self):
+        try:
+            self.session.open()
+            self.session.start()
+            self.offset = time.monotonic() - self.origin
+            while self._should_run:
+                block = self.session.read()
+                if not len(block):
+                    continue
+                try:
+                    self.queue.put((self.index, block.times + self.offset, block.voltages, block.lost), timeout=1)
+                except Full:
+                    self.blocks_dropped += 1
+        except Exception as error:
+            self.errors += 1
+            self.error = error
+        finally:
+            try:
+                self.session.close()
+            except Exception as error:
+                self.errors += 1
+                self.error = self.error or error
+
+    @property
+    def statistics(self) -> protocol.StreamStatistics:
+        return self.session.statistics
+
+    def __str__(self):
+        statistics = self.statistics or 'not streaming'
+        error = f', error: {self.error}' if self.error else ''
+        return f'{self.session.port}: {statistics}, {self.blocks_dropped} blocks dropped{error}'
+
+
+class AsyncBoardReader:
+    """
+        Same counters as BoardReader, but fed by the event loop (see transport.SerialTransport):
+        every board of the manager is served by the loop's thread
+    """
+    def __init__(self, index: int, session: api.Session, aligner, origin: float):
+        self.index = index
+        self.session = session
+        self.aligner = aligner
+        self.origin = origin
+        self.offset = 0.
+        self.blocks_dropped = 0
+        self.errors = 0
+        self.error = None
+        self.port = None
+
+    async def start(self, loop):
+        """
+            Handshakes and starts the board (in the default executor, both wait on the port)
+            and hands its port over to the event loop
+        """
+        try:
+            await loop.run_in_executor(None, self.openSession)
+            self.offset = time.monotonic() - self.origin
+            self.port = transport.SerialTransport(
+                self.session.connection, self.session.reader, self.onSamples, self.onError, loop)
+            self.port.start()
+        except Exception as error:
+            self.onError(error)
+
+    def openSession(self):
+        self.session.open()
+        self.session.start()
+
+    def onSamples(self, times, voltages, lost):
+        self.aligner.feed(self.index, times + self.offset, voltages, lost)
+
+    def onError(self, error):
+        self.errors += 1
+        self.error = error
+
+    def is_alive(self) -> bool:
+        return self.port is not None and self.port.is_open
+
+    def close(self):
+        if self.port:
+            self.port.close()
+        try:
+            self.session.close()
+        except Exception as error:
+            self.onError(error)
+
+    @property
+    def statistics(self) -> protocol.StreamStatistics:
+        return self.session.statistics
+
+    __str__ = BoardReader.__str__
+
+
+class TimeAligner:
+    """
+        Resamples boards with their own clocks on one time grid (every 1 / @rate seconds), up to
+        the time every live board has reached, so merged samples are simultaneous
+
+        Nothing is interpolated across the samples a board lost: grid times falling in such a gap
+        are dropped (for every board) and counted as lost before the next merged sample
+    """
+    def __init__(self, channels, rate: int, history: float=2.):
+        """
+            Args:
+                channels: channels of each board
+                history: seconds of samples kept per board to interpolate from
+        """
+        self.channels = list(channels)
+        self.rate = rate
+        capacity = max(2, int(history * rate))
+        self.buffers = [RingBuffer(capacity, ('time', 'lost') + tuple(f'voltage{c}' for c in range(n))) for n in self.channels]
+        self.next_time = None
+        self.dropped = 0        # grid samples dropped since the last merged one
+
+    def feed(self, board: int, times: np.ndarray, voltages: np.ndarray, lost: np.ndarray=None):
+        """
+            Args:
+                lost: samples the board lost right before each one (none by default)
+        """
+        voltages = voltages.reshape(len(times), -1)
+        lost = np.zeros(len(times)) if lost is None else lost
+        self.buffers[board].extend(times, lost, *voltages.T)
+
+    def merge(self, live=None) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+            Args:
+                live: boards still streaming (all by default); the others neither hold the merge
+                    back nor get values (NaN)
+
+            Returns:
+                The grid times, the (samples x channels) voltages and the grid samples lost right
+                before each one, ready since the last merge
+        """
+        live = range(len(self.buffers)) if live is None else live
+        live = [board for board in live if self.buffers[board]]
+        empty = np.empty(0), np.empty((0, sum(self.channels))), np.empty(0, dtype=np.int64)
+        if not live:
+            return empty
+
+        horizon = min(self.buffers[board].last('time') for board in live)
+        if self.next_time is None:
+            # starts once every board has samples
+            self.next_time = np.ceil(max(self.buffers[board].first('time') for board in live) * self.rate) / self.rate
+        n = int(np.floor((horizon - self.next_time) * self.rate + 1e-9)) + 1
+        if n <= 0:
+            return empty
+
+        times = self.next_time + np.arange(n) / self.rate
+        self.next_time = times[-1] + 1 / self.rate
+
+        columns = []
+        in_gap = np.zeros(n, dtype=bool)
+        for board, buffer in enumerate(self.buffers):
+            if board in live:
+                in_gap |= self.gaps(buffer, times)
+            for channel in range(self.channels[board]):
+                if board in live:
+                    columns.append(np.interp(times, buffer.view('time'), buffer.view(f'voltage{channel}')))
+                else:
+                    columns.append(np.full(n, np.nan))
+
+        # every dropped grid sample is lost right before the next one kept
+        kept = np.flatnonzero(~in_gap)
+        lost = np.diff(kept, prepend=-1) - 1
+        if kept.size:
+            lost[0] += self.dropped
+            self.dropped = n - 1 - kept[-1]
+        else:
+            self.dropped += n
+        return times[kept], np.column_stack(columns)[kept], lost
+
+    @staticmethod
+    def gaps(buffer: RingBuffer, times: np.ndarray) -> np.ndarray:
+        """
+            Returns:
+                Whether each of @times falls between two samples of @buffer with lost samples in between
+        """
+        board_times = buffer.view('time')
+        after = np.searchsorted(board_times, times, side='right')     # first sample after each time
+        inside = (after > 0) & (after < len(board_times))
+        after = np.clip(after, 1, len(board_times) - 1)
+        return inside & (buffer.view('lost')[after] > 0) & (times > board_times[after - 1])
+
+
+class BoardManager:
+    """
+        Handshakes and streams every board at once, merging them on a common clock
+
+        Per-board counters (throughput, gaps, corrupted bytes, errors) stay available in
+        self.readers; the shared recorder stores the merged blocks in one capture
+    """
+    def __init__(self, ports=None, pin=0, rate: int=protocol.DEFAULT_RATE, baudrate: int=protocol.BAUDRATE,
+                 queue_size: int=256):
+        """
+            Args:
+                ports: serial ports of the boards (None for every board found)
+                pin: analog pin to read on every board, or a list of pins
+                rate: samples per second of every board and of the merged view
+        """
+        self.ports = list(ports) if ports else protocol.getPorts()
+        if not self.ports:
+            raise protocol.NoPortError()
+        self.pins = [pin] if isinstance(pin, int) else sorted(set(pin))
+        self.rate = rate
+        self.baudrate = baudrate
+        self.queue = Queue(maxsize=queue_size)
+        self.readers = []
+        self.aligner = None
+        self.recorder = None
+
+    @property
+    def channels(self) -> int:
+        return len(self.ports) * len(self.pins)
+
+    @property
+    def labels(self) -> list:
+        """
+            Name of each merged channel, e.g. '/dev/ttyACM0 A0'
+        """
+        return [f'{port} A{pin}' for port in self.ports for pin in self.pins]
+
+    def start(self, start: float=None):
+        """
+            Args:
+                start: time of the first merged sample [s] (by default where the previous run stopped)
+        """
+        origin = time.monotonic() - self.continuation(start)
+        self.aligner = TimeAligner([len(self.pins)] * len(self.ports), self.rate)
+        self.readers = [
+            BoardReader(index, api.Session(port, self.pins, self.rate, self.baudrate), self.queue, origin)
+            for index, port in enumerate(self.ports)]
+        for reader in self.readers:
+            reader.start()
+
+    def stop(self):
+        for reader in self.readers:
+            reader.stop()
+        for reader in self.readers:
+            reader.join()
+        if self.recorder:
+            self.stopRecording()
+
+    def continuation(self, start: float=None) -> float:
+        """
+            Returns:
+                @start if given, else the time the previous run would have merged next (0 at first)
+        """
+        if start is not None:
+            return start
+        if self.aligner and self.aligner.next_time is not None:
+            return self.aligner.next_time
+        return 0.
+
+    @property
+    def is_alive(self) -> bool:
+        return any(reader.is_alive() for reader in self.readers)
+
+    def read(self, timeout: float=1.) -> api.Block:
+        """
+            Waits up to @timeout seconds for new samples and merges whatever the boards sent
+
+            Returns:
+                The merged block (samples x channels), possibly empty; a board that stopped
+                streaming gets NaN
+        """
+        try:
+            pending = [self.queue.get(timeout=timeout)]
+        except Empty:
+            pending = []
+        while True:
+            try:
+                pending.append(self.queue.get_nowait())
+            except Empty:
+                break
+
+        for board, times, voltages, lost in pending:
+            self.aligner.feed(board, times, voltages, lost)
+        live = [reader.index for reader in self.readers if reader.is_alive()]
+        block = api.Block(*self.aligner.merge(live))
+
+        if self.recorder and len(block):
+            if self.recorder.error:
+                raise self.recorder.error
+            self.recorder.write(block.times, block.voltages)
+        return block
+
+    def blocks(self, duration: float=0.):
+        """
+            Yields merged blocks for @duration seconds (0 until every board stops)
+        """
+        deadline = time.monotonic() + duration if duration > 0 else float('inf')
+        while time.monotonic() < deadline and self.is_alive:
+            block = self.read()
+            if len(block):
+                yield block
+
+    async def stream(self, duration: float=0., frame_rate: int=30, start: float=None):
+        """
+            Async variant of start() + blocks(): every board is read by the running event loop
+            (one thread for the whole rack), merged blocks come @frame_rate times per second
+        """
+        loop = asyncio.get_running_loop()
+        origin = time.monotonic() - self.continuation(start)
+        self.aligner = TimeAligner([len(self.pins)] * len(self.ports), self.rate)
+        self.readers = [
+            AsyncBoardReader(index, api.Session(port, self.pins, self.rate, self.baudrate), self.aligner, origin)
+            for index, port in enumerate(self.ports)]
+        await asyncio.gather(*(reader.start(loop) for reader in self.readers))
+
+        deadline = loop.time() + duration if duration > 0 else float('inf')
+        try:
+            while loop.time() < deadline and self.is_alive:
+                await asyncio.sleep(1 / frame_rate)
+                block = api.Block(*self.aligner.merge([reader.index for reader in self.readers if reader.is_alive()]))
+                if len(block):
+                    if self.recorder:
+                        self.recorder.write(block.times, block.voltages)
+                    yield block
+        finally:
+            for reader in self.readers:
+                reader.close()
+            if self.recorder:
+                self.stopRecording()
+
+    ############################
+    # Shared recorder
+    ############################
+    def record(self, path: str, metadata: dict=None, **recorder_settings):
+        """
+            Appends the merged blocks to one .iad capture, a channel per board and pin
+        """
+        if self.recorder:
+            self.stopRecording()
+        header = self.metadata()
+        header.update(metadata or {})
+        self.recorder = recorder.Recorder(path, header, **recorder_settings)
+        self.recorder.start()
+
+    def stopRecording(self) -> int:
+        capture, self.recorder = self.recorder, None
+        capture.stop()
+        if capture.error:
+            raise capture.error
+        return capture.samples
+
+    def metadata(self) -> dict:
+        """
+            Returns the .iad header of the merged capture: 'pins' has one entry per channel
+            and 'boards' the port of each one
+        """
+        return {
+            'name': 'noisr',
+            'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'pin': self.pins[0],
+            'pins': self.pins * len(self.ports),
+            'boards': [port for port in self.ports for _pin in self.pins],
+            'rate': self.rate,
+            'notes': []
+        }
+
+    def __str__(self):
+        return '; '.join(str(reader) for reader in self.readers)
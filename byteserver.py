@@ -0,0 +1,328 @@
+import os
+import stat
+import errno
+import socket
+import selectors
+from queue import Queue, Full, Empty
+from threading import Thread, Lock
+
+######################################################################
+# Random byte output service
+#
+# Extracted bytes are pooled in a bounded buffer and handed out to
+# local consumers: every connection to the Unix socket (and the named
+# pipe, if any) gets distinct bytes, as fast as it reads them. The file
+# sink, when enabled, records every byte produced for offline testing.
+# The socket, pipe and file are only accessible to their owner (0600).
+#
+#   socat -u UNIX-CONNECT:/tmp/noisr.sock - | head -c 1024 | xxd
+######################################################################
+
+SEND_SIZE = 1 << 16     # max bytes handed to one consumer per turn
+
+
+class ByteServer(Thread):
+    """
+        Serves random bytes to other processes without ever blocking the producer
+
+        Usage:
+            server = ByteServer(socket_path='/run/user/1000/noisr.sock')
+            server.start()          # raises OSError if the paths cannot be served
+            server.write(extractor.extract(voltages))   # from the GUI thread
+    """
+    def __init__(self, socket_path: str=None, fifo_path: str=None, file_path: str=None,
+                 buffer_size: int=1 << 20, queue_size: int=256):
+        """
+            Args:
+                socket_path: Unix domain socket consumers connect to (None for no socket)
+                fifo_path: named pipe created for a single reader (None for no pipe)
+                file_path: file every produced byte is appended to (None for no file)
+                buffer_size: bytes pooled for the consumers; what does not fit is dropped
+                queue_size: blocks waiting to be pooled before write() drops them
+        """
+        super().__init__(daemon=True)
+        if (socket_path or fifo_path) and not hasattr(socket, 'AF_UNIX'):
+            raise OSError('Unix sockets and named pipes are not available on this system')
+
+        self.socket_path = socket_path
+        self.fifo_path = fifo_path
+        self.file_path = file_path
+        self.buffer_size = buffer_size
+        self.queue = Queue(maxsize=queue_size)
+
+        self.pool = bytearray()
+        self.lock = Lock()      # the pool is also drained by read(), from other threads
+        self.selector = selectors.DefaultSelector()
+        self.consumers = {}     # fileobj -> bytes served
+        self.listener = None
+        self.fifo = None
+        self.sink = None
+        self.created = {}       # path: (device, inode) of what this instance created, the only paths it removes
+        self._wakeup_read, self._wakeup_write = os.pipe()
+        os.set_blocking(self._wakeup_write, False)
+        self._should_run = True
+
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.dropped = 0        # bytes lost to a full queue or pool
+        self.error = None
+
+    ############################
+    # Producer side
+    ############################
+    def write(self, data: bytes):
+        """
+            Queues @data for the consumers; never blocks (bytes are dropped when the service lags)
+        """
+        if not data or not self.is_alive():
+            return
+        try:
+            self.queue.put_nowait(bytes(data))
+        except Full:
+            self.dropped += len(data)
+            return
+        try:
+            os.write(self._wakeup_write, b'\x00')
+        except BlockingIOError:
+            pass    # already woken up
+
+    def read(self, size: int) -> bytes:
+        """
+            Takes up to @size pooled bytes for an in-process consumer, without waiting
+
+            Returns:
+                The bytes available right now (b'' if none)
+        """
+        self.ingest()
+        with self.lock:
+            data = bytes(self.pool[:size])
+            del self.pool[:size]
+        self.bytes_out += len(data)
+        return data
+
+    def start(self):
+        """
+            Opens the socket, pipe and file, then serves them from the thread
+        """
+        try:
+            self.open()
+        except OSError:
+            self.close()
+            raise
+        super().start()
+
+    def stop(self):
+        self._should_run = False
+        try:
+            os.write(self._wakeup_write, b'\x00')
+        except OSError:
+            pass    # already woken up, or the service already ended (see self.error)
+        self.join()
+
+    @property
+    def available(self) -> int:
+        return len(self.pool)
+
+    def __str__(self):
+        return (f'{self.bytes_in} bytes produced, {self.bytes_out} served to {len(self.consumers)} consumer(s), '
+                f'{self.dropped} dropped')
+
+    ############################
+    # Service loop
+    ############################
+    def run(self):
+        try:
+            self.selector.register(self._wakeup_read, selectors.EVENT_READ)
+            while self._should_run:
+                writable = []
+                for key, mask in self.selector.select(timeout=0.5):
+                    if key.fileobj is self.listener:
+                        self.accept()
+                    elif key.fileobj == self._wakeup_read:
+                        os.read(self._wakeup_read, 4096)
+                    elif mask & selectors.EVENT_READ and key.fileobj != self.fifo:
+                        self.checkHangup(key.fileobj)
+                    elif mask & selectors.EVENT_WRITE:
+                        writable.append(key.fileobj)
+
+                # consumers ready at the same time split the pool evenly
+                share = min(SEND_SIZE, -(-len(self.pool) // len(writable))) if writable else 0
+                for consumer in writable:
+                    if consumer in self.consumers:
+                        self.serve(consumer, share)
+                self.ingest()
+                self.updateInterest()
+        except OSError as error:
+            self.error = error
+        finally:
+            self.close()
+
+    def open(self):
+        if self.socket_path:
+            self.claimSocket()
+            self.listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self.listener.bind(self.socket_path)
+            self.created[self.socket_path] = self.identity(self.socket_path)
+            os.chmod(self.socket_path, 0o600)   # before listening, so nobody else ever connects
+            self.listener.listen()
+            self.listener.setblocking(False)
+            self.selector.register(self.listener, selectors.EVENT_READ)
+
+        if self.fifo_path:
+            if not os.path.exists(self.fifo_path):
+                os.mkfifo(self.fifo_path, 0o600)
+                self.created[self.fifo_path] = self.identity(self.fifo_path)
+            # read-write, so opening does not wait for a reader and a leaving reader raises no EPIPE
+            self.fifo = os.open(self.fifo_path, os.O_RDWR | os.O_NONBLOCK)
+            self.consumers[self.fifo] = 0
+
+        if self.file_path:
+            self.sink = os.fdopen(os.open(self.file_path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o600), 'ab')
+
+    def claimSocket(self):
+        """
+            Removes a stale socket left at the socket path, but refuses one another process still serves
+        """
+        try:
+            mode = os.lstat(self.socket_path).st_mode
+        except FileNotFoundError:
+            return
+        if not stat.S_ISSOCK(mode):
+            raise OSError(errno.EEXIST, 'Not a socket, left untouched', self.socket_path)
+
+        probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            probe.connect(self.socket_path)
+        except ConnectionRefusedError:
+            os.unlink(self.socket_path)     # nobody listening anymore
+            return
+        finally:
+            probe.close()
+        raise OSError(errno.EADDRINUSE, 'Already served by another process', self.socket_path)
+
+    @staticmethod
+    def identity(path: str):
+        status = os.lstat(path)
+        return status.st_dev, status.st_ino
+
+    def removeCreated(self):
+        """
+            Unlinks the socket and pipe this instance created, unless something else replaced them since
+        """
+        for path, identity in self.created.items():
+            try:
+                if self.identity(path) == identity:
+                    os.unlink(path)
+            except FileNotFoundError:
+                pass
+        self.created = {}
+
+    def close(self):
+        for consumer in list(self.consumers):
+            self.disconnect(consumer)
+        if self.listener:
+            self.listener.close()
+            self.listener = None
+        self.removeCreated()
+        if self.sink:
+            self.sink.close()
+        self.selector.close()
+        os.close(self._wakeup_read)
+        os.close(self._wakeup_write)
+
+    def accept(self):
+        connection, _address = self.listener.accept()
+        connection.setblocking(False)
+        self.consumers[connection] = 0
+        self.selector.register(connection, selectors.EVENT_READ)
+
+    def disconnect(self, consumer):
+        try:
+            self.selector.unregister(consumer)
+        except KeyError:
+            pass
+        del self.consumers[consumer]
+        if consumer == self.fifo:
+            os.close(consumer)
+            self.fifo = None
+        else:
+            consumer.close()
+
+    def checkHangup(self, consumer):
+        """
+            Consumers only read: anything readable is either ignored input or a hangup
+        """
+        try:
+            if not consumer.recv(4096):
+                self.disconnect(consumer)
+        except (BlockingIOError, InterruptedError):
+            pass
+        except OSError:
+            self.disconnect(consumer)
+
+    def ingest(self):
+        """
+            Moves queued blocks into the pool (and the file sink), dropping what exceeds the pool
+        """
+        while True:
+            try:
+                data = self.queue.get_nowait()
+            except Empty:
+                return
+            with self.lock:
+                self.bytes_in += len(data)
+                if self.sink:
+                    self.sink.write(data)
+                room = max(0, self.buffer_size - len(self.pool))
+                self.pool += data[:room]
+                self.dropped += max(0, len(data) - room)
+
+    def serve(self, consumer, size: int):
+        """
+            Sends up to @size pooled bytes; whatever the consumer does not take goes back to the pool
+        """
+        with self.lock:
+            data = bytes(self.pool[:size])
+            del self.pool[:size]
+        if not data:
+            return
+        try:
+            if consumer == self.fifo:
+                sent = os.write(consumer, data)
+            else:
+                sent = consumer.send(data)
+        except (BlockingIOError, InterruptedError):
+            sent = 0
+        except OSError:
+            with self.lock:
+                self.pool[:0] = data
+            self.disconnect(consumer)
+            return
+
+        if sent < len(data):
+            with self.lock:
+                self.pool[:0] = data[sent:]
+        self.consumers[consumer] += sent
+        self.bytes_out += sent
+
+    def updateInterest(self):
+        """
+            Watches consumers for writability only while there is something to send (no busy loop)
+        """
+        writing = bool(self.pool)
+        for consumer in self.consumers:
+            if consumer == self.fifo:
+                events = selectors.EVENT_WRITE if writing else 0
+            else:
+                events = selectors.EVENT_READ | (selectors.EVENT_WRITE if writing else 0)
+            try:
+                key = self.selector.get_key(consumer)
+            except KeyError:
+                key = None
+            if key is None:
+                if events:
+                    self.selector.register(consumer, events)
+            elif not events:
+                self.selector.unregister(consumer)
+            elif key.events != events:
+                self.selector.modify(consumer, events)
@@ -1,100 +1,78 @@
 #!/usr/bin/env python
 
-from msgid import egg
-import os
 import time
-import platform
-from msgid import _
 from threading import Lock
+from typing import Tuple
+import numpy as np
 import serial
-import serial.tools.list_ports  # should pip install esptool (?)
 
-from PyQt5.QtCore import QThread, pyqtSignal
-
-######################################################################
-# NOISR protocol
-######################################################################
-
-CONTROLS = {            # https://theasciicode.com.ar
-    'START': b'\x01',   # SOH: start header control character
-    'PAUSE': b'\x03',   # ETX: indicates that it is the end of the message (interrupt)
-    'STOP': b'\x04',    # EOT: indicates the end of transmission
-    'ENQUIRE': b'\x05', # ENQ: requests a response from arduino to confirm it is ready (Equiry)
-    'OK': b'\x06',      # ACK: acknowledgement
-    'SYNC': b'\x16',    # DLE: synchronous Idle (used for transmission)
-    'ERROR': b'\x21'    # NAK: exclaim(error) special character
-}
+from PyQt5.QtCore import QObject, QThread, QTimer, QSocketNotifier, pyqtSignal
 
+import boards
+import protocol
+import transport
+from protocol import (
+    CONTROLS, MODE_ASCII, MODE_BINARY, BAUDRATE, ADC_RESOLUTION, ADC_REFERENCE, FRAME_DTYPE, ANALOG_PINS,
+    frameDtype, maxRate, pinSelection, SampleReader, StreamStatistics, FrameDecoder, toVoltage, getPorts, info,
+    NoPortError, ReadFromSerialError, InvalidPinError, ConnectionTimeout, RateTooHighError
+)
 
 ######################################################################
-# Classes, Exceptions and Threads
+# Qt front end of the NOISR protocol (see protocol.py for the engine)
 ######################################################################
 
 class NOISRProtocol(serial.Serial):
     """
         Class that interfaces with Arduino through Serial enclosed by a communication protocol
     """
-    def __init__(self, port: str, baudrate: int, timeout: int=1):
+    TRANSPORTS = ('thread', 'async')
+
+    def __init__(self, port: str, baudrate: int, timeout: int=1, transport: str='thread'):
+        """
+            Args:
+                transport: 'thread' reads in a PinReaderThread, 'async' lets the Qt event loop watch
+                    the port (EventReader; falls back to the thread where ports are not selectable)
+        """
         super().__init__(port, baudrate, timeout=timeout)
+        if transport not in self.TRANSPORTS:
+            raise ValueError(f'Unknown transport {transport}, choose from {self.TRANSPORTS}')
+        self.transport = transport
         self.serial_thread = None
     
-    def handshake(self, pin: int) -> int:
+    def handshake(self, pin: int) -> Tuple[int, str, int]:
         return NOISRProtocol.handshake(self.port, self.baudrate, pin, self.timeout)
 
     @staticmethod
-    def handshake(port: str, baudrate: int, pin: int, timeout: int=1) -> int:
+    def handshake(port: str, baudrate: int, pin: int, timeout: int=1) -> Tuple[int, str, int]:
+        """
+            See protocol.handshake
         """
-            Hanshakes Arduino
+        return protocol.handshake(port, baudrate, pin, timeout)
 
-            Returns:
-                A random number
+    def startReading(self, pin: int, read_rate: int, data_ready, mode: str=MODE_ASCII, frame_rate: int=0, timeout: int=5,
+                     start: float=0.):
         """
-        try:
-            with serial.Serial(port, baudrate, timeout=timeout) as connection:
-                connection.reset_input_buffer()
-                connection.write(CONTROLS['ENQUIRE'])
-
-                # waits for Arduino's acknowledgment for 3 seconds
-                timeout = time.time() + 3
-                while connection.read(1) != CONTROLS['OK']:
-                    if time.time() > timeout:
-                        connection.write(CONTROLS['STOP'])
-                        raise ConnectionTimeout(_('CON_ERR_TIMEOUT'))
-
-                connection.write(pin.to_bytes(1, byteorder='big', signed=False))
-
-                # Wait for Arduino to respond
-                timeout = time.time() + 3
-                while not connection.readable():
-                    if time.time() > timeout:
-                        connection.write(CONTROLS['STOP'])
-                        raise ConnectionTimeout(_('CON_ERR_TIMEOUT'))
-                    pass
-
-                return int.from_bytes(connection.read(1), byteorder='big')
-        except (serial.serialutil.SerialException, TimeoutError):
-            raise
+            Asks the board to start streaming @pin and spawns the reader (thread or event loop reader)
 
-    def startReading(self, pin: int, read_rate: int, data_ready, timeout: int=5):
+            Args:
+                pin: a pin number, or a list of pins to stream together (see protocol.pinSelection)
+                data_ready: slot receiving each voltage or, if @frame_rate is given,
+                    blocks of (times, voltages) arrays at most @frame_rate times per second
+                    (voltages are samples x channels when streaming several pins)
+                start: time of the first sample [s], to carry on from a previous reading
+        """
         try:
-            self.serial_thread = NOISRProtocol.PinReaderThread(self, read_rate)
-            self.serial_thread.data_ready.connect(data_ready)
-
-            self.write(CONTROLS['START'])
-
-            # wait for acknowledgement from Arduino for 5 seconds (timeout)
-            timer = time.time() + timeout
-            read = None
-            while read != CONTROLS['OK']:
-                read = self.read()
-                if time.time() > timer:
-                    raise ConnectionTimeout(_('CON_ERR_TIMEOUT'))
-
-            print(read)
-            print(pin)
-            self.write(pin.to_bytes(1, byteorder='little', signed=False))
-
-            print("pin was given")
+            channels = 1 if isinstance(pin, int) else len(pin)
+            if self.transport == 'async' and transport.supported(self, None):
+                self.serial_thread = NOISRProtocol.EventReader(self, read_rate, mode, frame_rate, channels, start)
+            else:
+                self.serial_thread = NOISRProtocol.PinReaderThread(self, read_rate, mode, frame_rate, channels, start)
+            if frame_rate:
+                self.serial_thread.block_ready.connect(data_ready)
+            else:
+                self.serial_thread.data_ready.connect(data_ready)
+
+            protocol.startStream(self, pin, read_rate, mode, timeout)
             self.serial_thread.start()
         except (ReadFromSerialError, serial.SerialException):
             raise
@@ -108,158 +86,260 @@ class NOISRProtocol(serial.Serial):
             Opens the serial to read asynchronosusly
         """
         data_ready = pyqtSignal(float)
+        block_ready = pyqtSignal(object, object, object)    # times, voltages, samples lost before each one (np.ndarray)
 
-        def __init__(self, serial_connection, rate: int, parent=None):
+        BLOCK_CAPACITY = 4096   # samples held before a block is flushed regardless of the frame rate
+
+        def __init__(self, serial_connection, rate: int, mode: str=MODE_ASCII, frame_rate: int=0, channels: int=1,
+                     start: float=0., parent=None):
             super().__init__(parent)
             self.serial_connection = serial_connection
-            self.rate = rate
+            self.reader = SampleReader(serial_connection, rate, mode, channels, start)
+            self.frame_rate = frame_rate
+            self.statistics = self.reader.statistics
             self._should_run = True
             self._lock = Lock()
 
+            # preallocated block for batched delivery
+            self.block_times = np.empty(self.BLOCK_CAPACITY)
+            self.block_voltages = np.empty((self.BLOCK_CAPACITY, channels) if channels > 1 else self.BLOCK_CAPACITY)
+            self.block_lost = np.empty(self.BLOCK_CAPACITY, dtype=np.int64)
+            self.block_size = 0
+            self.last_flush = time.monotonic()
+
         def stop(self):
             with self._lock:
                 self._should_run = False
 
         def run(self):
             try:
+                # no host side pacing: reads block until the board sends something (or timeout)
                 while self._should_run:
                     with self._lock:
-                        if self.serial_connection.readable():
-                            analog_value = self.serial_connection.readline().decode().strip()
-                            self.data_ready.emit(float(analog_value))
-                    self.msleep(1000 // self.rate)
+                        times, voltages, lost = self.readSamples()
+                    if self.frame_rate:
+                        self.accumulate(times, voltages, lost)
+                    else:
+                        for voltage in voltages:
+                            self.data_ready.emit(float(voltage if voltage.ndim == 0 else voltage[0]))
             except Exception as e:
                 raise e
             finally:
-                self.serial_connection.write(CONTROLS['STOP'])
+                if self.frame_rate:
+                    self.flush()
+                protocol.stopStream(self.serial_connection)
                 self.serial_connection.close()
 
-
-class NoPortError(Exception):
-    def __init__(self, message='Port error'):
-        self.message = message
-        super().__init__(self.message)
-
-
-class ReadFromSerialError(Exception):
-    def __init__(self, message='Connection error'):
-        self.message = message
-        super().__init__(self.message)
-
-
-class InvalidPinError(Exception):
-    def __init__(self, message='Invalid Pin Error'):
-        self.message = message
-        super().__init__(self.message)
-
-
-class ConnectionTimeout(Exception):
-    """
-        Exception raised when a connection times out.
-    """
-    DEFAULT_MESSAGE = "Connection timed out"
-
-    def __init__(self, port_name=None, timeout_duration=None):
+        def accumulate(self, times, voltages, lost):
+            """
+                Copies the samples into the block, flushing it at the frame rate or when full
+            """
+            while len(voltages):
+                n = min(len(voltages), self.BLOCK_CAPACITY - self.block_size)
+                end = self.block_size + n
+
+                self.block_times[self.block_size:end] = times[:n]
+                self.block_voltages[self.block_size:end] = voltages[:n]
+                self.block_lost[self.block_size:end] = lost[:n]
+                self.block_size = end
+                times, voltages, lost = times[n:], voltages[n:], lost[n:]
+
+                if self.block_size == self.BLOCK_CAPACITY:
+                    self.flush()
+
+            if time.monotonic() - self.last_flush >= 1 / self.frame_rate:
+                self.flush()
+
+        def flush(self):
+            """
+                Emits the accumulated block (if any) and starts a new one
+            """
+            self.last_flush = time.monotonic()
+            if not self.block_size:
+                return
+            self.block_ready.emit(
+                self.block_times[:self.block_size].copy(),
+                self.block_voltages[:self.block_size].copy(),
+                self.block_lost[:self.block_size].copy())
+            self.block_size = 0
+
+        @property
+        def rate(self) -> int:
+            return self.reader.rate
+
+        @rate.setter
+        def rate(self, rate: int):
+            # legacy firmware only: ASCII sample times are synthesized from the rate
+            self.reader.rate = rate
+
+        def readSamples(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+            return self.reader.readSamples()
+
+    class EventReader(QObject):
         """
-            Initializes a ConnectionTimeout instance.
-
-            Args:
-                port_name (str, optional): The name of the port that timed out. Defaults to None.
-                timeout_duration (int, optional): The duration of the timeout in seconds. Defaults to None.
+            Reads the port from the Qt event loop instead of a thread: no lock, no polling, one
+            wakeup per burst of bytes. Same signals and interface as PinReaderThread
         """
-        self.port_name = port_name
-        self.timeout_duration = timeout_duration
-        if port_name and timeout_duration:
-            self.message = f'Timed out connecting to port {port_name} after {timeout_duration} seconds'
-        elif port_name:
-            self.message = f'Timed out connecting to port {port_name}'
-        elif timeout_duration:
-            self.message = f'Timed out after {timeout_duration} seconds'
-        else:
-            self.message = self.DEFAULT_MESSAGE
-        super().__init__(self.message)
-
+        data_ready = pyqtSignal(float)
+        block_ready = pyqtSignal(object, object, object)    # times, voltages, samples lost before each one (np.ndarray)
+        finished = pyqtSignal()
 
-######################################################################
-# Functions and utils
-######################################################################
+        def __init__(self, serial_connection, rate: int, mode: str=MODE_ASCII, frame_rate: int=0, channels: int=1,
+                     start: float=0., parent=None):
+            super().__init__(parent)
+            self.serial_connection = serial_connection
+            self.reader = SampleReader(serial_connection, rate, mode, channels, start)
+            self.frame_rate = frame_rate
+            self.statistics = self.reader.statistics
+            self.port = transport.SerialTransport(serial_connection, self.reader, self.accumulate, self.onError, QtReaderLoop())
+            self.pending = []
+            self.error = None
+            self.running = False
+
+            # blocks are handed over at the frame rate, whatever the bursts look like
+            self.timer = QTimer(self)
+            self.timer.setInterval(max(1, 1000 // frame_rate) if frame_rate else 1000)
+            self.timer.timeout.connect(self.flush)
+
+        def start(self):
+            self.running = True
+            self.port.start()
+            if self.frame_rate:
+                self.timer.start()
 
-def cross_platform(implementations: dict):
+        def stop(self):
+            if not self.running:
+                return
+            self.running = False
+            self.port.close()
+            self.timer.stop()
+            self.flush()
+            try:
+                protocol.stopStream(self.serial_connection)
+            except serial.SerialException:
+                pass    # the board is already gone
+            self.serial_connection.close()
+            # queued, like a thread's finished: the caller is done stopping when it runs
+            QTimer.singleShot(0, self.finished.emit)
+
+        def wait(self) -> bool:
+            return True
+
+        def isRunning(self) -> bool:
+            return self.running
+
+        def onError(self, error):
+            self.error = error
+            self.stop()
+
+        def accumulate(self, times, voltages, lost):
+            if self.frame_rate:
+                self.pending.append((times, voltages, lost))
+            else:
+                for voltage in voltages:
+                    self.data_ready.emit(float(voltage if voltage.ndim == 0 else voltage[0]))
+
+        def flush(self):
+            if not self.pending:
+                return
+            blocks, self.pending = self.pending, []
+            self.block_ready.emit(*(np.concatenate(column) for column in zip(*blocks)))
+
+        @property
+        def rate(self) -> int:
+            return self.reader.rate
+
+        @rate.setter
+        def rate(self, rate: int):
+            self.reader.rate = rate
+
+
+class QtReaderLoop:
     """
-        This decorator returns a function that selects the correct implementation based on the operating system
-
-        Args:
-            implementations (dict): a map of operating system (key) and corresponding implementation (value)
-
-        Returns:
-            function: the correct implementation based on the operating system
-
-        Raises:
-            OSError: if the operating system is not supported
+        The add_reader / remove_reader half of an asyncio loop on top of the Qt event loop
+        (QSocketNotifier, like qasync does), so transport.SerialTransport runs in the GUI thread
     """
-    def wrapper(func):
-        def implementationSelector():
-            try:
-                system = platform.system().lower()
-                if system in implementations:
-                    return implementations[system]()
-                raise OSError('Unsupported operating system')
-            except Exception as implementation_error:
-                raise implementation_error
-        return implementationSelector
-    return wrapper
+    def __init__(self):
+        self.notifiers = {}
 
+    def add_reader(self, fd: int, callback, *args):
+        self.remove_reader(fd)
+        notifier = QSocketNotifier(fd, QSocketNotifier.Read)
+        notifier.activated.connect(lambda _fd: callback(*args))
+        self.notifiers[fd] = notifier
 
-def getArduinoPortsOnLinux():
-    """
-        Returns:
-            list: all the available serial ports on a Linux system
-    """
-    return [os.path.join('/dev', file_name) for file_name in os.listdir('/dev') if file_name.startswith('ttyACM')]
+    def remove_reader(self, fd: int):
+        notifier = self.notifiers.pop(fd, None)
+        if notifier:
+            notifier.setEnabled(False)
+            notifier.deleteLater()
 
 
-def getArduinoPortsOnMac():
+class BoardsSource:
     """
-        Returns:
-            list: all the available serial ports on a Mac system
+        Streams several boards at once through a boards.BoardManager: same interface as NOISRProtocol,
+        blocks carry one channel per board and pin
     """
-    return [port.device for port in serial.tools.list_ports.comports() if 'Arduino' in port.description and 'usbmodem' in port.device]
+    def __init__(self, ports, baudrate: int=BAUDRATE):
+        self.ports = list(ports)
+        self.port = ', '.join(self.ports)
+        self.baudrate = baudrate
+        self.manager = None
+        self.serial_thread = None
 
+    def labels(self, pins) -> list:
+        return [f'{port} A{pin}' for port in self.ports for pin in sorted(set(pins))]
 
-def getArduinoPortsOnWindows():
-    """
-        Returns:
-            list: all the available serial ports on a Windows system
-    """
-    return [port.device for port in serial.tools.list_ports.comports() if 'Arduino' in port.description]
+    def startReading(self, pin, read_rate: int, data_ready, mode: str=MODE_BINARY, frame_rate: int=30, timeout: int=5,
+                     start: float=0.):
+        """
+            Handshakes and starts every board; @mode is negotiated per board and ignored
+        """
+        self.manager = boards.BoardManager(self.ports, pin, read_rate, self.baudrate)
+        self.serial_thread = BoardsSource.ManagerThread(self.manager, frame_rate or 30, start)
+        self.serial_thread.block_ready.connect(data_ready)
+        self.serial_thread.start()
 
+    def stopReading(self):
+        self.serial_thread.stop()
+        self.serial_thread.wait()
 
-@cross_platform({
-    'linux': getArduinoPortsOnLinux,
-    'darwin': getArduinoPortsOnMac,
-    'windows': getArduinoPortsOnWindows
-})
-def getPorts():
-    """
-        Returns:
-            list: all the available serial ports on the current system
-    """
-    pass
+    class ManagerThread(QThread):
+        """
+            Merges the boards and emits the merged blocks at most @frame_rate times per second
+        """
+        block_ready = pyqtSignal(object, object, object)    # times, voltages (samples x channels), samples lost
 
+        def __init__(self, manager, frame_rate: int, start: float=0., parent=None):
+            super().__init__(parent)
+            self.manager = manager
+            self.frame_rate = frame_rate
+            self.start_time = start
+            self._should_run = True
 
-# https://pyserial.readthedocs.io/en/stable/pyserial_api.html
+        @property
+        def statistics(self):
+            """
+                Per-board counters
+            """
+            return self.manager
 
-def info(connection):
-    """
-        Receives a @connection string and returns a representative dict
-    """
-    pairsList = str(connection).split("(")[1].split(")")[
-        0].split(",")      # remove special characters
-    pairsList = [pair.strip() for pair in pairsList]
+        @property
+        def rate(self) -> int:
+            return self.manager.rate
 
-    parsedConnection = {}
-    for pair in pairsList:  # splits into key-value pairs
-        key, value = pair.split("=")
-        parsedConnection[key.strip()] = value.strip()
+        def stop(self):
+            self._should_run = False
 
-    return parsedConnection
+        def run(self):
+            period = 1 / self.frame_rate
+            self.manager.start(self.start_time)
+            try:
+                while self._should_run and self.manager.is_alive:
+                    started = time.monotonic()
+                    block = self.manager.read(period)
+                    if len(block):
+                        self.block_ready.emit(block.times, block.voltages, block.lost)
+                    self.msleep(max(0, int((started + period - time.monotonic()) * 1000)))
+            finally:
+                self.manager.stop()
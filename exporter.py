@@ -0,0 +1,65 @@
+#!/usr/bin/env python
+
+import numpy as np
+
+######################################################################
+# Text exports (CSV/TXT) straight from the sample columns
+######################################################################
+
+HEADERS = ['Time', 'Voltage', 'Moving Average', 'Comment']
+CHUNK_ROWS = 1 << 16
+
+
+def exportText(path: str, times, voltages, averages=None, comments=None, comment_texts=('',), delimiter: str='\t', progress=None):
+    """
+        Writes the samples as delimited text, formatting whole chunks at once instead of row by row
+
+        Args:
+            averages: moving average column (NaN or None are left blank)
+            comments: index of each row's comment in @comment_texts (None for no comments)
+            progress: optional callable receiving the fraction of rows written
+    """
+    n_rows = len(times)
+    texts = np.array([quote(text, delimiter) for text in comment_texts], dtype=object)
+    row_format = delimiter.join(['%.6f', '%.9g', '%s', '%s']) + '\n'
+
+    with open(path, 'w', newline='') as export:
+        export.write(delimiter.join(HEADERS) + '\n')
+
+        for start in range(0, n_rows, CHUNK_ROWS):
+            end = min(start + CHUNK_ROWS, n_rows)
+
+            columns = np.empty((end - start, 4), dtype=object)
+            columns[:, 0] = times[start:end]
+            columns[:, 1] = voltages[start:end]
+            columns[:, 2] = '' if averages is None else formatAverages(averages[start:end])
+            columns[:, 3] = '' if comments is None else texts[comments[start:end]]
+
+            # one C-level formatting pass over the whole chunk
+            text = (row_format * (end - start)) % tuple(columns.ravel())
+            export.write(text)
+
+            if progress:
+                progress(end / n_rows)
+
+
+def formatAverages(averages) -> np.ndarray:
+    """
+        Formats the moving average column on its own, so that only its NaN are left blank
+    """
+    averages = np.asarray(averages, dtype=np.float64)
+    texts = np.full(len(averages), '', dtype=object)
+    known = ~np.isnan(averages)
+    n_known = int(np.count_nonzero(known))
+    if n_known:
+        texts[known] = (('%.9g\n' * n_known) % tuple(averages[known])).split('\n')[:-1]
+    return texts
+
+
+def quote(text: str, delimiter: str) -> str:
+    """
+        Quotes a comment so that it survives as a single CSV field
+    """
+    if delimiter in text or '"' in text or '\n' in text:
+        return '"' + text.replace('"', '""') + '"'
+    return text
@@ -0,0 +1,191 @@
+import hashlib
+import numpy as np
+
+######################################################################
+# Random bit extraction: thresholding, debiasing and conditioning
+#
+#   voltages -> bits (>= threshold) -> [von Neumann] -> [XOR folding]
+#            -> bytes (np.packbits) -> [hash conditioning] -> words
+#
+# Every stage keeps the few bits/bytes it could not use yet, so the output
+# does not depend on how the samples were split into blocks
+######################################################################
+
+WORD_SIZES = (8, 16, 32, 64)
+
+
+class VonNeumann:
+    """
+        Removes bias from independent bits: pairs 01 -> 0, 10 -> 1, 00 and 11 are dropped
+    """
+    def __init__(self):
+        self.carry = np.empty(0, dtype=np.uint8)
+
+    def __call__(self, bits: np.ndarray) -> np.ndarray:
+        bits = np.concatenate((self.carry, bits))
+        n_pairs = bits.size // 2
+        self.carry = bits[2 * n_pairs:]
+        pairs = bits[:2 * n_pairs].reshape(n_pairs, 2)
+        return pairs[pairs[:, 0] != pairs[:, 1], 0]
+
+
+class XorFold:
+    """
+        XORs each group of @factor consecutive bits into one (bias shrinks geometrically with @factor)
+    """
+    def __init__(self, factor: int=2):
+        if factor < 2:
+            raise ValueError('XOR folding needs at least 2 bits per output bit')
+        self.factor = factor
+        self.carry = np.empty(0, dtype=np.uint8)
+
+    def __call__(self, bits: np.ndarray) -> np.ndarray:
+        bits = np.concatenate((self.carry, bits))
+        n_groups = bits.size // self.factor
+        self.carry = bits[n_groups * self.factor:]
+        return np.bitwise_xor.reduce(bits[:n_groups * self.factor].reshape(n_groups, self.factor), axis=1)
+
+
+class HashConditioner:
+    """
+        Compresses every @input_size bytes into one digest (e.g. 64 -> 32 bytes with sha256),
+        spreading whatever entropy the input has over the output
+    """
+    def __init__(self, algorithm: str='sha256', input_size: int=64):
+        self.algorithm = algorithm
+        self.input_size = input_size
+        self.digest_size = hashlib.new(algorithm).digest_size
+        if input_size < self.digest_size:
+            raise ValueError(f'{algorithm} conditioning needs at least {self.digest_size} input bytes per digest')
+        self.carry = b''
+
+    def __call__(self, data: bytes) -> bytes:
+        data = self.carry + data
+        n_inputs = len(data) // self.input_size
+        self.carry = data[n_inputs * self.input_size:]
+        view = memoryview(data)
+        return b''.join(
+            hashlib.new(self.algorithm, view[i * self.input_size:(i + 1) * self.input_size]).digest()
+            for i in range(n_inputs))
+
+
+class BitExtractor:
+    """
+        Turns voltage blocks into a whitened random byte stream
+
+        Usage:
+            extractor = BitExtractor(threshold=1.4, conditioning=('von_neumann', 'hash'))
+            data = extractor.extract(voltages)      # whole words only
+            words = toWords(data, extractor.word_size)
+    """
+    CONDITIONING = ('von_neumann', 'xor_fold', 'hash')
+
+    def __init__(self, threshold: float, word_size: int=8, conditioning=(), fold: int=2,
+                 hash_algorithm: str='sha256', hash_input: int=64):
+        """
+            Args:
+                threshold: voltages at or above it are 1 bits, below it 0 bits
+                word_size: bits per output word, one of WORD_SIZES
+                conditioning: stages from CONDITIONING, applied in that order ('hash' always last)
+                fold: bits XORed together by 'xor_fold'
+                hash_algorithm, hash_input: hashlib algorithm and input bytes per digest for 'hash'
+        """
+        if word_size not in WORD_SIZES:
+            raise ValueError(f'Word size must be one of {WORD_SIZES}')
+        unknown = set(conditioning) - set(self.CONDITIONING)
+        if unknown:
+            raise ValueError(f'Unknown conditioning {sorted(unknown)}, choose from {self.CONDITIONING}')
+
+        self.threshold = threshold
+        self.word_size = word_size
+        self.conditioning = tuple(conditioning)
+
+        self.bit_stages = []
+        if 'von_neumann' in conditioning:
+            self.bit_stages.append(VonNeumann())
+        if 'xor_fold' in conditioning:
+            self.bit_stages.append(XorFold(fold))
+        self.hash = HashConditioner(hash_algorithm, hash_input) if 'hash' in conditioning else None
+
+        self.bit_carry = np.empty(0, dtype=np.uint8)   # < 8 bits waiting for a full byte
+        self.word_carry = b''                           # < 1 word waiting to be completed
+
+        self.bits_in = 0        # raw bits thresholded
+        self.ones_in = 0
+        self.bytes_out = 0
+        self.ones_out = 0
+
+    def extract(self, voltages: np.ndarray) -> bytes:
+        """
+            Returns:
+                The random bytes completed by @voltages (a multiple of word_size / 8)
+        """
+        bits = (np.asarray(voltages) >= self.threshold).view(np.uint8)
+        self.bits_in += bits.size
+        self.ones_in += int(np.count_nonzero(bits))
+
+        for stage in self.bit_stages:
+            bits = stage(bits)
+
+        bits = np.concatenate((self.bit_carry, bits))
+        n_bytes = bits.size // 8
+        self.bit_carry = bits[8 * n_bytes:]
+        data = np.packbits(bits[:8 * n_bytes]).tobytes()
+
+        if self.hash:
+            data = self.hash(data)
+
+        data = self.word_carry + data
+        word_bytes = self.word_size // 8
+        n_words = len(data) // word_bytes
+        self.word_carry = data[n_words * word_bytes:]
+        data = data[:n_words * word_bytes]
+
+        self.bytes_out += len(data)
+        self.ones_out += popcount(data)
+        return data
+
+    @property
+    def bias(self) -> float:
+        """
+            Fraction of ones in the raw thresholded bits (0.5 when unbiased)
+        """
+        return self.ones_in / self.bits_in if self.bits_in else 0.
+
+    @property
+    def output_bias(self) -> float:
+        bits_out = 8 * self.bytes_out
+        return self.ones_out / bits_out if bits_out else 0.
+
+    @property
+    def efficiency(self) -> float:
+        """
+            Output bits per raw bit
+        """
+        return 8 * self.bytes_out / self.bits_in if self.bits_in else 0.
+
+    def __str__(self):
+        return (f'{self.bits_in} bits in (ones {100 * self.bias:.2f}%), '
+                f'{self.bytes_out} bytes out (ones {100 * self.output_bias:.2f}%, '
+                f'efficiency {100 * self.efficiency:.1f}%)')
+
+
+POPCOUNT = np.array([bin(byte).count('1') for byte in range(256)], dtype=np.uint8)
+
+
+def popcount(data: bytes) -> int:
+    """
+        Returns:
+            The number of set bits in @data
+    """
+    return int(POPCOUNT[np.frombuffer(data, dtype=np.uint8)].sum(dtype=np.int64))
+
+
+def toWords(data: bytes, word_size: int=8) -> np.ndarray:
+    """
+        Returns:
+            @data as big-endian unsigned words of @word_size bits (trailing partial word ignored)
+    """
+    word_bytes = word_size // 8
+    usable = len(data) - len(data) % word_bytes
+    return np.frombuffer(data[:usable], dtype=f'>u{word_bytes}')
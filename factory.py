@@ -56,19 +56,20 @@ def AnalyzerTab(layoutType, widget):
 
 def AnalogPinChoicer(self):
     """
-    Factors a group for radio pins
+    Factors a group for pin checkboxes (several pins are read together)
     """
     self.groupPinChoice = QGroupBox('Analog PIN')
     self.groupbox = QButtonGroup()
+    self.groupbox.setExclusive(False)
 
     layoutGridPins = QGridLayout(self.groupPinChoice)
     self.analogPin = []
     for i in range(6):
         row, col = divmod(i, 3)    # organizes in a 2x3 grid
-        btRadio = QRadioButton(f'A{i}')
-        self.groupbox.addButton(btRadio, i)
-        layoutGridPins.addWidget(btRadio, row, col)
-        self.analogPin.append(btRadio)
+        btCheck = QCheckBox(f'A{i}')
+        self.groupbox.addButton(btCheck, i)
+        layoutGridPins.addWidget(btCheck, row, col)
+        self.analogPin.append(btCheck)
 
     self.analogPin[0].setChecked(True)
     self.groupPinChoice.setLayout(layoutGridPins)
@@ -329,6 +330,8 @@ def ToolBar(self, toolbarModel, name):
                 function = getattr(self, action['action'])
                 items = function()
                 comboBox.addItems(items)
+            if action.get('editable', 'False').lower() == 'true':
+                comboBox.setEditable(True)
             if 'currentIndexSetChanged' in action:
                 comboBox.currentIndexChanged.connect(getattr(self, action['currentIndexSetChanged']))
             toolbar.addWidget(comboBox)
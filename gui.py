@@ -1,30 +1,52 @@
 #!/usr/bin/env python
 
 import analyzer
-import json, time, serial, csv
+import json, time, serial
 import pyqtgraph as pg
 import factory, connection
 import utils
+import os
+import shutil
+import recorder
+import exporter
+import iad
+import replay
+import sonic
+import numeric
+import overview
+from extractor import BitExtractor
+from byteserver import ByteServer
 
-import array
 import numpy as np
-from collections import deque
+from ringbuffer import RingBuffer
+from stabilizer import StabilityDetector
 from platform import system
 from msgid import _, egg
 from PyQt5.QtCore import (
-        QSize, Qt, QDateTime, QTimer
+        QSize, Qt, QDateTime, QTimer, QThread, pyqtSignal,
+        QCoreApplication, QEvent
         )
 from PyQt5.QtWidgets import (
         QMainWindow, QVBoxLayout, QWidget,
         QHBoxLayout, QTabWidget, QTextEdit,
-        QTableWidget, QTextEdit, QTableWidgetItem,
-        QFileDialog
+        QFileDialog, QInputDialog, QApplication
         )
 from PyQt5.QtGui import (
         QIcon, QIntValidator
         )
 
 
+CHANNEL_PENS = ('c', 'm', 'b', '#FFA500', '#FF69B4')   # curves of the pins after the first one
+
+REPLAY_SPEEDS = {     # label: speed factor (0 is as fast as the GUI can take)
+    '1x': 1,
+    '2x': 2,
+    '10x': 10,
+    '100x': 100,
+    'as fast as possible': 0
+}
+
+
 ######################################################################
 # PyQt window for a Noisr instance
 ######################################################################         
@@ -45,11 +67,13 @@ class NoiserGUI(QMainWindow):
         ## window setup
         window  = configs['main_window']
         meta    = configs['meta']
+        settings = configs['settings']
 
         self.setupEnvironment()
 
         self.name       = meta['name']
-        self.filename   = utils.getFunName(meta['extension'], '_')
+        self.extension  = meta['extension']
+        self.filename   = utils.getFunName(self.extension, '_')
         self.title_canonical = f"{self.name} {meta['version']} {meta['dev_phase']}"
         self.title      = f'{self.title_canonical} — {self.filename}'
 
@@ -59,6 +83,29 @@ class NoiserGUI(QMainWindow):
         self.is_saved   = False
         self.is_signal_stabilized = False
         self.serial_connection = None
+        self.protocol_mode = connection.MODE_ASCII
+        self.firmware_version = 0
+        self.frame_rate = settings.get('frame_rate', 30)   # plot refreshes per second
+        self.performance = settings.get('performance', 'high')  # plot rendering mode, see analyzer.PERFORMANCE_MODES
+        self.baudrate = settings.get('baudrate', connection.BAUDRATE)  # noiserino.ino's Serial.begin
+        self.transport = settings.get('transport', 'thread')    # 'async' reads the board from the event loop
+        self.buffer_size = settings.get('buffer_size', 100000)  # samples kept for display (decimated to the plot width)
+        self.stabilization_settings = settings.get('stabilization', {})
+        self.moving_average_settings = settings.get('moving_average', {})
+        self.spectrum_settings = settings.get('spectrum', {})
+        self.extractor = BitExtractor(0., **settings.get('extractor', {}))  # threshold set with the spinbox
+        self.battery = numeric.TestBattery(**settings.get('randomness_tests', {}))
+        self.test_thread = None
+        self.loaded_capture = None
+        self.overview_thread = None
+        self.browse_pending = False     # the loaded capture waits for its overview to be browsed
+        self.output_settings = settings.get('output', {})
+        self.byte_server = None
+        self.recorder_settings = settings.get('recorder', {})
+        self.recorder = None
+        self.export_thread = None
+        self.captures_folder = configs['env_paths'].get('captures', './captures/')
+        self.capture_path = os.path.join(self.captures_folder, self.filename)
 
         self.timer = QTimer(self)
         self.timer.timeout.connect(self.onReadStopButtonClick)
@@ -85,10 +132,7 @@ class NoiserGUI(QMainWindow):
 
         self.log.i(_('ENV_OK'))
         self.onConnectButtonClick()
-
-        self.bitsize    = 8      # 32 bit word
-        self.wordbit    = array.array('B', [0] * self.bitsize)
-        self.bitcounter = 0
+        self.startByteServer()
 
     ############################
     # Inner classes
@@ -144,6 +188,62 @@ class NoiserGUI(QMainWindow):
                 self.i(solution)
     
 
+    class ExportThread(QThread):
+        """
+            Writes the spreadsheet samples as text off the GUI thread
+        """
+        progress = pyqtSignal(int)          # percentage
+        done = pyqtSignal(str, object)      # filename, error (None if all went well)
+
+        def __init__(self, samples, filename, delimiter, parent=None):
+            super().__init__(parent)
+            # snapshot: rows appended while exporting are not part of this export
+            self.columns = (samples.column('times'), samples.column('voltages'), samples.column('averages'), samples.column('comments'))
+            self.comment_texts = list(samples.comment_texts)
+            self.filename = filename
+            self.delimiter = delimiter
+
+        def run(self):
+            try:
+                exporter.exportText(self.filename, *self.columns, self.comment_texts, self.delimiter,
+                                    lambda fraction: self.progress.emit(int(fraction * 100)))
+                self.done.emit(self.filename, None)
+            except OSError as error:
+                self.done.emit(self.filename, error)
+
+
+    class TestThread(QThread):
+        """
+            Runs the randomness test battery over one sequence off the GUI thread
+        """
+        done = pyqtSignal(object)           # results, see numeric.binary_tests
+
+        def __init__(self, battery, sequence, parent=None):
+            super().__init__(parent)
+            self.battery = battery
+            self.sequence = sequence
+
+        def run(self):
+            self.done.emit(self.battery.run(self.sequence))
+
+
+    class OverviewThread(QThread):
+        """
+            Opens the overview of a loaded capture off the GUI thread (building it if missing)
+        """
+        done = pyqtSignal(object, object, object)   # capture, its overview.Overview (None on error), error
+
+        def __init__(self, capture, parent=None):
+            super().__init__(parent)
+            self.capture = capture
+
+        def run(self):
+            try:
+                self.done.emit(self.capture, overview.Overview.build(self.capture), None)
+            except OSError as error:
+                self.done.emit(self.capture, None, error)
+
+
     ############################
     # Event handling methods
     ############################
@@ -159,27 +259,109 @@ class NoiserGUI(QMainWindow):
             current_port = self.ids['combobox_connected_ports'].currentText()
             if current_port != 'no board':
                 try:
-                    self.serial_connection = connection.NOISRProtocol(
-                        current_port, baudrate=9600, timeout=1)
-
-                    self.serial_connection.startReading(
-                        self.selected_pin,
-                        self.ids['spinbox_read_rate'].value(),
-                        self.update_plot)
-
-                    self.is_reading = True
-                    self.__startReadingSetup()
-                except (connection.ReadFromSerialError, serial.SerialException) as err:
+                    self.startReadingFrom(connection.NOISRProtocol(
+                        current_port, baudrate=self.baudrate, timeout=1, transport=self.transport))
+                except (connection.ReadFromSerialError, connection.InvalidPinError, connection.RateTooHighError,
+                        serial.SerialException) as err:
                     self.log.x(err)
         else:
             self.serial_connection.stopReading()
             #self.serial_connection.close()
-
             self.is_reading = False
+
+            # the reader flushes its last block when stopping: plot and record it before closing up
+            QCoreApplication.sendPostedEvents(None, QEvent.MetaCall)
+            self.log.i(f'{_("READ_STATS")}{self.serial_connection.serial_thread.statistics}')
+            self.log.i(f'{_("BITS_STATS")}{self.extractor}')
+
             self.__stopReadingSetup()
 
 
-    def onConnectButtonClick(self, baudrate : int=9600) -> None:
+    def startReadingFrom(self, source) -> None:
+        """
+            Starts reading from @source (a board connection or a replayed capture)
+        """
+        self.channel_boards = []
+        if isinstance(source, replay.ReplaySource):
+            pins, selection = source.pins, None
+            self.setupChannels(pins, source.labels)
+        elif isinstance(source, connection.BoardsSource):
+            # every board reads the selected pins, negotiated board by board
+            pins, selection = self.selected_pins * len(source.ports), self.selected_pins
+            self.channel_boards = [port for port in source.ports for _pin in self.selected_pins]
+            self.setupChannels(pins, source.labels(self.selected_pins))
+        else:
+            pins = self.selected_pins
+            selection = connection.pinSelection(pins, self.protocol_mode, self.firmware_version)
+            self.setupChannels(pins)
+
+        # the board restarts its clock on every START: the time line carries on from the last sample shown
+        rate = self.ids['spinbox_read_rate'].value()
+        start = self.buffer.last('time') + 1 / rate if self.buffer else 0.
+
+        self.browse_pending = False
+        self.plotter.stopBrowsing()
+        self.serial_connection = source
+        self.serial_connection.startReading(
+            selection,
+            rate,
+            self.update_plot,
+            self.protocol_mode,
+            self.frame_rate,
+            start=start)
+        self.serial_connection.serial_thread.finished.connect(self.onReaderFinished)
+
+        self.is_reading = True
+        self.__startReadingSetup()
+
+
+    def onReaderFinished(self) -> None:
+        """
+            Cleans up when the reader ends on its own (end of a replay, lost board)
+        """
+        if self.is_reading:
+            self.onReadStopButtonClick()
+
+
+    def onReplayClick(self) -> None:
+        """
+            Replays a recorded capture through the live pipeline, no board needed
+        """
+        if self.is_reading:
+            self.log.e(_('ERR_THREAD_RUNNING'))
+            return
+
+        filename, _filter = QFileDialog.getOpenFileName(self, 'Replay instance', '', 'IAD files (*.iad);;All Files (*)')
+        if not filename:
+            return
+        speed, ok = QInputDialog.getItem(self, 'Replay', 'Speed:', list(REPLAY_SPEEDS), 0, False)
+        if not ok:
+            return
+
+        try:
+            self.startReadingFrom(replay.ReplaySource(filename, REPLAY_SPEEDS[speed]))
+            self.log.i(f'{_("READ_REPLAY")}{filename} ({speed})')
+        except (OSError, iad.InvalidCaptureError) as error:
+            self.log.x(error)
+
+
+    def onReadAllBoardsClick(self) -> None:
+        """
+            Streams every connected board at once, one reader per port, merged on a common clock
+        """
+        if self.is_reading:
+            self.log.e(_('ERR_THREAD_RUNNING'))
+            return
+
+        ports = [port for port in self.getArduinoPorts() if port != self.NO_BOARD]
+        if not ports:
+            return
+
+        self.log.i(f'{_("READ_BOARDS")}{", ".join(ports)}')
+        self.startReadingFrom(connection.BoardsSource(ports, self.baudrate))
+
+
+    def onConnectButtonClick(self) -> None:
         """
             Opens connection to ackwonledge Arduino
         """
@@ -194,14 +376,36 @@ class NoiserGUI(QMainWindow):
 
         try:
             self.log.i(f'{_("CON_HANDSHAKE_PORT")}{self.selected_pin}')
-            response = connection.NOISRProtocol.handshake(port, baudrate, self.selected_pin, timeout=1)
+            response, self.protocol_mode, self.firmware_version = connection.NOISRProtocol.handshake(port, self.baudrate, self.selected_pin, timeout=1)
             self.log.i(f'{_("CON_ARDUINO_SAYS")}{egg(response)}')
+            self.log.i(f'{_("CON_MODE")}{self.protocol_mode}')
         except Exception as error:
             self.log.x(error)
 
 
     def __startReadingSetup(self):
         self.log.i(_('READ_START'))
+        self.moving_average.reset()
+        self.stabilizer.clear()
+        self.battery.clear()
+        self.spectrum.clear()
+        self.spectrum.setRate(self.serial_connection.serial_thread.rate)
+        self.spectrum_timer.start()
+
+        # streams every sample to disk while reading, appending to this instance's capture
+        if not isinstance(self.serial_connection, replay.ReplaySource):
+            os.makedirs(os.path.dirname(self.capture_path), exist_ok=True)
+            metadata = self.captureMetadata()
+            try:
+                matches = iad.appendable(self.capture_path, metadata)
+            except (OSError, iad.InvalidCaptureError):
+                matches = False
+            if not matches:
+                # other pins or another rate: the readings so far stay in their own capture
+                self.capture_path = self.freshCapturePath()
+            self.recorder = recorder.Recorder(self.capture_path, metadata, **self.recorder_settings)
+            self.recorder.start()
+            self.log.i(f'{_("RECORD_START")}{self.capture_path}')
 
         self.btPlayPause.setText("STOP")
         self.statusbar.setStyleSheet('background-color: rgb(118, 178, 87);')
@@ -213,6 +417,17 @@ class NoiserGUI(QMainWindow):
         self.log.i(_('READ_STOP'))
         self.log.i(_('CON_CLOSED'))
 
+        self.spectrum_timer.stop()
+        self.updateSpectrum()
+
+        if self.recorder:
+            self.recorder.stop()
+            if self.recorder.error:
+                self.log.x(self.recorder.error, _('RECORD_SOL_ERROR'))
+            else:
+                self.log.v(f'{_("RECORD_STOP")}{self.recorder.samples}')
+            self.recorder = None
+
         self.btPlayPause.setText('START')
         self.statusbar.setStyleSheet('background-color: rgb(0, 122, 204);')
         self.statusbar.showMessage(_('STATUSBAR_READ_STOP'), 1000)
@@ -245,9 +460,9 @@ class NoiserGUI(QMainWindow):
         """
             Changes scale of the plotter according to max and min values
         """
-        if self.data_queue:
-            voltages_in_queue = self.data_voltages_queue
-            min_val, max_val = min(voltages_in_queue), max(voltages_in_queue)
+        statistics = self.stabilizer.statistics
+        if statistics:
+            min_val, max_val = statistics.min, statistics.max
 
             min_val = max(int(min_val), -12)
             max_val = min(int(max_val + 1), 12)
@@ -298,6 +513,13 @@ class NoiserGUI(QMainWindow):
         #self.serial_reader.stop()
         #self.serial_reader.wait()
         if not self.is_reading:
+            if self.overview_thread:
+                self.overview_thread.wait()
+            if self.byte_server:
+                self.byte_server.stop()
+                self.log.i(f'{_("OUTPUT_STOP")}{self.byte_server}')
+                if self.byte_server.error:
+                    self.log.e(f'{_("OUTPUT_ERROR")}{self.byte_server.error}')
             event.accept()
         else:
             self.log.e(_('ERR_THREAD_RUNNING'))
@@ -362,13 +584,64 @@ class NoiserGUI(QMainWindow):
             self.clamp_function.hide()
 
 
-    def onAnalogPinChanged(self):
+    def toggleMovingAverage(self, checked):
+        if checked:
+            self.average_function.setData(self.times, self.buffer.view('average'), connect='finite')
+            self.average_function.show()
+        else:
+            self.average_function.hide()
+
+
+    def onAnalogPinChanged(self, button=None):
+        """
+            Sets up environment when the user chooses the analog pins to read from; the first one
+            feeds the bits, stabilization, table and spectrum, every one gets a curve
+        """
+        pins = [pin for pin, checkbox in enumerate(self.analogPin) if checkbox.isChecked()]
+        if not pins:    # at least one pin is read
+            button.setChecked(True)
+            pins = [self.groupbox.id(button)]
+
+        self.selected_pins = pins
+        self.selected_pin = pins[0]
+        self.plotter.setTitle(f'Data from PIN {", ".join(f"A{pin}" for pin in pins)}')
+        self.statusbar.showMessage(_('STATUSBAR_PIN_CHANGED') + ', '.join(map(str, pins)), 1000)
+
+
+    def setupChannels(self, pins, labels=None):
+        """
+            Gives each channel after the first one its own ring buffer and curve, aligned with self.buffer
+            (samples from before a channel was read are NaN)
+
+            Args:
+                pins: pin of each channel
+                labels: name of each channel (A<pin> by default, the board too when reading several)
+        """
+        pins = list(pins)
+        labels = list(labels or (f'A{pin}' for pin in pins))
+        if labels == self.channel_labels and all(len(buffer) == len(self.buffer) for buffer in self.channel_buffers.values()):
+            self.channel_pins = pins
+            return  # same channels: the curves carry on
+
+        for curve in self.channel_curves.values():
+            self.plotter.removeItem(curve)
+
+        self.channel_pins = pins
+        self.channel_labels = labels
+        self.channel_buffers = {}
+        self.channel_curves = {}
+        for i, label in enumerate(labels[1:]):
+            self.channel_buffers[label] = RingBuffer(self.buffer_size, ('voltage',))
+            self.channel_buffers[label].extend(np.full(len(self.buffer), np.nan))
+            self.channel_curves[label] = self.plotter.plot(pen=CHANNEL_PENS[i % len(CHANNEL_PENS)], width=3, name=label)
+
+
+    def updateChannels(self, new_channels):
         """
-            Sets up environment when the user chooses another analog pin to read from
+            Demultiplexes a (samples x channels) block into the buffers of the channels after the first one
         """
-        self.selected_pin = self.groupbox.checkedId()
-        self.plotter.setTitle(f'Data from PIN A{self.selected_pin}')
-        self.statusbar.showMessage(_('STATUSBAR_PIN_CHANGED') + str(self.selected_pin), 1000)
+        for column, label in enumerate(self.channel_labels[1:], start=1):
+            self.channel_buffers[label].extend(new_channels[:, column])
 
 
     def createAnalyzer(self):
@@ -380,30 +653,43 @@ class NoiserGUI(QMainWindow):
         self.analyzer.setStyleSheet("QTabWidget::pane { border: 0; }")
 
         ## plotter
-        self.plotter = analyzer.Plotter()
+        screen = QApplication.primaryScreen()
+        self.plotter = analyzer.Plotter(self.performance, screen.refreshRate() if screen else 60.)
+        self.redraw_timer = QTimer(self, singleShot=True)     # catches up on redraws skipped by the frame cap
+        self.redraw_timer.timeout.connect(self.render)
 
         self.setPlotterYRange()
         self.setPlotterXRange()
 
+        stabilization = self.stabilization_settings
+        self.stabilizer = StabilityDetector(
+            stabilization.get('window', 50),
+            self.ids['spinbox_stabilization_stddev'].value(),
+            stabilization.get('hysteresis', 0.),
+            stabilization.get('min_dwell', 0.))
         self.updateStabilizationDeviation()
 
-        # TODO CONSIDERATIONS for 'essential mode
-        #self.plotter.setDownsampling(auto=True)
+        self.moving_average = sonic.MovingAverage.Stream(
+            self.moving_average_settings.get('window', 10),
+            self.moving_average_settings.get('method', 'simple'))
 
-        self.buffer_deque_len = 50  # TODO enable to change this in options
-        self.data_queue = deque(maxlen=self.buffer_deque_len)
+        self.buffer = RingBuffer(self.buffer_size, ('time', 'voltage', 'clamp', 'average', 'lost'))
+        self.channel_pins = []     # pin of each channel of the current reading, set up on start
+        self.channel_labels = []
+        self.channel_boards = []    # port of each channel when reading several boards
+        self.channel_buffers = {}   # label: RingBuffer of the channels read along the first one
+        self.channel_curves = {}
+        self.ids['spinbox_display_memory'].setMaximum(self.buffer_size)
+        self.ids['spinbox_read_rate'].setMaximum(connection.maxRate(self.baudrate))
 
-        self.data_voltages_queue_clamp = deque(maxlen=self.buffer_deque_len)
-        #self.data_queue_moving_average = deque(maxlen=deque_len +2)
-        self.data_voltages_queue = deque(maxlen=self.buffer_deque_len)   # optimizing for speed
-
-        self.times = np.zeros(self.buffer_deque_len)
-        self.voltages = np.zeros(self.buffer_deque_len)
+        self.times = np.zeros(self.buffer_size)
+        self.voltages = np.zeros(self.buffer_size)
 
         ## graphs and lines to show
         self.signal = self.plotter.plot(self.times, self.voltages, pen='g', width=5, name='Voltage')
         self.clamp_function = self.plotter.plot(self.times, self.voltages, pen='y', width=2, name='Clamp Function')
-        #self.average_function = self.plotter.plot(self.times, self.voltages, pen='w', width=2, name='Moving Average')
+        self.average_function = self.plotter.plot(self.times, self.voltages, pen='w', width=2, name='Moving Average')
+        self.average_function.hide()
 
         self.threshold_line = pg.InfiniteLine(
             angle = 0,
@@ -419,22 +705,75 @@ class NoiserGUI(QMainWindow):
         self.setThreshold()
 
         ## table
-        self.table = analyzer.Table(0, 4)
+        self.table = analyzer.Table()
+
+        ## spectrum, computed and drawn on its own (slower) timer so it never holds acquisition back
+        spectrum = self.spectrum_settings
+        self.spectrum = sonic.WelchSpectrum(
+            spectrum.get('segment_size', 256),
+            spectrum.get('overlap', 0.5),
+            spectrum.get('averages', 8),
+            self.ids['spinbox_read_rate'].value(),
+            spectrum.get('window', 'hann'))
+        self.spectrum_plotter = analyzer.SpectrumPlotter()
+        self.spectrum_curve = self.spectrum_plotter.plot(pen='c', width=2, name='PSD')
+        self.spectrum_timer = QTimer(self)
+        self.spectrum_timer.setInterval(1000 // spectrum.get('frame_rate', 10))
+        self.spectrum_timer.timeout.connect(self.updateSpectrum)
 
         ## generates tabs compatible with analyzer board
         tabPlot = factory.AnalyzerTab(QHBoxLayout, self.plotter)
         tabTable = factory.AnalyzerTab(QHBoxLayout, self.table)
+        self.tabSpectrum = factory.AnalyzerTab(QHBoxLayout, self.spectrum_plotter)
   
         self.analyzer.addTab(tabPlot, QIcon('./data/icons/ic_read.svg'), 'Oscilloscope')
         self.analyzer.addTab(tabTable, QIcon('./data/icons/ic_sum'), 'Spreadsheet')
+        self.analyzer.addTab(self.tabSpectrum, QIcon('./data/icons/ic_plot.svg'), 'Spectrum')
 
     
-    def update_plot(self, new_voltage):
+    def update_plot(self, new_times, new_voltages, new_lost):
         """
-            Updates the plot with data
+            Updates the plot with a block of data (@new_lost: samples missing before each one)
+
+            With several pins, @new_voltages is (samples x pins): the first pin goes through
+            the whole pipeline, the others are buffered and plotted
         """
-        new_time = self.times[-1] + (1 / self.serial_connection.serial_thread.rate)
+        new_channels = new_voltages
+        if new_voltages.ndim == 2:
+            self.updateChannels(new_channels)
+            new_voltages = new_channels[:, 0]
+
+        self.updateSchedule()
+        self.writeBits(new_voltages)
+
+        new_averages = self.moving_average.update(new_voltages)
+        self.buffer.extend(new_times, new_voltages, self.clampValue(new_voltages), new_averages, new_lost)
+
+        self.times = self.buffer.view('time')
+        self.voltages = self.buffer.view('voltage')
 
+        if self.checkStabilization(new_times, new_voltages) != self.is_signal_stabilized:
+            self.toggleStabilization()
+
+        if self.recorder:
+            self.recorder.write(new_times, new_channels)
+
+        self.updateTable(new_times, new_voltages, new_averages, new_lost)
+        self.feedSpectrum(new_voltages, new_lost)
+
+        if new_lost.any():
+            self.log.e(f'{_("READ_GAP")}{new_times[np.argmax(new_lost > 0)]:.3f} s ({new_lost.sum()} {_("READ_SAMPLES_LOST")})')
+
+        if len(self.times) < 2: # TODO optimize this
+            return
+
+        self.redraw()
+
+
+    def updateSchedule(self):
+        """
+            Starts the scheduled timer once its starting condition is met
+        """
         if self.groupSchedule.isChecked() and not self.timer.isActive()\
             and (self.comboStartAt.currentText() == 'right away' or self.is_signal_stabilized):
 
@@ -443,77 +782,117 @@ class NoiserGUI(QMainWindow):
             self.log.i(_('TIMER_START'))
             self.timer.start(time)
 
-        ## bit writter
-        #print(self.wordbit[self.bitcounter])
-        if self.bitcounter == self.bitsize:
-            print(self.statistic(self.wordbit))
-            self.bitcounter = 0
-        else:
-            self.wordbit[self.bitcounter] = 0 if new_voltage < self.threshold_reference else 1
-            # self.wordbit[self.bitcounter] = new_voltage << self.bitcounter | self.wordbit[self.bitcounter] & ~(1 << self.bitcounter)
-            self.bitcounter = self.bitcounter + 1
 
+    def writeBits(self, new_voltages):
+        """
+            Extracts random bytes from the block (see settings.extractor for word size and conditioning)
+            and tests each completed sequence in the background
+        """
+        data = self.extractor.extract(new_voltages)
+        if self.byte_server:
+            self.byte_server.write(data)
+        sequence = self.battery.feed(data)
+        if sequence is not None:
+            if self.test_thread and self.test_thread.isRunning():
+                self.log.e(_('BITS_TESTS_BUSY'))
+            else:
+                self.test_thread = NoiserGUI.TestThread(self.battery, sequence)
+                self.test_thread.done.connect(self.onTestsDone)
+                self.test_thread.start()
+        return data
+
+
+    def startByteServer(self):
+        """
+            Serves the extracted random bytes to other processes (see settings.output)
+        """
+        output = self.output_settings
+        if not (output.get('socket') or output.get('fifo') or output.get('file')):
+            return
+        try:
+            byte_server = ByteServer(output.get('socket'), output.get('fifo'), output.get('file'),
+                                     output.get('buffer_size', 1 << 20))
+            byte_server.start()
+        except OSError as error:
+            self.log.x(error)
+            return
+        self.byte_server = byte_server
+        self.log.i(f'{_("OUTPUT_START")}{", ".join(filter(None, (output.get("socket"), output.get("fifo"), output.get("file"))))}')
 
-        self.data_queue.append((new_time, new_voltage))
-        self.data_voltages_queue_clamp.append(self.clampValue(new_voltage))
-        self.data_voltages_queue.append(new_voltage)
 
-        self.times, self.voltages = zip(*self.data_queue)
+    def onTestsDone(self, results):
+        """
+            Reports the randomness tests of a sequence
+        """
+        log = self.log.v if all(result['passed'] for result in results.values()) else self.log.e
+        log(f'{_("BITS_TESTS")}{numeric.summary(results)}')
 
-        if self.checkStabilization() != self.is_signal_stabilized:
-            self.toggleStabilization()
 
-        if len(self.times) < 2: # TODO optimize this
-            return
+    def updateTable(self, new_times, new_voltages, new_averages, new_lost):
+        """
+            Appends the block to the spreadsheet, commenting gaps and stabilization
+        """
+        comments = np.full(len(new_voltages), 'Signal is stabilized;' if self.is_signal_stabilized else '', dtype=object)
+        for row in np.flatnonzero(new_lost):
+            comments[row] = f'{new_lost[row]} {_("TABLE_SAMPLES_LOST")}'
+        self.table.append(new_times, new_voltages, new_averages, comments)
 
-        self.signal.setData(self.times, self.voltages)
-        self.clamp_function.setData(self.times, self.data_voltages_queue_clamp)
 
-        self.plotter.setYRange(self.Yscale_min, self.Yscale_max, padding=0)
-        #print(self.times[-min(self.display_memory, len(self.times))])
-        #print(self.times[-1])
-        self.plotter.setXRange(self.times[-min(self.display_memory, len(self.times))], self.times[-1], padding=0)
-
-        #self.label.setPos(self.x_data[-1], 1)
-        #self.label.setText(f"Y = {self.y_data[-1]:.2f}")
-
-        ## updates table
-        row = self.table.rowCount()
-        self.table.insertRow(row)
-        self.table.setItem(row, 0, QTableWidgetItem(str(round(new_time, 2))))
-        self.table.setItem(row, 1, QTableWidgetItem(str(new_voltage)))
-        if self.is_signal_stabilized:
-            self.table.setItem(row, 3, QTableWidgetItem(str('Signal is stabilized;')))
-        self.table.scrollToBottom()
+    def feedSpectrum(self, new_voltages, new_lost):
+        """
+            Queues the block for the spectrum; segments never span a gap
+        """
+        gaps = np.flatnonzero(new_lost)
+        if gaps.size:
+            self.spectrum.restart()
+            new_voltages = new_voltages[gaps[-1]:]
+        self.spectrum.feed(new_voltages)
 
 
-    def statistic(self, bitword):
+    def updateSpectrum(self):
         """
-            returns a dictionary with basic statistics over the generated number
+            Transforms the segments completed since the last frame, only while the spectrum is shown
         """
-        bit_string  = ''.join(str(bit) for bit in self.wordbit)
-        size        = len(bitword)
-        decimal     = int(bit_string, 2)
-        n_ones      = sum(self.wordbit)
-        n_zeroes    = self.bitsize - n_ones
+        if self.analyzer.currentWidget() is self.tabSpectrum and self.spectrum.compute():
+            self.spectrum_curve.setData(self.spectrum.frequencies, self.spectrum.psd)
 
-        return {
-            'n_bits' : size,
-            #'n_ones' : n_ones,
-            #'n_zeroes': n_zeroes,
-            'ratio_1t0' : float(n_ones) / size * 100,
-            'bin' : bit_string,
-            'dec' : decimal
-        }
 
+    def redraw(self):
+        """
+            Draws the buffered window, or schedules it when the plotter is not due for a frame yet
+        """
+        delay = self.plotter.frameDelay()
+        if delay:
+            if not self.redraw_timer.isActive():
+                self.redraw_timer.start(int(delay * 1000) + 1)
+            return
+        self.render()
 
-    def movingAverage(self, n=3):
-        cumulative_sum = np.cumsum(np.insert(self.data_voltages_queue, 0, 0))
-        return (cumulative_sum[n:] - cumulative_sum[:-n]) / float(n)
+
+    def render(self):
+        """
+            Pushes the visible window to the curves and scrolls the plot
+        """
+        if len(self.times) < 2:
+            return
+        visible = slice(self.plotter.firstVisible(len(self.times), self.display_memory), None)
+        times = self.times[visible]
+
+        # gaps are drawn as breaks in the curves
+        connect = np.append(self.buffer.view('lost')[visible][1:] == 0, True)
+        self.plotter.drawCurve(self.signal, times, self.voltages[visible], connect)
+        self.plotter.drawCurve(self.clamp_function, times, self.buffer.view('clamp')[visible], connect)
+        if self.average_function.isVisible():
+            self.plotter.drawCurve(self.average_function, times, self.buffer.view('average')[visible], connect)
+        for label, curve in self.channel_curves.items():
+            self.plotter.drawCurve(curve, times, self.channel_buffers[label].view('voltage')[visible], connect)
+
+        x_range = (self.times[-min(self.display_memory, len(self.times))], self.times[-1])
+        self.plotter.scroll(x_range, (self.Yscale_min, self.Yscale_max))
 
 
     def clampValue(self, value):
-        return self.threshold_reference if value >= self.threshold_reference else 0
+        return np.where(value >= self.threshold_reference, self.threshold_reference, 0.)
 
 
     ## threshold
@@ -522,6 +901,7 @@ class NoiserGUI(QMainWindow):
             Changes the threshold
         """
         self.threshold_reference = self.ids['spinbox_threshold'].value()
+        self.extractor.threshold = self.threshold_reference
 
 
     def updateThresholdSpinBox(self):
@@ -537,6 +917,7 @@ class NoiserGUI(QMainWindow):
         """
         self.threshold_line.setPos(new_threshold)
         self.threshold_reference = new_threshold
+        self.extractor.threshold = new_threshold
 
 
     ## stabilization
@@ -545,7 +926,7 @@ class NoiserGUI(QMainWindow):
         Toggles the signal stabilization and updates the GUI and curve accordingly.
         """
         try:
-            current_time = str(self.data_queue[0])
+            current_time = str(self.buffer.first('time'))
         except IndexError:
             raise IndexError("Data queue is empty.")
         
@@ -559,12 +940,11 @@ class NoiserGUI(QMainWindow):
         self.is_signal_stabilized = not self.is_signal_stabilized
 
 
-    def checkStabilization(self):
+    def checkStabilization(self, new_times, new_voltages):
         """
-            Checks if the signal is stabilized
+            Checks if the signal is stabilized, updating the running statistics with the new block
         """
-        voltages_std_dev = np.std(self.data_voltages_queue)
-        return voltages_std_dev < self.spinbox_stabilization_stddev
+        return self.stabilizer.update(new_times, new_voltages)
 
 
     def updateStabilizationDeviation(self):
@@ -572,6 +952,7 @@ class NoiserGUI(QMainWindow):
             Updates the stabilization value
         """
         self.spinbox_stabilization_stddev = self.ids['spinbox_stabilization_stddev'].value()
+        self.stabilizer.threshold = self.spinbox_stabilization_stddev
 
 
     ## read rate
@@ -580,30 +961,202 @@ class NoiserGUI(QMainWindow):
             Changes the read rate from arduino
         """
         if self.is_reading:
-            self.serial_connection.serial_thread.rate = rate
+            if self.protocol_mode == connection.MODE_BINARY:
+                # the board clocks the samples, so it only learns the new rate on the next START
+                self.statusbar.showMessage(_('STATUSBAR_RATE_ON_RESTART'), 2000)
+            else:
+                self.serial_connection.serial_thread.rate = rate
+
+
+    def captureMetadata(self):
+        """
+            Returns the acquisition settings and notes stored in the .iad header
+        """
+        return {
+            'name': self.name,
+            'created': QDateTime.currentDateTime().toString(Qt.ISODate),
+            'pin': (self.channel_pins or self.selected_pins)[0],
+            'pins': self.channel_pins or self.selected_pins,
+            'boards': self.channel_boards,
+            'rate': self.ids['spinbox_read_rate'].value(),
+            'threshold': self.threshold_reference,
+            'protocol_mode': self.protocol_mode,
+            'firmware_version': self.firmware_version,
+            'notes': [self.tabNoter.widget(i).toPlainText() for i in range(self.tabNoter.count())]
+        }
+
+
+    def saveIAD(self):
+        """
+            Saves this instance: refreshes the capture header (e.g. notes) and copies the recording and its overview
+
+            A loaded capture is saved with the readings recorded since it was loaded appended to it
+        """
+        if self.is_reading:
+            self.log.e(_('ERR_THREAD_RUNNING'))
+            return
+        if not os.path.exists(self.capture_path) and not self.loaded_capture:
+            self.log.e(_('DATA_ERR_EMPTY'))
+            return
+
+        filename, _filter = QFileDialog.getSaveFileName(self, 'Save instance', self.filename, 'IAD files (*.iad);;All Files (*)')
+        if filename:
+            self.log.i(_('DATA_SAVE'))
+            try:
+                if self.loaded_capture:
+                    self.saveLoadedIAD(filename)
+                else:
+                    self.copyCapture(self.capture_path, filename)
+            except (OSError, iad.InvalidCaptureError) as error:
+                self.log.e(f'{_("DATA_ERR_SAVING")}{error}')
+                return
+            self.is_saved = True
+
+
+    def saveLoadedIAD(self, filename: str):
+        """
+            Writes the loaded capture followed by the new readings to @filename, which then becomes
+            the loaded capture: the readings recorded afterwards go to a fresh capture
+        """
+        self.copyCapture(self.loaded_capture.path, filename)
+        if os.path.exists(self.capture_path):
+            iad.appendCapture(filename, self.capture_path)
+            self.capture_path = self.freshCapturePath()
+        self.loaded_capture = iad.Capture(filename)
+        self.browse_pending = False
+
+
+    def copyCapture(self, source: str, filename: str):
+        """
+            Copies the capture @source and its overview to @filename, with the notes of this instance
+        """
+        if os.path.abspath(filename) != os.path.abspath(source):
+            shutil.copyfile(source, filename)
+            shutil.rmtree(overview.overviewPath(filename), ignore_errors=True)
+            if os.path.isdir(overview.overviewPath(source)):
+                shutil.copytree(overview.overviewPath(source), overview.overviewPath(filename))
+        metadata, _size = iad.readHeader(filename)
+        metadata['notes'] = self.captureMetadata()['notes']
+        iad.updateHeader(filename, metadata)
+
+
+    def freshCapturePath(self) -> str:
+        """
+            Returns a path of the captures folder no recording uses yet
+        """
+        while True:
+            path = os.path.join(self.captures_folder, utils.getFunName(self.extension, '_'))
+            if not os.path.exists(path):
+                return path
+
+
+    def loadIAD(self):
+        """
+            Loads a .iad instance: samples are memory-mapped, so even huge captures open instantly
+        """
+        if self.is_reading:
+            self.log.e(_('ERR_THREAD_RUNNING'))
+            return
+
+        filename, _filter = QFileDialog.getOpenFileName(self, 'Load instance', '', 'IAD files (*.iad);;All Files (*)')
+        if not filename:
+            return
+
+        self.log.i(_('DATA_LOAD'))
+        try:
+            capture = iad.Capture(filename)
+        except (OSError, iad.InvalidCaptureError) as error:
+            self.log.x(error)
+            return
+
+        metadata = capture.metadata
+        for i, note in enumerate(metadata.get('notes', [])[:self.tabNoter.count()]):
+            self.tabNoter.widget(i).setPlainText(note)
+        if 'threshold' in metadata:
+            self.ids['spinbox_threshold'].setValue(metadata['threshold'])
+        if 'rate' in metadata:
+            self.ids['spinbox_read_rate'].setValue(metadata['rate'])
+
+        # the table maps the whole capture, the plot shows its last window
+        self.table.samples.load(capture.times, capture.voltages)
+        self.buffer.clear()
+        self.setupChannels(capture.pins, capture.labels)
+        times = capture.continuousTimes(-self.buffer_size)
+        voltages = capture.voltages[-self.buffer_size:]
+        self.moving_average.reset()
+        averages = self.moving_average.update(voltages)
+        self.buffer.extend(times, voltages, self.clampValue(voltages), averages, np.zeros(len(times)))
+        if len(capture.pins) > 1:
+            self.updateChannels(capture.channels[-self.buffer_size:])
+        self.stabilizer.clear()
+        self.stabilizer.statistics.extend(capture.voltages[-self.stabilizer.statistics.capacity:])
+        self.times = self.buffer.view('time')
+        self.voltages = self.buffer.view('voltage')
+        self.render()
+
+        # zooming out (and panning) over the whole capture is served by its overview, once opened
+        self.loaded_capture = capture
+        self.browse_pending = True
+        self.overview_thread = NoiserGUI.OverviewThread(capture, self)
+        self.overview_thread.done.connect(self.onOverviewReady)
+        self.overview_thread.start()
+
+        # the loaded capture stays as it is: further readings are recorded to a capture of their
+        # own, appended to it only when the instance is saved
+        self.filename = os.path.basename(filename)
+        self.capture_path = self.freshCapturePath()
+        self.title = f'{self.title_canonical} — {self.filename}'
+        self.setWindowTitle(self.title)
+        self.log.v(f'{_("DATA_LOADED")}{len(capture)}')
+
+
+    def onOverviewReady(self, capture, capture_overview, error):
+        """
+            Lets the plotter browse the loaded capture, unless a reading or another capture came first
+        """
+        if error:
+            self.log.e(f'{error}')
+        elif capture is self.loaded_capture and self.browse_pending:
+            self.browse_pending = False
+            self.plotter.browse(capture, capture_overview, [
+                (self.signal, 0, None),
+                (self.clamp_function, 0, self.clampValue)] + [
+                (curve, self.channel_labels.index(label), None) for label, curve in self.channel_curves.items()])
 
 
     def saveTXT(self):
-        filename, _ = QFileDialog.getSaveFileName(self, 'Save as TXT', self.filename, 'Text files (*.txt);;All Files (*)')
+        filename, _filter = QFileDialog.getSaveFileName(self, 'Save as TXT', self.filename, 'Text files (*.txt);;All Files (*)')
         if filename:
-            with open(filename, 'w') as f:
-                f.write('Time\tVoltage\n')
-                for row in range(self.table.rowCount()):
-                    time_item = self.table.item(row, 0)
-                    voltage_item = self.table.item(row, 1)
-                    f.write(f"{time_item.text()}\t{voltage_item.text()}\n")
+            self.exportSamples(filename, '\t')
 
 
     def saveCSV(self):
-        filename, _ = QFileDialog.getSaveFileName(self, 'Save as CSV', self.filename, 'CSV files (*.csv);;All Files (*)')
+        filename, _filter = QFileDialog.getSaveFileName(self, 'Save as CSV', self.filename, 'CSV files (*.csv);;All Files (*)')
         if filename:
-            with open(filename, 'w', newline='') as f:
-                writer = csv.writer(f)
-                writer.writerow(['Time', 'Voltage'])
-                for row in range(self.table.rowCount()):
-                    time_item = self.table.item(row, 0)
-                    voltage_item = self.table.item(row, 1)
-                    writer.writerow([time_item.text(), voltage_item.text()])
+            self.exportSamples(filename, ',')
+
+
+    def exportSamples(self, filename, delimiter):
+        """
+            Exports the spreadsheet columns to @filename in the background
+        """
+        if self.export_thread and self.export_thread.isRunning():
+            self.log.e(_('DATA_ERR_EXPORTING'))
+            return
+
+        self.log.i(_('DATA_SAVE'))
+        self.export_thread = NoiserGUI.ExportThread(self.table.samples, filename, delimiter)
+        self.export_thread.progress.connect(
+            lambda percent: self.statusbar.showMessage(f'{_("STATUSBAR_EXPORTING")}{percent}%', 1000))
+        self.export_thread.done.connect(self.onExportDone)
+        self.export_thread.start()
+
+
+    def onExportDone(self, filename, error):
+        if error:
+            self.log.x(error)
+        else:
+            self.log.v(f'{_("DATA_SAVED")}{filename}')
 
 
     ############################
@@ -0,0 +1,186 @@
+#!/usr/bin/env python
+
+import os
+import sys
+import json
+import time
+import signal
+import argparse
+
+import serial
+import api
+import iad
+import utils
+import protocol
+from msgid import _
+from byteserver import ByteServer
+from extractor import BitExtractor
+
+######################################################################
+# Headless acquisition (no PyQt5 / pyqtgraph)
+#
+# Runs the api.Session engine with the GUI's recording and bit extraction,
+# for unattended captures on boxes without a display:
+#
+#   python . --headless --port /dev/ttyACM0 --pin 0 --rate 1000 --duration 3600
+#   python . --headless --pin 0 1 2 --output run.iad     # several pins at once
+######################################################################
+
+class HeadlessAcquisition:
+    """
+        Streams one or more pins to a .iad capture and the random byte service until a duration elapses
+        or the process is interrupted (SIGINT / SIGTERM)
+
+        Usage:
+            acquisition = HeadlessAcquisition('/dev/ttyACM0', pin=0, rate=1000, output='run.iad')
+            acquisition.run(duration=60)
+    """
+    def __init__(self, port: str, pin, rate: int, output: str, threshold: float=1.4,
+                 baudrate: int=protocol.BAUDRATE, settings: dict=None, log=print):
+        """
+            Args:
+                port, baudrate: serial port of the board
+                pin: analog pin to read, or a list of pins (bits are extracted from the first one)
+                rate: samples per second asked to the board
+                output: capture the samples are appended to
+                threshold: voltage splitting 0 from 1 bits
+                settings: the `settings` section of configs/settings.json (recorder, extractor, output)
+                log: receives one line per event
+        """
+        self.session = api.Session(port, pin, rate, baudrate)
+        self.output = output
+        self.threshold = threshold
+        self.settings = settings or {}
+        self.log = log
+
+        self.extractor = BitExtractor(threshold, **self.settings.get('extractor', {}))
+        self.byte_server = None
+        self.samples = 0
+        self._should_run = True
+
+    def stop(self, *_args):
+        """
+            Ends the acquisition after the current block (usable as a signal handler)
+        """
+        self._should_run = False
+
+    def run(self, duration: float=0.):
+        """
+            Acquires for @duration seconds (0 to run until stopped)
+
+            Returns:
+                The number of samples recorded
+        """
+        self.session.open()
+        self.log(f'{_("CON_ARDUINO_SAYS")}{self.session.handshake_response}')
+        self.log(f'{_("CON_MODE")}{self.session.protocol_mode}')
+
+        try:
+            self.startServices()
+            self.session.start()
+            self.log(_('READ_START'))
+            self.acquire(duration)
+        finally:
+            self.log(_('READ_STOP'))
+            self.stopServices()
+            self.session.close()
+
+        return self.samples
+
+    def acquire(self, duration: float):
+        deadline = time.monotonic() + duration if duration > 0 else float('inf')
+        while self._should_run and time.monotonic() < deadline:
+            block = self.session.read()
+            voltages = block.voltages if block.voltages.ndim == 1 else block.voltages[:, 0]
+            data = self.extractor.extract(voltages)
+            if self.byte_server:
+                self.byte_server.write(data)
+
+    def startServices(self):
+        directory = os.path.dirname(self.output)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.session.record(self.output, {'threshold': self.threshold}, **self.settings.get('recorder', {}))
+        self.log(f'{_("RECORD_START")}{self.output}')
+
+        output = self.settings.get('output', {})
+        if output.get('socket') or output.get('fifo') or output.get('file'):
+            byte_server = ByteServer(output.get('socket'), output.get('fifo'), output.get('file'),
+                                     output.get('buffer_size', 1 << 20))
+            byte_server.start()
+            self.byte_server = byte_server
+            self.log(f'{_("OUTPUT_START")}{", ".join(filter(None, (output.get("socket"), output.get("fifo"), output.get("file"))))}')
+
+    def stopServices(self):
+        if self.session.statistics:
+            self.log(f'{_("READ_STATS")}{self.session.statistics}')
+        self.log(f'{_("BITS_STATS")}{self.extractor}')
+
+        if self.session.recorder:
+            try:
+                self.samples = self.session.stopRecording()
+                self.log(f'{_("RECORD_STOP")}{self.samples}')
+            except OSError as error:
+                self.log(f'{error} {_("RECORD_SOL_ERROR")}')
+
+        if self.byte_server:
+            self.byte_server.stop()
+            self.log(f'{_("OUTPUT_STOP")}{self.byte_server}')
+            if self.byte_server.error:
+                self.log(f'{_("OUTPUT_ERROR")}{self.byte_server.error}')
+            self.byte_server = None
+
+
+def loadConfigs(path: str='./configs/settings.json') -> dict:
+    with open(path, 'r') as configs:
+        return json.load(configs)
+
+
+######################################################################
+# Entry point
+######################################################################
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Acquires noise from a noiserino board without the GUI')
+    parser.add_argument('--headless', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--port', help='serial port of the board (default: the first board found)')
+    parser.add_argument('--pin', type=int, nargs='+', default=[0], help='analog pin(s) to read')
+    parser.add_argument('--rate', type=int, default=protocol.DEFAULT_RATE,
+                        help='samples per second (at most baudrate / (10 x frame size))')
+    parser.add_argument('--duration', type=float, default=0., help='seconds to acquire (default: until interrupted)')
+    parser.add_argument('--output', help='capture to append to, of the same pins and rate (default: a new one in the captures folder)')
+    parser.add_argument('--threshold', type=float, default=1.4, help='voltage splitting 0 from 1 bits')
+    parser.add_argument('--baudrate', type=int, help=f'serial speed (default: settings baudrate, {protocol.BAUDRATE})')
+    parser.add_argument('--configs', default='./configs/settings.json')
+    parser.add_argument('--no-serve', action='store_true', help='does not serve the random bytes')
+    args = parser.parse_args(argv)
+
+    configs = loadConfigs(args.configs)
+    settings = dict(configs.get('settings', {}))
+    if args.no_serve:
+        settings['output'] = {}
+
+    port = args.port
+    if not port:
+        ports = protocol.getPorts()
+        if not ports:
+            sys.exit(_('CON_SOL_PORTS'))
+        port = ports[0]
+
+    output = args.output or os.path.join(configs.get('env_paths', {}).get('captures', './captures/'),
+                                         utils.getFunName(configs.get('meta', {}).get('extension', '.iad'), '_'))
+
+    baudrate = args.baudrate or settings.get('baudrate', protocol.BAUDRATE)
+    acquisition = HeadlessAcquisition(port, args.pin, args.rate, output, args.threshold, baudrate, settings,
+                                      log=lambda line: print(line, file=sys.stderr, flush=True))
+    signal.signal(signal.SIGINT, acquisition.stop)
+    signal.signal(signal.SIGTERM, acquisition.stop)
+    try:
+        acquisition.run(args.duration)
+    except (OSError, serial.SerialException, protocol.ConnectionTimeout, protocol.InvalidPinError,
+            protocol.RateTooHighError, iad.InvalidCaptureError) as error:
+        sys.exit(f'{error}')
+
+
+if __name__ == '__main__':
+    main()
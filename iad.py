@@ -0,0 +1,268 @@
+#!/usr/bin/env python
+
+import os
+import json
+import struct
+import numpy as np
+
+######################################################################
+# .iad capture container
+#
+#   magic (4 bytes) | version (uint16) | reserved (uint16) | header size (uint32)
+#   | JSON metadata padded with spaces up to the header size
+#   | little-endian (time <f8, voltage <f8) records until the end of file
+#
+# Version 2 captures read several pins (metadata 'pins'): each record holds
+# one voltage per pin, in ascending pin order (and board order for several
+# boards, whose port per channel is in metadata 'boards')
+#
+# Readings appended to a capture carry its time line on; older captures
+# restart at 0 on every reading (see Capture.runs)
+#
+# The header size is a multiple of HEADER_BLOCK, so metadata (e.g. notes)
+# can be rewritten in place and the records start at an aligned offset
+######################################################################
+
+IAD_MAGIC   = b'IAD\x00'
+IAD_VERSION = 2
+HEADER_BLOCK = 4096
+RUN_SCAN_CHUNK = 1 << 22    # samples checked at once when looking for the readings of a capture
+
+PREAMBLE = struct.Struct('<4sHHI')
+
+RECORD_DTYPE = np.dtype([
+    ('time', '<f8'),
+    ('voltage', '<f8')
+])
+
+
+def recordDtype(channels: int=1) -> np.dtype:
+    """
+        Returns:
+            The record layout holding one voltage per channel; RECORD_DTYPE for a single channel
+    """
+    if channels == 1:
+        return RECORD_DTYPE
+    return np.dtype([
+        ('time', '<f8'),
+        ('voltage', '<f8', (channels,))
+    ])
+
+
+def capturePins(metadata: dict) -> list:
+    """
+        Returns:
+            The pins recorded in a capture (single pin captures only store 'pin')
+    """
+    return metadata.get('pins') or [metadata.get('pin', 0)]
+
+
+class InvalidCaptureError(Exception):
+    def __init__(self, message='Not a valid .iad capture'):
+        self.message = message
+        super().__init__(self.message)
+
+
+def encodeHeader(metadata: dict, size: int=0) -> bytes:
+    """
+        Serializes @metadata into a header of at least @size bytes (rounded up to HEADER_BLOCK)
+    """
+    payload = json.dumps(metadata, ensure_ascii=False).encode('utf-8')
+    needed = PREAMBLE.size + len(payload)
+    size = max(size, -(-needed // HEADER_BLOCK) * HEADER_BLOCK)
+
+    # single channel captures stay readable by version 1 readers
+    version = IAD_VERSION if len(capturePins(metadata)) > 1 else 1
+    preamble = PREAMBLE.pack(IAD_MAGIC, version, 0, size)
+    return preamble + payload + b' ' * (size - needed)
+
+
+def readHeader(path: str):
+    """
+        Returns:
+            The metadata dict and the header size (offset of the first record)
+    """
+    with open(path, 'rb') as capture:
+        preamble = capture.read(PREAMBLE.size)
+        if len(preamble) < PREAMBLE.size:
+            raise InvalidCaptureError()
+
+        magic, version, _, size = PREAMBLE.unpack(preamble)
+        if magic != IAD_MAGIC:
+            raise InvalidCaptureError()
+        if version > IAD_VERSION:
+            raise InvalidCaptureError(f'Unsupported .iad version {version}')
+
+        try:
+            metadata = json.loads(capture.read(size - PREAMBLE.size).decode('utf-8'))
+        except ValueError:
+            raise InvalidCaptureError('Corrupted .iad header')
+
+    return metadata, size
+
+
+def updateHeader(path: str, metadata: dict):
+    """
+        Rewrites the metadata of an existing capture, in place whenever it still fits
+    """
+    _, size = readHeader(path)
+    header = encodeHeader(metadata, size)
+
+    if len(header) == size:
+        with open(path, 'r+b') as capture:
+            capture.write(header)
+        return
+
+    # the header outgrew its blocks: rebuild the file with a bigger one
+    temporary = path + '.tmp'
+    with open(path, 'rb') as source, open(temporary, 'wb') as target:
+        target.write(header)
+        source.seek(size)
+        while chunk := source.read(1 << 24):
+            target.write(chunk)
+    os.replace(temporary, path)
+
+
+def appendable(path: str, metadata: dict) -> bool:
+    """
+        Returns:
+            Whether records described by @metadata can be appended to the capture at @path:
+            it does not exist yet, or it holds the same pins read at the same rate
+    """
+    if not os.path.exists(path) or not os.path.getsize(path):
+        return True
+    existing, _size = readHeader(path)
+    return capturePins(existing) == capturePins(metadata) and existing.get('rate') == metadata.get('rate')
+
+
+def appendCapture(path: str, source: str):
+    """
+        Appends the records of the capture @source to the capture @path, both of the same pins
+        (e.g. readings recorded after loading a capture, merged into it when saving)
+    """
+    metadata, size = readHeader(path)
+    source_metadata, source_size = readHeader(source)
+    if capturePins(source_metadata) != capturePins(metadata):
+        raise InvalidCaptureError('Captures of different pins cannot be merged')
+
+    # an interrupted write may leave part of a record at the end of either file
+    itemsize = recordDtype(len(capturePins(metadata))).itemsize
+    remaining = (os.path.getsize(source) - source_size) // itemsize * itemsize
+    with open(source, 'rb') as records, open(path, 'r+b') as target:
+        target.truncate(size + (os.path.getsize(path) - size) // itemsize * itemsize)
+        target.seek(0, os.SEEK_END)
+        records.seek(source_size)
+        while remaining and (chunk := records.read(min(remaining, 1 << 24))):
+            target.write(chunk)
+            remaining -= len(chunk)
+
+
+class Capture:
+    """
+        Read-only view of a .iad capture; the records are memory-mapped, so opening is instant
+    """
+    def __init__(self, path: str):
+        self.path = path
+        self.metadata, self.offset = readHeader(path)
+        self.pins = capturePins(self.metadata)
+        dtype = recordDtype(len(self.pins))
+
+        n_records = (os.path.getsize(path) - self.offset) // dtype.itemsize
+        if n_records:
+            self.records = np.memmap(path, dtype=dtype, mode='r', offset=self.offset, shape=(n_records,))
+        else:
+            self.records = np.empty(0, dtype=dtype)
+        self._runs = None
+        self._offsets = None
+
+    def __len__(self):
+        return len(self.records)
+
+    @property
+    def times(self) -> np.ndarray:
+        return self.records['time']
+
+    @property
+    def voltages(self) -> np.ndarray:
+        """
+            Voltages of the first pin (see channels for the others)
+        """
+        voltages = self.records['voltage']
+        return voltages if voltages.ndim == 1 else voltages[:, 0]
+
+    @property
+    def labels(self) -> list:
+        """
+            Name of each channel: its pin, and its board for multi-board captures
+        """
+        boards = self.metadata.get('boards') or [None] * len(self.pins)
+        return [f'{board} A{pin}' if board else f'A{pin}' for board, pin in zip(boards, self.pins)]
+
+    @property
+    def channels(self) -> np.ndarray:
+        """
+            Voltages as (samples x pins), in the order of self.pins
+        """
+        voltages = self.records['voltage']
+        return voltages if voltages.ndim == 2 else voltages[:, np.newaxis]
+
+    ############################
+    # Readings
+    ############################
+    @property
+    def runs(self) -> np.ndarray:
+        """
+            Index of the first sample of every reading: older captures restart their time at 0
+            on each one, newer ones carry it on (a single run)
+        """
+        if self._runs is None:
+            starts = [0]
+            for first in range(0, len(self), RUN_SCAN_CHUNK):
+                base = max(0, first - 1)
+                starts.extend(np.flatnonzero(np.diff(self.times[base:first + RUN_SCAN_CHUNK]) < 0) + base + 1)
+            self._runs = np.array(starts, dtype=np.int64)
+        return self._runs
+
+    @property
+    def offsets(self) -> np.ndarray:
+        """
+            Time [s] added to the samples of each run so that every run carries on from the previous one
+        """
+        if self._offsets is None:
+            self._offsets = np.zeros(len(self.runs))
+            period = 1 / self.metadata.get('rate', 1)
+            for run in range(1, len(self.runs)):
+                first = self.runs[run]
+                self._offsets[run] = self.times[first - 1] + self._offsets[run - 1] + period - self.times[first]
+        return self._offsets
+
+    def continuousTimes(self, first: int=0, last: int=None) -> np.ndarray:
+        """
+            Returns:
+                The times of samples @first to @last on one increasing time line (see offsets)
+        """
+        first, last, _step = slice(first, last).indices(len(self))
+        times = self.times[first:last]
+        if len(self.runs) == 1:
+            return times
+        return times + self.offsetsAt(np.arange(first, max(first, last)))
+
+    def offsetsAt(self, positions: np.ndarray) -> np.ndarray:
+        """
+            Returns:
+                The offset (see offsets) of the samples at @positions
+        """
+        return self.offsets[np.searchsorted(self.runs, positions, side='right') - 1]
+
+    def sampleAt(self, time: float) -> int:
+        """
+            Returns:
+                Index of the first sample at or after @time, on the time line of continuousTimes
+        """
+        if not len(self):
+            return 0
+        starts = self.times[self.runs] + self.offsets
+        run = max(0, int(np.searchsorted(starts, time, side='right')) - 1)
+        first = self.runs[run]
+        last = self.runs[run + 1] if run + 1 < len(self.runs) else len(self)
+        return int(first + np.searchsorted(self.times[first:last], time - self.offsets[run]))
@@ -6,8 +6,29 @@ __MAP_MESSAGES = {
 
         "READ_START" : "🟢 Started reading...",
         "READ_STOP" : "🟥 Stopped reading",
+        "READ_STATS" : "Stream statistics: ",
+        "BITS_STATS" : "Random bits: ",
+        "BITS_TESTS" : "Randomness tests: ",
+        "BITS_TESTS_BUSY" : "Randomness tests still running, sequence skipped",
+        "OUTPUT_START" : "Serving random bytes on ",
+        "OUTPUT_STOP" : "Random byte service closed: ",
+        "OUTPUT_ERROR" : "Random byte service failed: ",
+        "READ_REPLAY" : "Replaying ",
+        "READ_BOARDS" : "Reading every board: ",
+        "READ_GAP" : "Gap in the stream at t = ",
+        "READ_SAMPLES_LOST" : "samples lost",
+        "TABLE_SAMPLES_LOST" : "samples lost;",
         "DATA_SAVE" : "Saving the precious data...",
         "DATA_LOAD" : "Loading the precious data...",
+        "DATA_LOADED" : "Samples loaded: ",
+        "DATA_SAVED" : "Data saved to ",
+        "DATA_ERR_EXPORTING" : "Still exporting, hold on a second!",
+        "DATA_ERR_EMPTY" : "Nothing recorded yet: start reading first!",
+        "DATA_ERR_SAVING" : "Could not save the instance: ",
+
+        "RECORD_START" : "Recording samples to ",
+        "RECORD_STOP" : "Samples safely on disk: ",
+        "RECORD_SOL_ERROR" : "Check if the disk is full or the captures folder is writable",
 
         "CREATED_LOGGER" : "I've created myself",
         "EASTER_EGG_LUIS_MELO_GREETING" : "Viva!",
@@ -17,6 +38,8 @@ __MAP_MESSAGES = {
         "STATUSBAR_READ_START" : "Reading!",
         "STATUSBAR_SCALE_CHANGED" : "Y-axis scale changed to:",
         "STATUSBAR_PIN_CHANGED" : "Connected to pin ",
+        "STATUSBAR_EXPORTING" : "Exporting... ",
+        "STATUSBAR_RATE_ON_RESTART" : "The new read rate is applied on the next START",
 
         "TIMER_START" : "The timmer started counting!",
 
@@ -30,6 +53,7 @@ __MAP_MESSAGES = {
         "CON_SERIAL_ERR" : "Serial not connected ",
         "CON_HANDSHAKE_PORT" : "Trying to handshake board through port ",
         "CON_CLOSED" : "Serial connection was closed!",
+        "CON_MODE" : "Streaming mode negotiated: ",
 
         "CON_PORTS" : "Checking connected boards through USB ports...",
         "CON_CLICK_AGAIN" : "The Arduino seems to be busy... try again in 2 seconds!",
@@ -4,6 +4,7 @@ bool reading = false;
 
 // IAD PROTOCOL                 https://theasciicode.com.ar
 uint32_t IAD_START = 0x01;    //  SOH: start header control character
+uint32_t IAD_BINARY = 0x02;   //  STX: requests samples as binary frames instead of text
 uint32_t IAD_PAUSE = 0x03;    //  ETX: indicates that it is the end of the message (interrupt)
 uint32_t IAD_STOP = 0x04;     //  EOT: indicates the end of transmission
 uint32_t IAD_ENQUIRE = 0x05;  //  ENQ: requests a response from arduino to confirm it is ready (Equiry)
@@ -12,6 +13,14 @@ uint32_t IAD_SYNC = 0x16;     //  DLE: synchronous Idle (used for transmission)
 uint32_t IAD_ERROR = 0x21;    //  NAK: exclaim(error) special character
 
 const int TIMEOUT_MILLISECONDS = 5000;
+const int MODE_TIMEOUT_MILLISECONDS = 50;
+const unsigned long LEGACY_PERIOD_MICROSECONDS = 100000;  // ASCII mode keeps the old 100ms pacing
+const uint8_t PROTOCOL_VERSION = 2;  // 2: pin masks and multi-channel frames
+const uint8_t PIN_MASK = 0x80;        // pin byte with this bit set: the low bits select several pins
+const uint8_t ANALOG_PINS = 6;
+
+// binary frame: SYNC | sequence (uint16 LE) | ADC counts (uint16 LE, one per channel) | checksum (XOR of payload)
+const uint8_t MAX_FRAME_SIZE = 4 + 2 * ANALOG_PINS;
 
 // defining state machines
 enum State {
@@ -22,7 +31,7 @@ enum State {
 };
 
 void setup() {
-  Serial.begin(9600);  // Initialize serial communication
+  Serial.begin(115200);  // Initialize serial communication (protocol.BAUDRATE on the host)
 }
 
 void loop() {
@@ -44,20 +53,66 @@ void loop() {
         return;
       //Serial.flush();
 
+      // channels are sampled in ascending pin order, once per tick
+      uint8_t pins[ANALOG_PINS];
+      uint8_t channels = 0;
+      if (pin & PIN_MASK) {
+        for (uint8_t channel = 0; channel < ANALOG_PINS; channel++)
+          if (pin & (1 << channel))
+            pins[channels++] = channel;
+      } else {
+        pins[channels++] = pin;
+      }
+      if (channels == 0)
+        return;
+      uint16_t values[ANALOG_PINS];
+
+      // Python asks for binary frames right after the pin (old hosts never do)
+      bool binary = false;
+      unsigned long start_time = millis();
+      while (Serial.available() == 0 && millis() - start_time < MODE_TIMEOUT_MILLISECONDS);
+      unsigned long period = LEGACY_PERIOD_MICROSECONDS;
+      if (Serial.available() && Serial.peek() == IAD_BINARY) {
+        Serial.read();
+        binary = true;
+
+        // followed by the sample rate [Hz] as uint16 LE: this board owns the sample clock
+        uint16_t rate = readRate();
+        if (rate > 0)
+          period = 1000000UL / rate;
+      }
+
       reading = true;
+      uint16_t sequence = 0;
+      unsigned long next_sample = micros();
       // Send analog values to Python program
       while (reading) {
-        analogValue = analogRead(pin);
-        double voltage = analogValue * (5. / 1023.);
-        Serial.println(voltage, 8);
+        for (uint8_t channel = 0; channel < channels; channel++)
+          values[channel] = analogRead(pins[channel]);
+        analogValue = values[0];
+        if (binary) {
+          sendFrame(sequence++, values, channels);
+        } else {
+          double voltage = analogValue * (5. / 1023.);
+          Serial.println(voltage, 8);
+        }
 
         // Check for stop command from Python
         if (Serial.available() && Serial.read() == IAD_STOP)
           reading = false;
 
-        delay(100);  // Delay for 100ms
+        // wait for the next tick (absolute schedule, so processing time does not drift the rate)
+        next_sample += period;
+
+        // overrun (e.g. serial buffer full): skip the missed ticks, so that the sequence
+        // number keeps counting clock ticks and Python sees the gap
+        while ((long) (micros() - next_sample) >= (long) period) {
+          next_sample += period;
+          sequence++;
+        }
+        while ((long) (micros() - next_sample) < 0);
       }
-    } else if (command = IAD_ENQUIRE) {
+    } else if (command == IAD_ENQUIRE) {
       handshake();
     } else {
       // sends an error message
@@ -73,16 +128,51 @@ void handshake() {
 
   // wait for python to give a pin number
   unsigned long start_time = millis();
-  while (Serial.available() == 0)
-    if (millis() - start_time > TIMEOUT_MILLISECONDS)
+  while (Serial.available() == 0) {
+    if (millis() - start_time > TIMEOUT_MILLISECONDS) {
       Serial.write(IAD_ERROR);
       return;
+    }
+  }
 
   // no timeout occured (pin was introduced)
-  uint32_t pin = Serial.read();
+  uint32_t pin = Serial.read() & ~PIN_MASK;
 
   // Generate random number and send to Python
   randomSeed(analogRead(pin));
   int randomValue = random(10);
   Serial.write(randomValue);
+
+  // advertise binary frames support
+  Serial.write((uint8_t) IAD_SYNC);
+  Serial.write(PROTOCOL_VERSION);
+}
+
+uint16_t readRate() {
+  unsigned long start_time = millis();
+  while (Serial.available() < 2)
+    if (millis() - start_time > TIMEOUT_MILLISECONDS)
+      return 0;
+
+  uint16_t low = Serial.read();
+  uint16_t high = Serial.read();
+  return low | (high << 8);
+}
+
+void sendFrame(uint16_t sequence, const uint16_t *values, uint8_t channels) {
+  uint8_t frame[MAX_FRAME_SIZE];
+  uint8_t size = 0;
+  frame[size++] = (uint8_t) IAD_SYNC;
+  frame[size++] = (uint8_t) (sequence & 0xFF);
+  frame[size++] = (uint8_t) (sequence >> 8);
+  for (uint8_t channel = 0; channel < channels; channel++) {
+    frame[size++] = (uint8_t) (values[channel] & 0xFF);
+    frame[size++] = (uint8_t) (values[channel] >> 8);
+  }
+
+  uint8_t checksum = 0;
+  for (uint8_t i = 1; i < size; i++)
+    checksum ^= frame[i];
+  frame[size++] = checksum;
+  Serial.write(frame, size);
 }
@@ -1,23 +1,376 @@
+#!/usr/bin/env python
+
+import math
+import time
+import argparse
 import statistics
+import numpy as np
+
+######################################################################
+# Randomness tests (NIST SP 800-22 style) over packed bit arrays
+#
+# Every test takes the unpacked bits (uint8 0/1) and returns its p-value(s);
+# a sequence passes a test when its p-values are >= ALPHA
+######################################################################
+
+ALPHA = 0.01
+
+
+def unpack(data, n_bits: int=None) -> np.ndarray:
+    """
+        Returns:
+            The bits of @data (bytes or packed uint8 array, MSB first) as a uint8 0/1 array
+    """
+    packed = np.frombuffer(data, dtype=np.uint8) if isinstance(data, (bytes, bytearray, memoryview)) else np.asarray(data, dtype=np.uint8)
+    return np.unpackbits(packed, count=n_bits)
+
 
-def statistic(self, bitword):
+def statistic(data, n_bits: int=None):
     """
-        Returns a dictionary with basic statistics about the generated number
+        Returns a dictionary with basic statistics about the generated bits (packed, MSB first)
     """
-    bit_string = ''.join(str(bit) for bit in self.wordbit)
-    size = len(bitword)
-    decimal = int(bit_string, 2)
-    n_ones = sum(self.wordbit)
-    n_zeroes = self.bitsize - n_ones
+    bits = unpack(data, n_bits)
+    size = bits.size
+    n_ones = int(np.count_nonzero(bits))
 
-    return {
+    result = {
         'n_bits': size,
         'n_ones' : n_ones,
-        'n_zeroes': n_zeroes,
-        'ratio_1t0': float(n_ones) / size * 100,
-        'bin': bit_string,
-        'dec': decimal
+        'n_zeroes': size - n_ones,
+        'ratio_1t0': float(n_ones) / size * 100 if size else 0.
     }
+    if 0 < size <= 64:
+        bit_string = ''.join('1' if bit else '0' for bit in bits)
+        result['bin'] = bit_string
+        result['dec'] = int(bit_string, 2)
+    return result
+
+
+############################
+# Special functions
+############################
+def igamc(a: float, x: float) -> float:
+    """
+        Regularized upper incomplete gamma function Q(a, x)
+    """
+    if x <= 0 or a <= 0:
+        return 1.
+    if x < a + 1:
+        # series for P(a, x)
+        term = total = 1 / a
+        n = a
+        while abs(term) > abs(total) * 1e-15:
+            n += 1
+            term *= x / n
+            total += term
+        return max(0., 1 - total * math.exp(-x + a * math.log(x) - math.lgamma(a)))
+
+    # continued fraction for Q(a, x) (modified Lentz)
+    tiny = 1e-300
+    b = x + 1 - a
+    c = 1 / tiny
+    d = 1 / b
+    h = d
+    for i in range(1, 10000):
+        an = -i * (i - a)
+        b += 2
+        d = an * d + b
+        d = tiny if abs(d) < tiny else d
+        c = b + an / c
+        c = tiny if abs(c) < tiny else c
+        d = 1 / d
+        delta = d * c
+        h *= delta
+        if abs(delta - 1) < 1e-15:
+            break
+    return math.exp(-x + a * math.log(x) - math.lgamma(a)) * h
+
+
+def normalCdf(x: np.ndarray) -> np.ndarray:
+    return 0.5 * (1 + np.vectorize(math.erf)(np.asarray(x, dtype=np.float64) / math.sqrt(2)))
+
+
+def patternCounts(bits: np.ndarray, m: int) -> np.ndarray:
+    """
+        Returns:
+            The number of occurrences of every overlapping @m-bit pattern, wrapping around the end
+    """
+    if m == 0:
+        return np.array([bits.size])
+    extended = np.concatenate((bits, bits[:m - 1])).astype(np.int64)
+    values = np.zeros(bits.size, dtype=np.int64)
+    for j in range(m):
+        values = (values << 1) | extended[j:j + bits.size]
+    return np.bincount(values, minlength=1 << m)
+
+
+############################
+# Tests
+############################
+def frequency(bits: np.ndarray) -> float:
+    """
+        Monobit test: the proportion of ones is close to 1/2
+    """
+    s = 2 * int(np.count_nonzero(bits)) - bits.size
+    return math.erfc(abs(s) / math.sqrt(2 * bits.size))
+
+
+def blockFrequency(bits: np.ndarray, block_size: int=128) -> float:
+    """
+        The proportion of ones is close to 1/2 within every @block_size-bit block
+    """
+    n_blocks = bits.size // block_size
+    proportions = bits[:n_blocks * block_size].reshape(n_blocks, block_size).mean(axis=1)
+    chi_squared = 4 * block_size * np.sum((proportions - 0.5) ** 2)
+    return igamc(n_blocks / 2, chi_squared / 2)
+
+
+def runs(bits: np.ndarray) -> float:
+    """
+        The number of runs (uninterrupted sequences of identical bits) is as expected
+    """
+    n = bits.size
+    pi = np.count_nonzero(bits) / n
+    if abs(pi - 0.5) >= 2 / math.sqrt(n):
+        return 0.
+    observed = 1 + int(np.count_nonzero(bits[1:] != bits[:-1]))
+    return math.erfc(abs(observed - 2 * n * pi * (1 - pi)) / (2 * math.sqrt(2 * n) * pi * (1 - pi)))
+
+
+# block size, longest run categories (first and last are open-ended), category probabilities
+LONGEST_RUN_PARAMETERS = (
+    (750000, 10000, range(10, 17), (0.0882, 0.2092, 0.2483, 0.1933, 0.1208, 0.0675, 0.0727)),
+    (6272, 128, range(4, 10), (0.1174, 0.2430, 0.2493, 0.1752, 0.1027, 0.1124)),
+    (128, 8, range(1, 5), (0.2148, 0.3672, 0.2305, 0.1875))
+)
+
+
+def longestRun(bits: np.ndarray) -> float:
+    """
+        The longest run of ones within blocks is as long as expected
+    """
+    for min_bits, block_size, categories, probabilities in LONGEST_RUN_PARAMETERS:
+        if bits.size >= min_bits:
+            break
+    else:
+        raise ValueError('The longest run test needs at least 128 bits')
+
+    n_blocks = bits.size // block_size
+    blocks = np.zeros((n_blocks, block_size + 2), dtype=np.int8)   # zero padding splits runs between blocks
+    blocks[:, 1:-1] = bits[:n_blocks * block_size].reshape(n_blocks, block_size)
+    edges = np.diff(blocks.ravel())
+    starts, ends = np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)
+
+    longest = np.zeros(n_blocks, dtype=np.int64)
+    np.maximum.at(longest, starts // (block_size + 2), ends - starts)
+
+    observed = np.bincount(np.clip(longest, categories[0], categories[-1]) - categories[0], minlength=len(categories))
+    expected = n_blocks * np.array(probabilities)
+    chi_squared = np.sum((observed - expected) ** 2 / expected)
+    return igamc((len(categories) - 1) / 2, chi_squared / 2)
+
+
+def serial(bits: np.ndarray, m: int=None):
+    """
+        All overlapping @m-bit patterns are equally frequent
+
+        Returns:
+            The two p-values (first and second differences of the psi-squared statistics)
+    """
+    n = bits.size
+    m = m or max(3, min(16, int(math.log2(n)) - 3))
+    psi = [(1 << k) / n * np.sum(patternCounts(bits, k).astype(np.float64) ** 2) - n if k else 0. for k in (m, m - 1, m - 2)]
+    delta_1 = psi[0] - psi[1]
+    delta_2 = psi[0] - 2 * psi[1] + psi[2]
+    return igamc(2 ** (m - 2), delta_1 / 2), igamc(2 ** (m - 3), delta_2 / 2)
+
+
+def approximateEntropy(bits: np.ndarray, m: int=None) -> float:
+    """
+        Overlapping @m and @m + 1-bit patterns are as frequent as expected for a random sequence
+    """
+    n = bits.size
+    m = m or max(2, min(14, int(math.log2(n)) - 6))
+
+    def phi(k):
+        counts = patternCounts(bits, k)
+        counts = counts[counts > 0] / n
+        return np.sum(counts * np.log(counts))
+
+    entropy = phi(m) - phi(m + 1)
+    chi_squared = 2 * n * (math.log(2) - entropy)
+    return igamc(2 ** (m - 1), chi_squared / 2)
+
+
+def cumulativeSums(bits: np.ndarray):
+    """
+        The random walk of +-1 steps does not drift too far from zero
+
+        Returns:
+            The forward and backward p-values
+    """
+    n = bits.size
+    steps = 2 * bits.astype(np.int64) - 1
+
+    def pValue(walk):
+        z = int(np.max(np.abs(walk)))
+        root = math.sqrt(n)
+        k = np.arange((-n / z + 1) // 4, (n / z - 1) // 4 + 1)
+        first = np.sum(normalCdf((4 * k + 1) * z / root) - normalCdf((4 * k - 1) * z / root))
+        k = np.arange((-n / z - 3) // 4, (n / z - 1) // 4 + 1)
+        second = np.sum(normalCdf((4 * k + 3) * z / root) - normalCdf((4 * k + 1) * z / root))
+        return float(min(1., max(0., 1 - first + second)))
+
+    return pValue(np.cumsum(steps)), pValue(np.cumsum(steps[::-1]))
+
+
+def spectral(bits: np.ndarray) -> float:
+    """
+        Discrete Fourier transform test: no periodic features (peaks above the 95% threshold are as rare as expected)
+    """
+    n = bits.size
+    moduli = np.abs(np.fft.rfft(2. * bits - 1)[:n // 2])
+    threshold = math.sqrt(math.log(1 / 0.05) * n)
+    expected = 0.95 * n / 2
+    d = (np.count_nonzero(moduli < threshold) - expected) / math.sqrt(n * 0.95 * 0.05 / 4)
+    return math.erfc(abs(d) / math.sqrt(2))
+
+
+TESTS = {
+    'frequency': frequency,
+    'block_frequency': blockFrequency,
+    'runs': runs,
+    'longest_run': longestRun,
+    'serial': serial,
+    'approximate_entropy': approximateEntropy,
+    'cumulative_sums': cumulativeSums,
+    'spectral': spectral
+}
+
+
+def binary_tests(bin_num, n_bits: int=None, tests=None):
+    """
+        Runs the randomness test battery over a packed bit sequence
+
+        Args:
+            bin_num: packed bits (bytes or uint8 array, MSB first), at least 128 bits
+            n_bits: bits of @bin_num to test (all of them by default)
+            tests: names from TESTS to run (all of them by default)
+
+        Returns:
+            For each test, a dict with its p-values, whether it passed and the seconds it took
+    """
+    bits = unpack(bin_num, n_bits)
+    results = {}
+    for name in tests or TESTS:
+        started = time.perf_counter()
+        p_values = TESTS[name](bits)
+        p_values = p_values if isinstance(p_values, tuple) else (p_values,)
+        results[name] = {
+            'p_values': p_values,
+            'passed': min(p_values) >= ALPHA,
+            'seconds': time.perf_counter() - started
+        }
+    return results
+
+
+def summary(results) -> str:
+    passed = sum(result['passed'] for result in results.values())
+    details = ', '.join(
+        f'{name} {"ok" if result["passed"] else "FAIL"} (p={min(result["p_values"]):.3f}, {1e3 * result["seconds"]:.1f}ms)'
+        for name, result in results.items())
+    return f'{passed}/{len(results)} passed: {details}'
+
+
+class TestBattery:
+    """
+        Runs binary_tests over a live byte stream, one sequence of @sequence_bits at a time
+
+        Usage:
+            battery = TestBattery(1 << 20)
+            sequence = battery.feed(random_bytes)   # a full sequence, once there is one
+            if sequence is not None: results = battery.run(sequence)
+    """
+    def __init__(self, sequence_bits: int=1 << 20, tests=None):
+        if sequence_bits < 128 or sequence_bits % 8:
+            raise ValueError('Test sequences need a multiple of 8 bits, at least 128')
+        self.sequence_bytes = sequence_bits // 8
+        self.tests = tests
+        self.pending = bytearray()
+        self.sequences = 0
+        self.passed = {name: 0 for name in tests or TESTS}
+
+    def feed(self, data: bytes):
+        """
+            Returns:
+                The next complete sequence (packed uint8 array) once @data completes one, else None
+                (bytes beyond one sequence are kept for the next)
+        """
+        self.pending += data
+        if len(self.pending) < self.sequence_bytes:
+            return None
+        sequence = np.frombuffer(bytes(self.pending[:self.sequence_bytes]), dtype=np.uint8)
+        del self.pending[:self.sequence_bytes]
+        return sequence
+
+    def run(self, sequence):
+        results = binary_tests(sequence, tests=self.tests)
+        self.sequences += 1
+        for name, result in results.items():
+            self.passed[name] += result['passed']
+        return results
+
+    def clear(self):
+        self.pending.clear()
+
+
+def testCapture(path: str, threshold: float, sequence_bits: int=1 << 20, **extractor_settings):
+    """
+        Extracts the random bits of a saved .iad capture and tests them sequence by sequence
+
+        Returns:
+            The results of each full sequence, and the extractor (for its statistics)
+    """
+    import iad
+    from extractor import BitExtractor
+
+    capture = iad.Capture(path)
+    extractor = BitExtractor(threshold, **extractor_settings)
+    battery = TestBattery(sequence_bits)
+
+    results = []
+    chunk = 1 << 20
+    for start in range(0, len(capture), chunk):
+        sequence = battery.feed(extractor.extract(capture.voltages[start:start + chunk]))
+        while sequence is not None:
+            results.append(battery.run(sequence))
+            sequence = battery.feed(b'')
+    return results, extractor
+
+
+def main():
+    """
+        Tests the bits extracted from saved captures
+    """
+    parser = argparse.ArgumentParser(description='Randomness tests over the bits of .iad captures')
+    parser.add_argument('captures', nargs='+')
+    parser.add_argument('--threshold', type=float, default=None, help='bit threshold [V] (default: the one stored in the capture)')
+    parser.add_argument('--sequence-bits', type=int, default=1 << 20)
+    parser.add_argument('--conditioning', nargs='*', default=['von_neumann'], help='von_neumann, xor_fold and/or hash')
+    args = parser.parse_args()
+
+    import iad
+    for path in args.captures:
+        threshold = args.threshold
+        if threshold is None:
+            threshold = iad.readHeader(path)[0].get('threshold', 0.)
+        results, extractor = testCapture(path, threshold, args.sequence_bits, conditioning=args.conditioning)
+        print(f'{path}: {extractor}')
+        for i, sequence_results in enumerate(results):
+            print(f'  sequence {i}: {summary(sequence_results)}')
+        if not results:
+            print(f'  not enough bits for a {args.sequence_bits}-bit sequence')
+
 
-def binary_tests(bin_num):
-    
\ No newline at end of file
+if __name__ == '__main__':
+    main()
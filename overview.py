@@ -0,0 +1,273 @@
+#!/usr/bin/env python
+
+import os
+import numpy as np
+from threading import Thread, Event, Lock
+
+from iad import Capture, InvalidCaptureError
+
+######################################################################
+# Multi-resolution overview of a .iad capture
+#
+# Level k summarizes the capture in buckets of 2^k samples: the time of the
+# first sample and the min, max and mean voltage of every channel. Each level
+# is an append-only file of the '<capture>.overview' folder, extended while
+# recording and memory-mapped when browsing, so showing any stretch of the
+# capture costs about as many buckets as the plot has pixels. Buckets are
+# found by sample position, as older captures restart their time on every
+# reading (see iad.Capture.runs):
+#
+#   overview = Overview.build(iad.Capture('run.iad'))  # builds what is missing
+#   level = overview.levelFor(samples_per_pixel)        # None: draw the samples
+#   positions, buckets = overview.window(level, first_sample, last_sample)
+######################################################################
+
+FIRST_LEVEL = 4             # 16 samples per bucket, finer zooms read the capture itself
+OVERVIEW_SUFFIX = '.overview'
+
+_locks = {}                 # overview folder: Lock, so one builder at a time extends it
+_locks_lock = Lock()
+
+
+def levelDtype(channels: int=1) -> np.dtype:
+    """
+        Returns:
+            The bucket layout, with one min / max / mean per channel (scalars for a single channel)
+    """
+    shape = () if channels == 1 else (channels,)
+    return np.dtype([
+        ('time', '<f8'),
+        ('min', '<f8', shape),
+        ('max', '<f8', shape),
+        ('mean', '<f8', shape)
+    ])
+
+
+def overviewPath(capture_path: str) -> str:
+    return capture_path + OVERVIEW_SUFFIX
+
+
+class Overview:
+    """
+        Min / max / mean pyramid of a capture: every level halves the resolution of the one below
+
+        Usage:
+            overview = Overview(overviewPath('run.iad'), channels=1)
+            overview.append(times, voltages)   # as blocks are recorded
+            overview.close()
+    """
+    def __init__(self, path: str, channels: int=1):
+        """
+            Args:
+                path: folder of the level files (see overviewPath)
+                channels: voltages per sample of the capture
+        """
+        self.path = path
+        self.channels = channels
+        self.dtype = levelDtype(channels)
+        self.counts = []        # buckets of each level, FIRST_LEVEL first
+        self.tails = []         # last bucket of each level, until paired into the next one
+        self.files = []
+        self.pending_times = np.empty(0)
+        self.pending_voltages = np.empty((0, channels))
+
+    @classmethod
+    def build(cls, capture, chunk: int=1 << 22) -> 'Overview':
+        """
+            Opens the overview of @capture (an iad.Capture), summarizing the samples it lacks:
+            none right after recording, the whole capture for those recorded without one
+
+            Returns:
+                The overview, ready to be extended and browsed
+        """
+        overview = cls(overviewPath(capture.path), len(capture.pins))
+        with _locks_lock:
+            lock = _locks.setdefault(os.path.abspath(overview.path), Lock())
+        with lock:
+            for start in range(overview.resume(capture), len(capture), chunk):
+                records = capture.records[start:start + chunk]
+                overview.append(records['time'], records['voltage'])
+            overview.close()    # append() reopens the level files it extends
+        return overview
+
+    def levelPath(self, level: int) -> str:
+        return os.path.join(self.path, f'{level:02d}.bin')
+
+    def resume(self, capture) -> int:
+        """
+            Reloads the levels already stored for @capture, dropping them if they do not match it
+
+            Returns:
+                The number of samples summarized
+        """
+        self.counts, self.tails = [], []
+        level = FIRST_LEVEL
+        while os.path.exists(self.levelPath(level)):
+            self.counts.append(os.path.getsize(self.levelPath(level)) // self.dtype.itemsize)
+            level += 1
+
+        bucket = 1 << FIRST_LEVEL
+        counts = self.counts + [0]
+        matches = bool(self.counts) and self.counts[0] <= len(capture) // bucket \
+            and all(counts[i + 1] == counts[i] // 2 for i in range(len(self.counts)))
+        if matches and self.counts[0]:
+            first = np.fromfile(self.levelPath(FIRST_LEVEL), dtype=self.dtype, count=1)
+            last = self.level(0)[-1]
+            matches = first['time'][0] == capture.times[0] \
+                and last['time'] == capture.times[(self.counts[0] - 1) * bucket]
+        if not matches:
+            self.clear()
+            return 0
+
+        # a level with an odd count still waits for the bucket that completes its last pair
+        self.tails = [self.level(i)[-1:].copy() if count % 2 else None for i, count in enumerate(self.counts)]
+        # an interrupted write may leave part of a bucket at the end of a file
+        for i, count in enumerate(self.counts):
+            with open(self.levelPath(FIRST_LEVEL + i), 'r+b') as level_file:
+                level_file.truncate(count * self.dtype.itemsize)
+        return self.counts[0] * bucket
+
+    def clear(self):
+        self.close()
+        if os.path.isdir(self.path):
+            for name in os.listdir(self.path):
+                os.remove(os.path.join(self.path, name))
+        self.counts, self.tails = [], []
+        self.pending_times = np.empty(0)
+        self.pending_voltages = np.empty((0, self.channels))
+
+    ############################
+    # Building
+    ############################
+    def append(self, times: np.ndarray, voltages: np.ndarray):
+        """
+            Summarizes a block of samples (voltages as recorded: one per channel), extending
+            every level it completes buckets of
+        """
+        times = np.concatenate((self.pending_times, times))
+        voltages = np.concatenate((self.pending_voltages, np.asarray(voltages).reshape(-1, self.channels)))
+        bucket = 1 << FIRST_LEVEL
+        n = len(times) // bucket * bucket
+        self.pending_times, self.pending_voltages = times[n:], voltages[n:]
+        if not n:
+            return
+
+        samples = voltages[:n].reshape(-1, bucket, self.channels)
+        records = np.empty(n // bucket, dtype=self.dtype)
+        records['time'] = times[:n:bucket]
+        for field, reduce in (('min', np.min), ('max', np.max), ('mean', np.mean)):
+            records[field] = reduce(samples, axis=1).reshape(records[field].shape)
+
+        level = 0
+        while len(records):
+            self.write(level, records)
+            if self.tails[level] is not None:
+                records = np.concatenate((self.tails[level], records))
+            paired = len(records) // 2 * 2
+            self.tails[level] = records[paired:].copy() if paired < len(records) else None
+            records = self.combine(records[:paired])
+            level += 1
+
+    def combine(self, records: np.ndarray) -> np.ndarray:
+        """
+            Merges consecutive pairs of buckets into the buckets of the next level
+        """
+        pairs = records.reshape(-1, 2)
+        combined = np.empty(len(pairs), dtype=self.dtype)
+        combined['time'] = pairs['time'][:, 0]
+        combined['min'] = pairs['min'].min(axis=1)
+        combined['max'] = pairs['max'].max(axis=1)
+        combined['mean'] = pairs['mean'].mean(axis=1)
+        return combined
+
+    def write(self, level: int, records: np.ndarray):
+        if level == len(self.counts):
+            self.counts.append(0)
+            self.tails.append(None)
+        while len(self.files) <= level:
+            os.makedirs(self.path, exist_ok=True)
+            self.files.append(open(self.levelPath(FIRST_LEVEL + len(self.files)), 'ab'))
+        self.files[level].write(records.tobytes())
+        self.counts[level] += len(records)
+
+    def flush(self):
+        for level_file in self.files:
+            level_file.flush()
+
+    def close(self):
+        for level_file in self.files:
+            level_file.close()
+        self.files = []
+
+    ############################
+    # Browsing
+    ############################
+    def level(self, index: int) -> np.ndarray:
+        """
+            Returns:
+                The buckets of level FIRST_LEVEL + @index, memory-mapped
+        """
+        if index >= len(self.counts) or not self.counts[index]:
+            return np.empty(0, dtype=self.dtype)
+        return np.memmap(self.levelPath(FIRST_LEVEL + index), dtype=self.dtype, mode='r',
+                         shape=(self.counts[index],))
+
+    def levelFor(self, samples_per_pixel: float):
+        """
+            Returns:
+                Index of the coarsest level with at least a bucket per pixel, None when the
+                samples themselves are few enough to draw
+        """
+        if samples_per_pixel < 2 * (1 << FIRST_LEVEL) or not self.counts:
+            return None
+        return min(int(np.log2(samples_per_pixel)) - 1 - FIRST_LEVEL, len(self.counts) - 1)
+
+    def window(self, index: int, first: int, last: int):
+        """
+            Returns:
+                The position of the first sample of each bucket of level @index covering samples
+                @first to @last (excluded), and those buckets
+        """
+        shift = FIRST_LEVEL + index
+        start = first >> shift
+        buckets = self.level(index)[start:-(-last >> shift)]
+        return (np.arange(len(buckets)) + start) << shift, buckets
+
+
+class OverviewBuilder(Thread):
+    """
+        Brings the overview of a capture up to date from the capture file whenever asked, so
+        neither the recorder nor the GUI ever waits for it (e.g. summarizing a long capture
+        recorded without one)
+
+        Usage:
+            builder = OverviewBuilder('run.iad'); builder.start()
+            builder.update()        # after flushing new records
+            builder.finish()        # a last update, then the thread ends
+    """
+    def __init__(self, path: str):
+        super().__init__(daemon=True)
+        self.path = path
+        self.overview = None    # latest build
+        self.error = None
+        self._wakeup = Event()
+        self._should_run = True
+
+    def update(self):
+        self._wakeup.set()
+
+    def finish(self):
+        self._should_run = False
+        self._wakeup.set()
+
+    def run(self):
+        try:
+            while True:
+                self._wakeup.wait()
+                self._wakeup.clear()
+                finishing = not self._should_run
+                self.overview = Overview.build(Capture(self.path))
+                if finishing:
+                    break
+        except (OSError, InvalidCaptureError) as error:
+            self.error = error
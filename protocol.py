@@ -0,0 +1,525 @@
+#!/usr/bin/env python
+
+import os
+import time
+import platform
+from msgid import _
+from typing import Tuple
+import numpy as np
+import serial
+import serial.tools.list_ports  # should pip install esptool (?)
+
+######################################################################
+# NOISR protocol
+######################################################################
+
+CONTROLS = {            # https://theasciicode.com.ar
+    'START': b'\x01',   # SOH: start header control character
+    'BINARY': b'\x02',  # STX: requests samples as binary frames instead of text
+    'PAUSE': b'\x03',   # ETX: indicates that it is the end of the message (interrupt)
+    'STOP': b'\x04',    # EOT: indicates the end of transmission
+    'ENQUIRE': b'\x05', # ENQ: requests a response from arduino to confirm it is ready (Equiry)
+    'OK': b'\x06',      # ACK: acknowledgement
+    'SYNC': b'\x16',    # DLE: synchronous Idle (used for transmission)
+    'ERROR': b'\x21'    # NAK: exclaim(error) special character
+}
+
+MODE_ASCII  = 'ascii'   # one `println` voltage per sample (legacy firmware)
+MODE_BINARY = 'binary'  # fixed-size frames with raw ADC counts
+
+BAUDRATE = 115200       # serial speed of noiserino.ino (legacy firmware: 9600)
+DEFAULT_RATE = 500      # [Hz] a BAUDRATE link carries it for all ANALOG_PINS (see maxRate)
+
+ADC_RESOLUTION  = 1023  # 10-bit ADC
+ADC_REFERENCE   = 5.    # [V]
+
+ANALOG_PINS = 6         # A0-A5
+PIN_MASK    = 0x80      # START pin byte with this bit set: the low bits select several pins
+MULTI_CHANNEL_VERSION = 2   # first firmware accepting pin masks
+
+# SYNC | sequence (uint16) | ADC counts (uint16) | checksum (XOR of the 4 payload bytes)
+FRAME_DTYPE = np.dtype([
+    ('sync', 'u1'),
+    ('sequence', '<u2'),
+    ('counts', '<u2'),
+    ('checksum', 'u1')
+])
+
+
+def frameDtype(channels: int=1) -> np.dtype:
+    """
+        Returns:
+            The frame layout carrying one sample per channel, in ascending pin order
+            (SYNC | sequence | counts x @channels | checksum); FRAME_DTYPE for a single channel
+    """
+    if channels == 1:
+        return FRAME_DTYPE
+    return np.dtype([
+        ('sync', 'u1'),
+        ('sequence', '<u2'),
+        ('counts', '<u2', (channels,)),
+        ('checksum', 'u1')
+    ])
+
+
+######################################################################
+# Qt-free protocol engine (shared by the GUI, headless mode and the API)
+######################################################################
+
+def handshake(port: str, baudrate: int, pin: int, timeout: int=1) -> Tuple[int, str, int]:
+    """
+        Hanshakes Arduino and negotiates the streaming mode
+
+        Returns:
+            A random number, the streaming mode supported by the board (MODE_BINARY
+            if the board advertises it, MODE_ASCII otherwise) and its protocol version
+            (0 for legacy firmware)
+    """
+    with serial.Serial(port, baudrate, timeout=timeout) as connection:
+        connection.reset_input_buffer()
+        connection.write(CONTROLS['ENQUIRE'])
+
+        # waits for Arduino's acknowledgment for 3 seconds
+        timeout = time.time() + 3
+        while connection.read(1) != CONTROLS['OK']:
+            if time.time() > timeout:
+                connection.write(CONTROLS['STOP'])
+                raise ConnectionTimeout(_('CON_ERR_TIMEOUT'))
+
+        connection.write(pin.to_bytes(1, byteorder='big', signed=False))
+
+        # Wait for Arduino to respond
+        timeout = time.time() + 3
+        while not connection.readable():
+            if time.time() > timeout:
+                connection.write(CONTROLS['STOP'])
+                raise ConnectionTimeout(_('CON_ERR_TIMEOUT'))
+            pass
+
+        lucky_number = int.from_bytes(connection.read(1), byteorder='big')
+
+        # binary capable firmware follows up with SYNC + protocol version;
+        # older firmware says nothing and the read times out
+        advert = connection.read(2)
+        if len(advert) == 2 and advert[:1] == CONTROLS['SYNC']:
+            return lucky_number, MODE_BINARY, advert[1]
+        return lucky_number, MODE_ASCII, 0
+
+
+def pinSelection(pins, mode: str, firmware_version: int):
+    """
+        Checks that the board can stream @pins together
+
+        Returns:
+            What startStream expects: the sorted pins (sent as a mask) if the firmware takes
+            masks, the pin number otherwise
+
+        Raises:
+            InvalidPinError: unknown pins, or several pins for a board that streams only one
+    """
+    pins = sorted(set(pins))
+    if not pins or not all(0 <= pin < ANALOG_PINS for pin in pins):
+        raise InvalidPinError(f'Pins must be between A0 and A{ANALOG_PINS - 1}')
+    if firmware_version >= MULTI_CHANNEL_VERSION and mode == MODE_BINARY:
+        return pins
+    if len(pins) > 1:
+        raise InvalidPinError('This board streams a single pin: update its firmware to read several at once')
+    return pins[0]
+
+
+def maxRate(baudrate: int, channels: int=1) -> int:
+    """
+        Returns:
+            The highest sample rate [Hz] a serial link at @baudrate carries in binary frames of
+            @channels (10 bits per byte on the wire: start, 8 data and stop bits)
+    """
+    return baudrate // (10 * frameDtype(channels).itemsize)
+
+
+def startStream(connection, pin, read_rate: int, mode: str=MODE_ASCII, timeout: int=5):
+    """
+        Asks the board behind the open serial @connection to start streaming @pin
+
+        Args:
+            pin: a pin number, or a list of pins sent as a PIN_MASK byte (see pinSelection)
+
+        Raises:
+            RateTooHighError: in binary mode, when the link cannot carry @read_rate (see maxRate)
+    """
+    if mode == MODE_BINARY:
+        channels = 1 if isinstance(pin, int) else len(pin)
+        limit = maxRate(connection.baudrate, channels)
+        if read_rate > limit:
+            raise RateTooHighError(read_rate, limit, connection.baudrate, channels)
+
+    connection.write(CONTROLS['START'])
+
+    # wait for acknowledgement from Arduino for 5 seconds (timeout)
+    timer = time.time() + timeout
+    read = None
+    while read != CONTROLS['OK']:
+        read = connection.read()
+        if time.time() > timer:
+            raise ConnectionTimeout(_('CON_ERR_TIMEOUT'))
+
+    if isinstance(pin, int):
+        connection.write(pin.to_bytes(1, byteorder='little', signed=False))
+    else:
+        connection.write(bytes([PIN_MASK | sum(1 << channel for channel in pin)]))
+    if mode == MODE_BINARY:
+        # the board owns the sample clock: it gets the rate and paces the frames itself
+        connection.write(CONTROLS['BINARY'])
+        connection.write(read_rate.to_bytes(2, byteorder='little', signed=False))
+
+
+def stopStream(connection):
+    connection.write(CONTROLS['STOP'])
+
+
+class SampleReader:
+    """
+        Turns what the board sends into sample blocks, according to the streaming mode
+
+        With several channels, voltages come as (samples x channels) arrays, in ascending pin order
+    """
+    def __init__(self, serial_connection, rate: int, mode: str=MODE_ASCII, channels: int=1, start: float=0.):
+        """
+            Args:
+                start: time of the first sample [s]; the board restarts its clock on every START,
+                    so a reading that continues a previous one starts where that one stopped
+        """
+        self.serial_connection = serial_connection
+        self.rate = rate
+        self.mode = mode
+        self.channels = channels
+        self.statistics = StreamStatistics()
+        self.decoder = FrameDecoder(self.statistics, channels)
+        self.start = start
+        self.next_time = start  # time of the sample after the last one read
+        self.line = b''         # partial ASCII line (non-blocking reads only)
+
+    def readSamples(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+            Reads whatever the board sent according to the streaming mode
+
+            Returns:
+                The times, voltages and samples lost right before each of them (possibly none)
+        """
+        if self.mode == MODE_BINARY:
+            return self.feed(self.serial_connection.read(
+                max(self.decoder.frame_dtype.itemsize, self.serial_connection.in_waiting)))
+
+        analog_value = self.serial_connection.readline().decode().strip()
+        return self.steadySamples(np.array([float(analog_value)] if analog_value else []))
+
+    def feed(self, data: bytes) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+            Decodes bytes already read from the board (for transports that never wait on the port)
+
+            Returns:
+                Same as readSamples
+        """
+        if self.mode == MODE_BINARY:
+            # binary frames are clocked by the board (sequence number = sample clock tick),
+            # so both time and gaps come from the sequence numbers
+            indices, counts = self.decoder.feed(data)
+            lost = self.statistics.update(indices)
+            times = self.start + indices / self.rate
+            if times.size:
+                self.next_time = times[-1] + 1 / self.rate
+            return times, toVoltage(counts), lost
+
+        *lines, self.line = (self.line + data).split(b'\n')
+        values = [line.strip() for line in lines]
+        return self.steadySamples(np.array([float(value) for value in values if value]))
+
+    def steadySamples(self, voltages: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+            Legacy firmware: no clock information, so it is assumed to be steady
+        """
+        times = self.next_time + np.arange(voltages.size) / self.rate
+        if voltages.size:
+            self.next_time = times[-1] + 1 / self.rate
+        lost = self.statistics.update(np.arange(voltages.size) + self.statistics.last_index + 1)
+        return times, voltages, lost
+
+
+class StreamStatistics:
+    """
+        Health counters of a sample stream: gaps, lost samples, corrupted bytes and throughput
+    """
+    def __init__(self):
+        self.samples = 0        # samples received
+        self.gaps = 0           # holes in the sequence numbers
+        self.lost = 0           # samples missing in those holes
+        self.discarded = 0      # bytes thrown away while looking for a valid frame
+        self.last_index = -1
+        self.started = None
+
+    def update(self, indices: np.ndarray) -> np.ndarray:
+        """
+            Accounts for newly received sample @indices
+
+            Returns:
+                How many samples were lost right before each of the new ones
+        """
+        if self.started is None:
+            self.started = time.monotonic()
+        if not indices.size:
+            return np.empty(0, dtype=np.int64)
+
+        lost = np.diff(indices, prepend=self.last_index) - 1
+        self.samples += indices.size
+        self.gaps += int(np.count_nonzero(lost))
+        self.lost += int(lost.sum())
+        self.last_index = int(indices[-1])
+        return lost
+
+    @property
+    def throughput(self) -> float:
+        """
+            Samples per second received since the first read
+        """
+        if self.started is None:
+            return 0.
+        elapsed = time.monotonic() - self.started
+        return self.samples / elapsed if elapsed > 0 else 0.
+
+    def __str__(self):
+        return (f'{self.samples} samples ({self.throughput:.1f} samples/s), '
+                f'{self.gaps} gaps ({self.lost} samples lost), {self.discarded} corrupted bytes')
+
+
+class FrameDecoder:
+    """
+        Reassembles binary frames out of the serial byte stream, resyncing on corrupted bytes
+
+        A one-byte XOR checksum lets about one misaligned frame in 256 through, whose sequence
+        number would shift every index after it: after skipping bytes, a frame is only accepted
+        once the next one confirms the alignment, and counts above the 10-bit ADC range are invalid
+    """
+    def __init__(self, statistics: StreamStatistics=None, channels: int=1):
+        self.buffer = b''
+        self.statistics = statistics or StreamStatistics()
+        self.frame_dtype = frameDtype(channels)
+        self.last_sequence = 0xFFFF     # so that the first frame (sequence 0) is sample 0
+        self.last_index = -1
+        self.aligned = False            # the buffer starts right after an accepted frame
+
+    def feed(self, data: bytes) -> Tuple[np.ndarray, np.ndarray]:
+        """
+            Decodes every complete frame in the stream, keeping partial frames for the next call
+
+            Args:
+                data: the bytes just read from serial
+
+            Returns:
+                The sample indices (unwrapped sequence numbers) and the ADC counts of the valid frames
+                (samples x channels with several channels)
+        """
+        stream = self.buffer + data
+        size = self.frame_dtype.itemsize
+        sync = CONTROLS['SYNC'][0]
+        blocks = []
+
+        start = 0
+        while True:
+            found = stream.find(sync, start)
+            if found < 0:
+                self.statistics.discarded += len(stream) - start
+                start = len(stream)
+                break
+            self.statistics.discarded += found - start
+            self.aligned = self.aligned and found == start
+            start = found
+
+            n_frames = (len(stream) - start) // size
+            if n_frames == 0:
+                break
+
+            raw = np.frombuffer(stream, np.uint8, n_frames * size, start).reshape(n_frames, size)
+            valid = (raw[:, 0] == sync) & (np.bitwise_xor.reduce(raw[:, 1:-1], axis=1) == raw[:, -1]) \
+                & np.all(raw[:, 4:-1:2] <= ADC_RESOLUTION >> 8, axis=1)    # high bytes of the counts
+            n_valid = n_frames if valid.all() else int(np.argmin(valid))
+            accepted = n_valid if self.aligned or n_valid > 1 else 0
+
+            if accepted:
+                blocks.append(np.frombuffer(stream, self.frame_dtype, accepted, start))
+                start += accepted * size
+                self.aligned = True
+            if accepted < n_frames:
+                if n_valid == n_frames == 1:
+                    break           # a lone frame waits for the next one to confirm it
+                # misaligned or corrupted: skip the fake SYNC and resync
+                start += 1
+                self.statistics.discarded += 1
+                self.aligned = False
+
+        self.buffer = stream[start:]
+
+        frames = np.concatenate(blocks) if blocks else np.empty(0, self.frame_dtype)
+        return self.unwrap(frames['sequence']), frames['counts'].astype(np.uint16)
+
+    def unwrap(self, sequences: np.ndarray) -> np.ndarray:
+        """
+            Turns the 16-bit wrapping sequence numbers into monotonic sample indices
+        """
+        if not sequences.size:
+            return np.empty(0, dtype=np.int64)
+
+        previous = np.concatenate(([self.last_sequence], sequences[:-1])).astype(np.uint16)
+        steps = (sequences.astype(np.uint16) - previous).astype(np.int64)   # modulo 2^16
+        indices = self.last_index + np.cumsum(steps)
+
+        self.last_sequence = int(sequences[-1])
+        self.last_index = int(indices[-1])
+        return indices
+
+
+class NoPortError(Exception):
+    def __init__(self, message='Port error'):
+        self.message = message
+        super().__init__(self.message)
+
+
+class ReadFromSerialError(Exception):
+    def __init__(self, message='Connection error'):
+        self.message = message
+        super().__init__(self.message)
+
+
+class InvalidPinError(Exception):
+    def __init__(self, message='Invalid Pin Error'):
+        self.message = message
+        super().__init__(self.message)
+
+
+class RateTooHighError(Exception):
+    """
+        Exception raised when the serial link is too slow for the sample rate asked for
+    """
+    def __init__(self, rate: int, limit: int, baudrate: int, channels: int=1):
+        self.rate = rate
+        self.limit = limit
+        self.message = f'{rate} samples/s exceed the {limit} samples/s a {baudrate} baud link carries ' \
+                       f'for {channels} pin(s): lower the rate or raise the baud rate'
+        super().__init__(self.message)
+
+
+class ConnectionTimeout(Exception):
+    """
+        Exception raised when a connection times out.
+    """
+    DEFAULT_MESSAGE = "Connection timed out"
+
+    def __init__(self, port_name=None, timeout_duration=None):
+        """
+            Initializes a ConnectionTimeout instance.
+
+            Args:
+                port_name (str, optional): The name of the port that timed out. Defaults to None.
+                timeout_duration (int, optional): The duration of the timeout in seconds. Defaults to None.
+        """
+        self.port_name = port_name
+        self.timeout_duration = timeout_duration
+        if port_name and timeout_duration:
+            self.message = f'Timed out connecting to port {port_name} after {timeout_duration} seconds'
+        elif port_name:
+            self.message = f'Timed out connecting to port {port_name}'
+        elif timeout_duration:
+            self.message = f'Timed out after {timeout_duration} seconds'
+        else:
+            self.message = self.DEFAULT_MESSAGE
+        super().__init__(self.message)
+
+
+######################################################################
+# Functions and utils
+######################################################################
+
+def cross_platform(implementations: dict):
+    """
+        This decorator returns a function that selects the correct implementation based on the operating system
+
+        Args:
+            implementations (dict): a map of operating system (key) and corresponding implementation (value)
+
+        Returns:
+            function: the correct implementation based on the operating system
+
+        Raises:
+            OSError: if the operating system is not supported
+    """
+    def wrapper(func):
+        def implementationSelector():
+            try:
+                system = platform.system().lower()
+                if system in implementations:
+                    return implementations[system]()
+                raise OSError('Unsupported operating system')
+            except Exception as implementation_error:
+                raise implementation_error
+        return implementationSelector
+    return wrapper
+
+
+def toVoltage(counts: np.ndarray) -> np.ndarray:
+    """
+        Converts raw ADC counts into voltages
+    """
+    return np.asarray(counts, dtype=np.float64) * (ADC_REFERENCE / ADC_RESOLUTION)
+
+
+def getArduinoPortsOnLinux():
+    """
+        Returns:
+            list: all the available serial ports on a Linux system
+    """
+    return [os.path.join('/dev', file_name) for file_name in os.listdir('/dev') if file_name.startswith('ttyACM')]
+
+
+def getArduinoPortsOnMac():
+    """
+        Returns:
+            list: all the available serial ports on a Mac system
+    """
+    return [port.device for port in serial.tools.list_ports.comports() if 'Arduino' in port.description and 'usbmodem' in port.device]
+
+
+def getArduinoPortsOnWindows():
+    """
+        Returns:
+            list: all the available serial ports on a Windows system
+    """
+    return [port.device for port in serial.tools.list_ports.comports() if 'Arduino' in port.description]
+
+
+@cross_platform({
+    'linux': getArduinoPortsOnLinux,
+    'darwin': getArduinoPortsOnMac,
+    'windows': getArduinoPortsOnWindows
+})
+def getPorts():
+    """
+        Returns:
+            list: all the available serial ports on the current system
+    """
+    pass
+
+
+# https://pyserial.readthedocs.io/en/stable/pyserial_api.html
+
+def info(connection):
+    """
+        Receives a @connection string and returns a representative dict
+    """
+    pairsList = str(connection).split("(")[1].split(")")[
+        0].split(",")      # remove special characters
+    pairsList = [pair.strip() for pair in pairsList]
+
+    parsedConnection = {}
+    for pair in pairsList:  # splits into key-value pairs
+        key, value = pair.split("=")
+        parsedConnection[key.strip()] = value.strip()
+
+    return parsedConnection
@@ -0,0 +1,114 @@
+#!/usr/bin/env python
+
+import os
+import time
+import numpy as np
+from queue import Queue, Empty
+from threading import Thread
+from iad import recordDtype, capturePins, encodeHeader, appendable, InvalidCaptureError
+from overview import OverviewBuilder
+
+######################################################################
+# Streaming recorder
+######################################################################
+
+class Recorder(Thread):
+    """
+        Appends incoming sample blocks to a .iad capture while acquiring, so a run is bounded by disk and not RAM
+
+        An existing capture is only appended to when it holds the same pins at the same rate
+        (see iad.appendable), otherwise InvalidCaptureError is raised
+    """
+    def __init__(self, path: str, metadata: dict=None, flush_size: int=1 << 20, flush_interval: float=1.,
+                 queue_size: int=256, overview: bool=True):
+        """
+            Args:
+                path: capture the records are appended to (created with a header from @metadata if new)
+                metadata: header of the capture; with several 'pins', blocks carry (samples x pins) voltages
+                flush_size: bytes written before forcing a flush
+                flush_interval: seconds between flushes when data trickles in
+                queue_size: blocks waiting to be written before write() blocks
+                overview: also keeps the min / max / mean pyramid next to the capture up to date, from
+                    its own thread (see overview.OverviewBuilder)
+        """
+        super().__init__(daemon=True)
+        self.path = path
+        self.metadata = metadata or {}
+        if not appendable(path, self.metadata):
+            raise InvalidCaptureError(f'{path} holds other pins or another rate: record to a new capture')
+        self.dtype = recordDtype(len(capturePins(self.metadata)))
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.queue = Queue(maxsize=queue_size)
+        self.build_overview = overview
+        self.overview = None
+        self.samples = 0
+        self.error = None
+
+    def write(self, times: np.ndarray, voltages: np.ndarray):
+        """
+            Queues a block to be written (cheap, safe to call from the GUI thread)
+        """
+        if len(times) and self.is_alive():
+            self.queue.put((np.asarray(times), np.asarray(voltages)))
+
+    def stop(self):
+        """
+            Writes whatever is queued, syncs the file to disk and waits for the thread to finish
+        """
+        if self.is_alive():
+            self.queue.put(None)
+        self.join()
+
+    def run(self):
+        try:
+            with open(self.path, 'ab', buffering=self.flush_size) as capture:
+                if capture.tell() == 0:
+                    capture.write(encodeHeader(self.metadata))
+                if self.build_overview:
+                    # also catches up with the records already there (e.g. a capture recorded without it)
+                    capture.flush()
+                    self.overview = OverviewBuilder(self.path)
+                    self.overview.start()
+                    self.overview.update()
+                pending = 0
+                last_flush = time.monotonic()
+                while True:
+                    try:
+                        block = self.queue.get(timeout=self.flush_interval)
+                    except Empty:
+                        block = ()
+
+                    if block is None:
+                        break
+                    if block:
+                        pending += self.writeBlock(capture, *block)
+
+                    if pending >= self.flush_size or (pending and time.monotonic() - last_flush >= self.flush_interval):
+                        capture.flush()
+                        if self.overview:
+                            self.overview.update()
+                        pending = 0
+                        last_flush = time.monotonic()
+
+                capture.flush()
+                os.fsync(capture.fileno())
+        except OSError as error:
+            self.error = error
+        finally:
+            if self.overview:
+                self.overview.finish()  # not waited for: it reads back what was flushed
+
+    def writeBlock(self, capture, times, voltages) -> int:
+        """
+            Writes a block as little-endian records
+
+            Returns:
+                The number of bytes written
+        """
+        records = np.empty(len(times), dtype=self.dtype)
+        records['time'] = times
+        records['voltage'] = voltages
+        capture.write(records.tobytes())
+        self.samples += len(records)
+        return records.nbytes
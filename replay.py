@@ -0,0 +1,135 @@
+#!/usr/bin/env python
+
+import time
+import numpy as np
+from threading import Semaphore
+
+import iad
+from connection import StreamStatistics, MODE_BINARY
+from PyQt5.QtCore import QThread, pyqtSignal
+
+######################################################################
+# Replay of recorded captures through the live pipeline
+######################################################################
+
+class ReplaySource:
+    """
+        Streams a .iad capture as if it came from a board: same interface as NOISRProtocol
+    """
+    def __init__(self, path: str, speed: float=1.):
+        """
+            Args:
+                speed: 1 for the original speed, N for N times faster, 0 for as fast as the GUI can take
+        """
+        self.capture = iad.Capture(path)
+        self.pins = self.capture.pins
+        self.labels = self.capture.labels
+        self.port = path
+        self.speed = speed
+        self.serial_thread = None
+
+    def startReading(self, pin: int, read_rate: int, data_ready, mode: str=MODE_BINARY, frame_rate: int=0, timeout: int=5,
+                     start: float=0.):
+        """
+            Starts replaying; @pin, @read_rate and @mode come from the capture itself and are ignored
+
+            Args:
+                start: time the first sample is replayed at [s], to carry on from a previous reading
+        """
+        self.serial_thread = ReplaySource.ReplayThread(self.capture, self.speed, frame_rate, start)
+        if frame_rate:
+            self.serial_thread.block_ready.connect(data_ready)
+        else:
+            self.serial_thread.data_ready.connect(data_ready)
+        # queued after data_ready, so it runs once the GUI is done with the block
+        self.serial_thread.block_ready.connect(self.serial_thread.consumed)
+        self.serial_thread.data_ready.connect(self.serial_thread.consumed)
+        self.serial_thread.start()
+
+    def stopReading(self):
+        self.serial_thread.stop()
+        self.serial_thread.wait()
+
+    class ReplayThread(QThread):
+        """
+            Emits the capture samples on their original schedule (scaled by speed)
+        """
+        data_ready = pyqtSignal(float)
+        block_ready = pyqtSignal(object, object, object)    # times, voltages, samples lost before each one
+
+        BLOCK_CAPACITY = 4096   # samples per block when replaying as fast as possible
+        MAX_PENDING = 2         # blocks emitted but not yet consumed by the GUI
+
+        def __init__(self, capture, speed: float, frame_rate: int=0, start: float=0., parent=None):
+            super().__init__(parent)
+            self.capture = capture
+            self.speed = speed
+            self.frame_rate = frame_rate
+            self.start_time = start
+            self.rate = capture.metadata.get('rate', 1)
+            self.statistics = StreamStatistics()
+            self.pending = Semaphore(self.MAX_PENDING)
+            self._should_run = True
+
+        def stop(self):
+            self._should_run = False
+
+        def consumed(self, *args):
+            self.pending.release()
+
+        def run(self):
+            # several pins are replayed together, as (samples x pins) blocks
+            times = self.capture.times
+            voltages = self.capture.channels if len(self.capture.pins) > 1 else self.capture.voltages
+            n_samples = len(times)
+            if not n_samples:
+                return
+
+            # the readings of the capture are replayed back to back (see iad.Capture.offsets),
+            # moved to the start time
+            shift = self.start_time - times[0]
+            start = 0
+            ref_time, ref_wall = times[0], time.monotonic()
+            period = 1 / self.frame_rate if self.frame_rate else 1 / self.rate
+            while self._should_run and start < n_samples:
+                caught_up = True
+                if self.speed:
+                    window = self.capture.continuousTimes(start, start + self.BLOCK_CAPACITY)
+
+                    # everything recorded up to the current (scaled) replay time
+                    replay_time = ref_time + (time.monotonic() - ref_wall) * self.speed
+                    end = start + int(np.searchsorted(window, replay_time, side='right'))
+                    caught_up = end < start + window.size
+                else:
+                    end = min(start + (self.BLOCK_CAPACITY if self.frame_rate else 1), n_samples)
+
+                if end > start:
+                    self.emitSamples(self.capture.continuousTimes(start, end) + shift, np.array(voltages[start:end]))
+                    start = end
+                if self.speed and caught_up:
+                    self.msleep(max(1, int(period * 1000)))
+
+        def emitSamples(self, times, voltages):
+            """
+                Emits the samples, waiting while the GUI lags behind (so fast replays apply backpressure)
+            """
+            self.statistics.update(np.arange(len(times)) + self.statistics.last_index + 1)
+            if self.frame_rate:
+                if self.waitForConsumer():
+                    self.block_ready.emit(times, voltages, np.zeros(len(times), dtype=np.int64))
+                return
+
+            for voltage in voltages:
+                if not self.waitForConsumer():
+                    return
+                self.data_ready.emit(float(voltage if voltage.ndim == 0 else voltage[0]))
+
+        def waitForConsumer(self) -> bool:
+            """
+                Returns:
+                    True once the GUI has room for another emission, False if the replay was stopped
+            """
+            while not self.pending.acquire(timeout=0.1):
+                if not self._should_run:
+                    return False
+            return True
@@ -0,0 +1,88 @@
+import numpy as np
+from typing import Sequence
+
+
+class RingBuffer:
+    """
+        Fixed-capacity circular buffer of float64 columns (e.g. time, voltage, clamp)
+
+        Every sample is written twice (at i and i + capacity), so the most recent
+        window is always one contiguous slice and can be handed to pyqtgraph without copying
+    """
+    def __init__(self, capacity: int, columns: Sequence[str]=('time', 'voltage', 'clamp')):
+        if capacity < 1:
+            raise ValueError('RingBuffer capacity must be positive')
+
+        self.capacity = capacity
+        self.columns = {name: index for index, name in enumerate(columns)}
+        self.data = np.zeros((len(columns), 2 * capacity), dtype=np.float64)
+        self.head = 0   # next slot to write, in [0, capacity)
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    def __bool__(self):
+        return self.size > 0
+
+    def append(self, *values: float):
+        """
+            Appends one sample (one value per column) in O(1)
+        """
+        self.data[:, self.head] = values
+        self.data[:, self.head + self.capacity] = values
+        self.head = (self.head + 1) % self.capacity
+        self.size = min(self.size + 1, self.capacity)
+
+    def extend(self, *blocks: np.ndarray):
+        """
+            Appends a block of samples (one array per column), keeping only the last @capacity
+        """
+        block = np.asarray(blocks, dtype=np.float64)
+        n = block.shape[1]
+        if n == 0:
+            return
+        if n > self.capacity:
+            self.head = (self.head + n - self.capacity) % self.capacity
+            block = block[:, -self.capacity:]
+            n = self.capacity
+
+        # the first copy may wrap around the end of the first half, the second may not
+        first = min(n, self.capacity - self.head)
+        self.data[:, self.head:self.head + first] = block[:, :first]
+        self.data[:, :n - first] = block[:, first:]
+        self.data[:, self.head + self.capacity:self.head + self.capacity + first] = block[:, :first]
+        self.data[:, self.capacity:self.capacity + n - first] = block[:, first:]
+
+        self.head = (self.head + n) % self.capacity
+        self.size = min(self.size + n, self.capacity)
+
+    def view(self, column: str, last: int=None) -> np.ndarray:
+        """
+            Returns a read-only, zero-copy view of the @last samples of @column (oldest first)
+        """
+        count = self.size if last is None else min(last, self.size)
+        end = self.head + self.capacity
+        window = self.data[self.columns[column], end - count:end]
+        window.flags.writeable = False
+        return window
+
+    def first(self, column: str) -> float:
+        """
+            Returns the oldest value of @column still in the buffer
+        """
+        if not self.size:
+            raise IndexError('RingBuffer is empty')
+        return self.data[self.columns[column], self.head + self.capacity - self.size]
+
+    def last(self, column: str) -> float:
+        """
+            Returns the newest value of @column
+        """
+        if not self.size:
+            raise IndexError('RingBuffer is empty')
+        return self.data[self.columns[column], self.head + self.capacity - 1]
+
+    def clear(self):
+        self.head = 0
+        self.size = 0
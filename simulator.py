@@ -0,0 +1,272 @@
+#!/usr/bin/env python
+
+import os
+import sys
+import tty
+import time
+import select
+import argparse
+import numpy as np
+from threading import Thread
+
+from protocol import CONTROLS, PIN_MASK, ADC_REFERENCE, ADC_RESOLUTION, frameDtype
+
+######################################################################
+# Simulated noiserino board over a pseudo-terminal
+######################################################################
+
+PROTOCOL_VERSION = 2    # pin masks and multi-channel frames
+LEGACY_RATE = 10        # ASCII mode keeps the old 100ms pacing
+MODE_TIMEOUT = 0.05     # [s] the board waits this long for BINARY after the pin
+TIMEOUT = 5             # [s]
+
+NOISE_MODELS = ('gaussian', 'uniform', 'sine', 'random_walk')
+
+
+class SimulatedBoard(Thread):
+    """
+        Speaks the CONTROLS protocol like noiserino.ino does, through a pty any serial client can open
+
+        Usage:
+            board = SimulatedBoard(noise='gaussian'); board.start()
+            connection.NOISRProtocol(board.port, protocol.BAUDRATE)
+    """
+    def __init__(self, noise: str='gaussian', mean: float=1.4, amplitude: float=0.5, rate: int=0,
+                 drop_rate: float=0., garbage_rate: float=0., stall_rate: float=0., stall_duration: float=0.2, seed=None):
+        """
+            Args:
+                noise: one of NOISE_MODELS
+                mean, amplitude: center and spread of the signal [V]
+                rate: forces the sample rate [Hz] (0 to use the one given by START)
+                drop_rate: probability of a frame losing one of its bytes
+                garbage_rate: probability of random bytes being injected before a frame
+                stall_rate: probability of the board freezing for @stall_duration seconds after writing
+                    a block of samples (the samples due since the previous write)
+        """
+        super().__init__(daemon=True)
+        if noise not in NOISE_MODELS:
+            raise ValueError(f'Unknown noise model {noise}, choose from {NOISE_MODELS}')
+
+        self.noise = noise
+        self.mean = mean
+        self.amplitude = amplitude
+        self.forced_rate = rate
+        self.drop_rate = drop_rate
+        self.garbage_rate = garbage_rate
+        self.stall_rate = stall_rate
+        self.stall_duration = stall_duration
+        self.random = np.random.default_rng(seed)
+
+        self.master, self.slave = os.openpty()
+        tty.setraw(self.slave)
+        self.port = os.ttyname(self.slave)
+
+        self.samples_sent = 0
+        self.bytes_dropped = 0  # because the host was not reading
+        self._should_run = True
+        self._phase = 0.
+        self._walk = mean
+
+    def stop(self):
+        self._should_run = False
+        self.join()
+        os.close(self.master)
+        os.close(self.slave)
+
+    ############################
+    # Serial I/O
+    ############################
+    def read(self, timeout: float) -> bytes:
+        """
+            Returns:
+                One byte sent by the host, or b'' on timeout
+        """
+        readable, _, _ = select.select([self.master], [], [], timeout)
+        return os.read(self.master, 1) if readable else b''
+
+    def write(self, data: bytes, timeout: float=TIMEOUT):
+        """
+            Writes @data unless the host stops draining the pty for @timeout seconds,
+            in which case the rest is dropped (like samples lost to a full serial buffer)
+        """
+        view = memoryview(data)
+        while view:
+            _, writable, _ = select.select([], [self.master], [], timeout)
+            if not writable:
+                self.bytes_dropped += len(view)
+                return
+            written = os.write(self.master, view[:select.PIPE_BUF])
+            view = view[written:]
+
+    ############################
+    # Protocol
+    ############################
+    def run(self):
+        while self._should_run:
+            command = self.read(0.1)
+            if command == CONTROLS['START']:
+                self.stream()
+            elif command == CONTROLS['ENQUIRE']:
+                self.handshake()
+            elif command:
+                self.write(CONTROLS['ERROR'])
+
+    def handshake(self):
+        self.write(CONTROLS['OK'])
+        pin = self.read(TIMEOUT)
+        if not pin:
+            self.write(CONTROLS['ERROR'])
+            return
+        self.write(bytes([int(self.random.integers(10))]))
+        self.write(CONTROLS['SYNC'] + bytes([PROTOCOL_VERSION]))
+
+    def stream(self):
+        self.write(CONTROLS['OK'])
+        pin = self.read(TIMEOUT)
+        if not pin or pin == CONTROLS['STOP']:
+            return
+        mask = pin[0] & ~PIN_MASK if pin[0] & PIN_MASK else 1 << pin[0]
+        channels = max(1, bin(mask).count('1'))
+
+        binary = False
+        rate = LEGACY_RATE
+        mode = self.read(MODE_TIMEOUT)
+        if mode == CONTROLS['BINARY']:
+            binary = True
+            rate_bytes = self.read(TIMEOUT) + self.read(TIMEOUT)
+            rate = int.from_bytes(rate_bytes, byteorder='little') or LEGACY_RATE
+        elif mode == CONTROLS['STOP']:
+            return
+        rate = self.forced_rate or rate
+
+        # the simulated board owns the sample clock: ticks are due at started + tick / rate
+        started = time.monotonic()
+        tick = 0
+        while self._should_run:
+            if self.read(0) == CONTROLS['STOP']:
+                return
+
+            due = int((time.monotonic() - started) * rate)
+            written = due > tick
+            if written:
+                counts = self.sampleCounts(due - tick, channels if binary else 1)
+                self.write(self.encodeFrames(tick, counts) if binary else self.encodeText(counts), 0.05)
+                self.samples_sent += len(counts)
+                tick = due
+
+            if written and self.stall_rate and self.random.random() < self.stall_rate:
+                time.sleep(self.stall_duration)
+                # like the firmware, missed ticks are skipped (the sequence numbers jump)
+                tick = int((time.monotonic() - started) * rate)
+            else:
+                time.sleep(min(0.001, 1 / rate))
+
+    ############################
+    # Signal and encoding
+    ############################
+    def sampleCounts(self, n: int, channels: int=1) -> np.ndarray:
+        """
+            Returns:
+                @n raw ADC counts drawn from the noise model (n x @channels when several;
+                each channel is the previous one plus independent noise, so they are correlated)
+        """
+        counts = self.channelCounts(n)
+        if channels == 1:
+            return counts
+        spread = self.amplitude * (ADC_RESOLUTION / ADC_REFERENCE)
+        offsets = np.rint(np.cumsum(self.random.normal(0, spread / 2, (n, channels - 1)), axis=1))
+        extra = np.clip(counts[:, np.newaxis] + offsets, 0, ADC_RESOLUTION).astype(np.uint16)
+        return np.column_stack((counts, extra))
+
+    def channelCounts(self, n: int) -> np.ndarray:
+        if self.noise == 'gaussian':
+            voltages = self.random.normal(self.mean, self.amplitude, n)
+        elif self.noise == 'uniform':
+            voltages = self.random.uniform(self.mean - self.amplitude, self.mean + self.amplitude, n)
+        elif self.noise == 'sine':
+            phases = self._phase + np.arange(1, n + 1) * 0.05
+            self._phase = phases[-1]
+            voltages = self.mean + self.amplitude * np.sin(phases) + self.random.normal(0, self.amplitude / 20, n)
+        else:
+            steps = self.random.normal(0, self.amplitude / 10, n)
+            voltages = self._walk + np.cumsum(steps)
+            self._walk = voltages[-1] = np.clip(voltages[-1], 0, ADC_REFERENCE)
+
+        counts = np.rint(voltages * (ADC_RESOLUTION / ADC_REFERENCE))
+        return np.clip(counts, 0, ADC_RESOLUTION).astype(np.uint16)
+
+    def encodeFrames(self, first_sequence: int, counts: np.ndarray) -> bytes:
+        """
+            Builds the binary frames (see protocol.frameDtype), injecting the configured faults
+        """
+        raw = encodeFrames(first_sequence, counts)
+        if not (self.drop_rate or self.garbage_rate):
+            return raw.tobytes()
+
+        n_frames, frame_size = raw.shape
+        keep = np.ones(raw.shape, dtype=bool)
+        dropped = np.flatnonzero(self.random.random(n_frames) < self.drop_rate)
+        keep[dropped, self.random.integers(0, frame_size, dropped.size)] = False
+
+        chunks = []
+        garbage = self.random.random(n_frames) < self.garbage_rate
+        for i in range(n_frames):
+            if garbage[i]:
+                chunks.append(self.random.integers(0, 256, self.random.integers(1, 8), dtype=np.uint8).tobytes())
+            chunks.append(raw[i][keep[i]].tobytes())
+        return b''.join(chunks)
+
+    def encodeText(self, counts: np.ndarray) -> bytes:
+        """
+            Builds the legacy `Serial.println(voltage, 8)` lines
+        """
+        voltages = counts * (ADC_REFERENCE / ADC_RESOLUTION)
+        return ''.join(f'{voltage:.8f}\r\n' for voltage in voltages).encode()
+
+
+def encodeFrames(first_sequence: int, counts: np.ndarray) -> np.ndarray:
+    """
+        Returns:
+            The binary frames carrying @counts (one frame per row when 2-D: samples x channels),
+            as a (frames x frame size) byte array
+    """
+    dtype = frameDtype(counts.shape[1] if counts.ndim == 2 else 1)
+    frames = np.empty(len(counts), dtype=dtype)
+    frames['sync'] = CONTROLS['SYNC'][0]
+    frames['sequence'] = (first_sequence + np.arange(len(counts))) & 0xFFFF
+    frames['counts'] = counts
+    raw = frames.view(np.uint8).reshape(len(counts), dtype.itemsize)
+    raw[:, -1] = np.bitwise_xor.reduce(raw[:, 1:-1], axis=1)
+    return raw
+
+
+def main():
+    """
+        Runs a simulated board until interrupted and prints the port to connect to
+    """
+    parser = argparse.ArgumentParser(description='Simulated noiserino board over a pseudo-terminal')
+    parser.add_argument('--noise', choices=NOISE_MODELS, default='gaussian')
+    parser.add_argument('--mean', type=float, default=1.4, help='signal center [V]')
+    parser.add_argument('--amplitude', type=float, default=0.5, help='signal spread [V]')
+    parser.add_argument('--rate', type=int, default=0, help='forced sample rate [Hz] (default: the one asked by START)')
+    parser.add_argument('--drop-rate', type=float, default=0., help='probability of a frame losing a byte')
+    parser.add_argument('--garbage-rate', type=float, default=0., help='probability of garbage before a frame')
+    parser.add_argument('--stall-rate', type=float, default=0., help='probability of a stall after each block of samples written')
+    parser.add_argument('--stall-duration', type=float, default=0.2, help='stall duration [s]')
+    args = parser.parse_args()
+
+    board = SimulatedBoard(args.noise, args.mean, args.amplitude, args.rate,
+                           args.drop_rate, args.garbage_rate, args.stall_rate, args.stall_duration)
+    board.start()
+    print(f'Simulated noiserino listening on {board.port}', flush=True)
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        board.stop()
+        print(f'{board.samples_sent} samples sent')
+        sys.exit(0)
+
+
+if __name__ == '__main__':
+    main()
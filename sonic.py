@@ -1,5 +1,7 @@
 import struct
 import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+from ringbuffer import RingBuffer
 from typing import List, Tuple
 
 def Q_rsqrt(number: float):
@@ -21,51 +23,289 @@ class MovingAverage:
         self.arr = data
         self.window_size = window_size
 
+    @staticmethod
+    def kernel(method, window_size):
+        """
+            Returns the weights @method convolves the signal with
+        """
+        if method == 'simple':
+            return np.ones(window_size) / window_size
+        if method == 'cumulative':
+            weights = np.cumsum(np.ones(window_size)) / window_size
+            weights[window_size:] = weights[window_size:] - weights[:-window_size]
+            return weights
+        if method == 'weighted':
+            weights = np.arange(1, window_size+1)
+            return weights / np.sum(weights)
+        if method == 'exponential':
+            weights = np.exp(np.linspace(-1., 0., window_size))
+            return weights / np.sum(weights)
+        if method == 'triangular':
+            weights = np.arange(1, window_size+1)
+            return 2 * weights / (window_size * (window_size + 1))
+        if method == 'bartlett':
+            weights = np.arange(1, window_size+1)
+            weights = 2 * weights / (window_size - 1)
+            weights[0] /= 2
+            weights[-1] /= 2
+            return weights
+        raise ValueError(f'Unknown moving average {method}')
+
     @staticmethod
     def simple(arr, window_size):
-        weights = np.ones(window_size) / window_size
-        return np.convolve(arr, weights, mode='valid')
+        return np.convolve(arr, MovingAverage.kernel('simple', window_size), mode='valid')
 
     @staticmethod
     def cumulative(arr, window_size):
-        weights = np.cumsum(np.ones(window_size)) / window_size
-        weights[window_size:] = weights[window_size:] - weights[:-window_size]
-        return np.convolve(arr, weights, mode='valid')
+        return np.convolve(arr, MovingAverage.kernel('cumulative', window_size), mode='valid')
 
     @staticmethod
     def weighted(arr, window_size):
-        weights = np.arange(1, window_size+1)
-        weights = weights / np.sum(weights)
-        return np.convolve(arr, weights, mode='valid')
+        return np.convolve(arr, MovingAverage.kernel('weighted', window_size), mode='valid')
 
     @staticmethod
     def exponential(arr, window_size):
-        weights = np.exp(np.linspace(-1., 0., window_size))
-        weights = weights / np.sum(weights)
-        return np.convolve(arr, weights, mode='valid')
+        return np.convolve(arr, MovingAverage.kernel('exponential', window_size), mode='valid')
 
     @staticmethod
     def triangular(arr, window_size):
-        weights = np.arange(1, window_size+1)
-        weights = 2 * weights / (window_size * (window_size + 1))
-        return np.convolve(arr, weights, mode='valid')
+        return np.convolve(arr, MovingAverage.kernel('triangular', window_size), mode='valid')
 
     @staticmethod
     def bartlett(arr, window_size):
-        weights = np.arange(1, window_size+1)
-        weights = 2 * weights / (window_size - 1)
-        weights[0] /= 2
-        weights[-1] /= 2
-        return np.convolve(arr, weights, mode='valid')
+        return np.convolve(arr, MovingAverage.kernel('bartlett', window_size), mode='valid')
+
+    @staticmethod
+    def recursive(arr, window_size):
+        """
+            Exponential moving average y[n] = y[n-1] + alpha * (x[n] - y[n-1]), alpha = 2 / (window_size + 1),
+            starting at the first sample (one output per sample, unlike the convolutions)
+        """
+        return MovingAverage.Stream(window_size, 'recursive').update(arr)
 
     def __call__(self, method='simple'):
         return getattr(MovingAverage, method)(self.arr, self.window_size)
 
+    class Stream:
+        """
+            Stateful moving average fed block by block, as samples arrive
+
+            update() returns one value per sample: NaN until the first window is complete,
+            then exactly what the batch method yields over the whole signal so far
+            ('simple' keeps a running sum and 'recursive' is evaluated in closed form per chunk,
+            so those two match up to rounding)
+        """
+        RESYNC_SAMPLES = 1 << 16    # exact recomputation period of the running sum
+
+        def __init__(self, window_size, method='simple'):
+            if window_size < 1:
+                raise ValueError('Moving average window must be positive')
+            self.window_size = window_size
+            self.method = method
+            if method == 'recursive':
+                self.alpha = 2 / (window_size + 1)
+            else:
+                self.weights = MovingAverage.kernel(method, window_size)
+            self.reset()
+
+        def reset(self):
+            self.tail = np.empty(0)     # last window_size - 1 samples (FIR state)
+            self.total = None           # running sum of the tail ('simple'), None until known
+            self.average = np.nan       # last output ('recursive')
+            self._since_resync = 0
+
+        def update(self, block):
+            block = np.asarray(block, dtype=np.float64)
+            if block.size == 0:
+                return np.empty(0)
+            if self.method == 'recursive':
+                return self.updateRecursive(block)
+
+            signal = np.concatenate((self.tail, block))
+            averages = np.full(block.size, np.nan)
+            n_valid = signal.size - self.window_size + 1
+            if n_valid > 0:
+                if self.method == 'simple':
+                    averages[-n_valid:] = self.runningSum(signal, n_valid)
+                else:
+                    averages[-n_valid:] = np.convolve(signal, self.weights, mode='valid')
+            self.tail = signal[-(self.window_size - 1):] if self.window_size > 1 else np.empty(0)
+            return averages
+
+        def runningSum(self, signal, n_valid):
+            """
+                Sums of each complete window in @signal, carrying the tail sum over (O(block) per update)
+            """
+            window_size = self.window_size
+            if self.total is None or self._since_resync >= self.RESYNC_SAMPLES:
+                self.total = signal[:window_size - 1].sum()
+                self._since_resync = 0
+
+            # window i adds signal[i + window_size - 1] and drops signal[i - 1]
+            entering = signal[window_size - 1:]
+            leaving = np.concatenate(([0.], signal[:n_valid - 1]))
+            sums = self.total + np.cumsum(entering - leaving)
+
+            self.total = sums[-1] - signal[n_valid - 1]     # sum of the new tail
+            self._since_resync += n_valid
+            return sums / window_size
+
+        def updateRecursive(self, block):
+            """
+                Vectorized y[n] = (1 - alpha) * y[n-1] + alpha * x[n], in chunks short enough
+                for the powers of (1 - alpha) not to underflow
+            """
+            decay = 1 - self.alpha
+            if decay == 0:
+                self.average = block[-1]
+                return block.copy()
+            chunk = max(1, min(256, int(-300 / np.log10(decay))))
+            averages = np.empty(block.size)
+            start = 0
+            if np.isnan(self.average):
+                self.average = averages[0] = block[0]
+                start = 1
+            for first in range(start, block.size, chunk):
+                x = block[first:first + chunk]
+                powers = decay ** np.arange(1, x.size + 1)
+                # y[k] = decay^(k+1) * y[-1] + alpha * sum_j decay^(k-j) * x[j]
+                y = powers * (self.average + self.alpha * np.cumsum(x / powers))
+                averages[first:first + x.size] = y
+                self.average = y[-1]
+            return averages
+
 
 def movingAverage(arr, window_size, method='simple'):
     moving_average = MovingAverage(arr, window_size)
     return moving_average(method)
 
+class WelchSpectrum:
+    """
+        Power spectral density estimated incrementally with Welch's method: overlapping,
+        windowed segments are transformed as samples arrive and the last @averages
+        periodograms are averaged
+
+        Only the samples still needed for future segments are kept, so feeding is cheap
+        and compute() can run at its own (lower) rate
+    """
+    WINDOWS = {
+        'hann': np.hanning,
+        'hamming': np.hamming,
+        'blackman': np.blackman,
+        'rectangular': np.ones
+    }
+
+    def __init__(self, segment_size: int=256, overlap: float=0.5, averages: int=8, rate: float=1., window: str='hann'):
+        """
+            Args:
+                segment_size: samples per FFT
+                overlap: fraction of a segment shared with the previous one, in [0, 1)
+                averages: periodograms averaged into the spectrum
+                rate: sample rate [Hz]
+                window: one of WINDOWS
+        """
+        if window not in self.WINDOWS:
+            raise ValueError(f'Unknown window {window}, choose from {list(self.WINDOWS)}')
+        if not 0 <= overlap < 1:
+            raise ValueError('Overlap must be in [0, 1)')
+
+        self.segment_size = segment_size
+        self.hop = max(1, int(round(segment_size * (1 - overlap))))
+        self.averages = averages
+        self.window = self.WINDOWS[window](segment_size)
+        self.samples = RingBuffer(segment_size + averages * self.hop, ('value',))
+        self.periodograms = np.zeros((averages, segment_size // 2 + 1))
+        self.setRate(rate)
+        self.clear()
+
+    def setRate(self, rate: float):
+        """
+            Precomputes the frequency bins and the density scaling for @rate
+        """
+        self.rate = rate
+        self.frequencies = np.fft.rfftfreq(self.segment_size, d=1 / rate)
+
+        # one-sided density: every bin but DC (and Nyquist, for even sizes) counts twice
+        self.scale = np.full(self.frequencies.size, 2 / (rate * np.sum(self.window ** 2)))
+        self.scale[0] /= 2
+        if self.segment_size % 2 == 0:
+            self.scale[-1] /= 2
+
+    def feed(self, values: np.ndarray):
+        self.samples.extend(values)
+        self.count += len(values)
+
+    def restart(self):
+        """
+            Drops the samples of unfinished segments (e.g. on a gap), keeping the averaged spectrum
+        """
+        self.samples.clear()
+        self.count = 0
+        self.next_end = self.segment_size
+
+    def clear(self):
+        self.restart()
+        self.n_periodograms = 0
+        self.head = 0
+
+    def compute(self) -> int:
+        """
+            Transforms every segment completed since the last call (older ones that
+            fell out of the averaging window are skipped)
+
+            Returns:
+                The number of new periodograms
+        """
+        if self.count < self.next_end:
+            return 0
+
+        # segments older than the last @averages ones would not be part of the spectrum anyway
+        n_segments = min((self.count - self.next_end) // self.hop + 1, self.averages)
+        self.next_end += ((self.count - self.next_end) // self.hop + 1 - n_segments) * self.hop
+
+        # the buffered samples end at self.count; segments are strided views over them
+        first_start = self.next_end - self.segment_size - (self.count - len(self.samples))
+        values = self.samples.view('value')[first_start:]
+        segments = sliding_window_view(values, self.segment_size)[::self.hop][:n_segments]
+
+        # each segment's mean is removed first, or the DC offset leaks into the lowest bins
+        segments = segments - segments.mean(axis=1, keepdims=True)
+        spectra = np.fft.rfft(segments * self.window, axis=1)
+        powers = (spectra.real ** 2 + spectra.imag ** 2) * self.scale
+
+        rows = (self.head + np.arange(n_segments)) % self.averages
+        self.periodograms[rows] = powers
+        self.head = (self.head + n_segments) % self.averages
+        self.n_periodograms = min(self.n_periodograms + n_segments, self.averages)
+        self.next_end += n_segments * self.hop
+        return n_segments
+
+    @property
+    def psd(self) -> np.ndarray:
+        """
+            Returns:
+                The averaged power spectral density [V^2/Hz], zeros before the first segment
+        """
+        if not self.n_periodograms:
+            return np.zeros(self.frequencies.size)
+        return self.periodograms.sum(axis=0) / self.n_periodograms
+
+
+def welch(values: np.ndarray, rate: float, segment_size: int=256, overlap: float=0.5, window: str='hann'):
+    """
+        Batch Welch estimate over the whole signal (same segmentation, detrending and scaling as WelchSpectrum)
+
+        Returns:
+            A tuple containing the frequency bins and the power spectral density
+    """
+    hop = max(1, int(round(segment_size * (1 - overlap))))
+    n_segments = (len(values) - segment_size) // hop + 1 if len(values) >= segment_size else 0
+    spectrum = WelchSpectrum(segment_size, overlap, max(1, n_segments), rate, window)
+    spectrum.feed(values)
+    spectrum.compute()
+    return spectrum.frequencies, spectrum.psd
+
+
 def calculate_fft(data: List[Tuple[float, float]]) -> Tuple[np.ndarray, np.ndarray]:
     """
         Calculates the FFT of a list of pairs where the first element is time and the second element is voltage
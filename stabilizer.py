@@ -0,0 +1,238 @@
+import numpy as np
+
+from ringbuffer import RingBuffer
+
+######################################################################
+# Running statistics and signal stabilization detection
+######################################################################
+
+class SlidingExtreme:
+    """
+        Maximum (or minimum, with @sign -1) of the last @capacity samples, as a monotonic queue:
+        only the samples that can still become the extreme are kept, oldest first, and each
+        sample is queued and dropped at most once, so it costs O(1) amortized
+
+        Usage:
+            maximum = SlidingExtreme(1000)
+            maximum.extend(values); maximum.value
+    """
+    def __init__(self, capacity: int, sign: float=1.):
+        self.capacity = capacity
+        self.sign = sign
+        # queued samples in [head, tail): keys (-sign * value) strictly increase, so the
+        # extreme is at the head; twice the capacity leaves room to append before compacting
+        self.keys = np.empty(2 * capacity)
+        self.positions = np.empty(2 * capacity, dtype=np.int64)
+        self.head = self.tail = 0
+        self.count = 0          # samples seen
+
+    @property
+    def value(self) -> float:
+        if self.head == self.tail:
+            return -self.sign * np.inf
+        return -self.sign * self.keys[self.head]
+
+    def extend(self, values: np.ndarray):
+        keys = -self.sign * np.asarray(values, dtype=np.float64)[-self.capacity:]
+        positions = self.count + max(0, np.size(values) - self.capacity) + np.arange(keys.size)
+        self.count += np.size(values)
+        if not keys.size:
+            return
+
+        # the samples of the block no later one of it outranks, in increasing key order
+        later = np.append(np.minimum.accumulate(keys[::-1])[::-1][1:], np.inf)
+        kept = keys < later
+        keys, positions = keys[kept], positions[kept]
+
+        # queued samples the block outranks can no longer become the extreme
+        self.tail = self.head + int(np.searchsorted(self.keys[self.head:self.tail], keys[0], side='left'))
+        if self.tail + keys.size > self.keys.size:
+            size = self.tail - self.head
+            self.keys[:size] = self.keys[self.head:self.tail]
+            self.positions[:size] = self.positions[self.head:self.tail]
+            self.head, self.tail = 0, size
+        self.keys[self.tail:self.tail + keys.size] = keys
+        self.positions[self.tail:self.tail + keys.size] = positions
+        self.tail += keys.size
+
+        # and those that left the window
+        self.head += int(np.searchsorted(self.positions[self.head:self.tail], self.count - self.capacity, side='left'))
+
+    def clear(self):
+        self.head = self.tail = 0
+        self.count = 0
+
+
+class SlidingStatistics:
+    """
+        Mean, variance, min and max over the last @capacity samples, updated per block
+        instead of being recomputed over the whole window
+
+        Mean and variance follow Welford's recurrence, generalized to blocks (Chan et al.):
+        the evicted samples are subtracted and the new ones merged in O(block) time. Min
+        and max come from monotonic queues (see SlidingExtreme), so each sample costs
+        O(1) amortized whatever the window size
+    """
+    def __init__(self, capacity: int):
+        self.window = RingBuffer(capacity, ('value',))
+        self.count = 0
+        self.mean = 0.
+        self.m2 = 0.            # sum of squared deviations from the mean
+        self.minimum = SlidingExtreme(capacity, sign=-1.)
+        self.maximum = SlidingExtreme(capacity)
+        self._since_refresh = 0
+
+    def __len__(self):
+        return self.count
+
+    @property
+    def capacity(self) -> int:
+        return self.window.capacity
+
+    @property
+    def min(self) -> float:
+        return self.minimum.value
+
+    @property
+    def max(self) -> float:
+        return self.maximum.value
+
+    @property
+    def variance(self) -> float:
+        """
+            Population variance (like np.var), 0 for less than two samples
+        """
+        return self.m2 / self.count if self.count > 1 else 0.
+
+    @property
+    def std(self) -> float:
+        return self.variance ** 0.5
+
+    def append(self, value: float):
+        self.extend(np.array([value], dtype=np.float64))
+
+    def extend(self, values: np.ndarray):
+        """
+            Slides the window over a block of @values
+        """
+        values = np.asarray(values, dtype=np.float64)
+        n = values.size
+        if n == 0:
+            return
+        self.minimum.extend(values)
+        self.maximum.extend(values)
+        if n >= self.capacity:
+            self.window.clear()
+            self.window.extend(values[-self.capacity:])
+            self.refresh()
+            return
+
+        n_evicted = max(0, self.count + n - self.capacity)
+        evicted = np.array(self.window.view('value', self.count)[:n_evicted])
+        self.window.extend(values)
+
+        if n_evicted:
+            self.remove(evicted)
+        self.merge(values)
+
+        # rounding errors accumulate in the recurrences: recompute them once per window
+        self._since_refresh += n
+        if self._since_refresh >= self.capacity:
+            self.refresh()
+
+    def merge(self, values: np.ndarray):
+        n = values.size
+        mean = values.mean()
+        total = self.count + n
+        delta = mean - self.mean
+        self.m2 += ((values - mean) ** 2).sum() + delta * delta * self.count * n / total
+        self.mean += delta * n / total
+        self.count = total
+
+    def remove(self, values: np.ndarray):
+        n = values.size
+        remaining = self.count - n
+        if remaining <= 0:
+            self.count, self.mean, self.m2 = 0, 0., 0.
+            return
+        mean = values.mean()
+        rest_mean = (self.count * self.mean - n * mean) / remaining
+        delta = mean - rest_mean
+        self.m2 = max(0., self.m2 - ((values - mean) ** 2).sum() - delta * delta * remaining * n / self.count)
+        self.mean = rest_mean
+        self.count = remaining
+
+    def refresh(self):
+        """
+            Recomputes the mean and variance exactly from the window (min and max are exact)
+        """
+        window = self.window.view('value')
+        self.count = window.size
+        self.mean = window.mean() if self.count else 0.
+        self.m2 = ((window - self.mean) ** 2).sum() if self.count else 0.
+        self._since_refresh = 0
+
+    def clear(self):
+        self.window.clear()
+        self.minimum.clear()
+        self.maximum.clear()
+        self.refresh()
+
+
+class StabilityDetector:
+    """
+        Decides whether the signal is stabilized: its standard deviation over the window
+        is below a threshold
+
+        With @hysteresis, a stabilized signal only loses that state once its deviation
+        exceeds threshold * (1 + hysteresis), so it does not flicker around the threshold.
+        With @min_dwell, a new state is only taken once its condition held for that long
+    """
+    def __init__(self, window: int, threshold: float, hysteresis: float=0., min_dwell: float=0.):
+        """
+            Args:
+                window: samples the deviation is computed over
+                threshold: standard deviation [V] under which the signal is stabilized
+                hysteresis: fraction of @threshold the deviation must exceed to leave the stabilized state
+                min_dwell: seconds the condition has to hold before the state changes
+        """
+        self.statistics = SlidingStatistics(window)
+        self.threshold = threshold
+        self.hysteresis = hysteresis
+        self.min_dwell = min_dwell
+        self.stabilized = False
+        self._pending_since = None  # time the opposite condition was first seen
+
+    def update(self, times: np.ndarray, values: np.ndarray) -> bool:
+        """
+            Feeds a block of samples
+
+            Returns:
+                Whether the signal is stabilized after the block
+        """
+        self.statistics.extend(values)
+        if len(self.statistics) < 2:
+            return self.stabilized
+
+        std = self.statistics.std
+        if self.stabilized:
+            flips = std >= self.threshold * (1 + self.hysteresis)
+        else:
+            flips = std < self.threshold
+
+        if not flips:
+            self._pending_since = None
+        else:
+            now = times[-1]
+            if self._pending_since is None:
+                self._pending_since = now
+            if now - self._pending_since >= self.min_dwell:
+                self.stabilized = not self.stabilized
+                self._pending_since = None
+
+        return self.stabilized
+
+    def clear(self):
+        self.statistics.clear()
+        self.stabilized = False
+        self._pending_since = None
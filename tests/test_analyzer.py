@@ -0,0 +1,43 @@
+import numpy as np
+
+import exporter
+import iad
+from analyzer import SampleTableModel, ChainedColumn
+from test_iad import writeCapture
+
+
+def test_chained_column_slices():
+    column = ChainedColumn(np.arange(5.), np.arange(5., 8.))
+    assert len(column) == 8
+    assert np.array_equal(column[3:7], [3., 4., 5., 6.])
+    assert np.array_equal(column[:], np.arange(8.))
+    assert column[6] == 6. and column[-1] == 7.
+
+
+def test_reading_on_after_a_load_keeps_the_capture_mapped(tmp_path):
+    path = str(tmp_path / 'run.iad')
+    writeCapture(path, {'pin': 0}, np.arange(10000) / 100, np.linspace(0, 5, 10000))
+    capture = iad.Capture(path)
+
+    model = SampleTableModel()
+    model.load(capture.times, capture.voltages)
+    model.append(np.arange(10000, 10003) / 100, np.ones(3), np.full(3, 0.5), ['', 'stable', ''])
+
+    assert model.rowCount() == 10003
+    assert isinstance(model.loaded_times, np.memmap)
+    assert len(model.times) == SampleTableModel.INITIAL_CAPACITY     # the appended rows only
+    assert model.data(model.index(9999, 1)) == str(capture.voltages[9999])
+    assert model.data(model.index(10001, 3)) == 'stable'
+    assert model.data(model.index(10, 2)) == ''
+
+    export = str(tmp_path / 'run.csv')
+    exporter.exportText(export, *(model.column(name) for name in ('times', 'voltages', 'averages', 'comments')),
+                        model.comment_texts, ',')
+    with open(export) as text:
+        lines = text.read().splitlines()
+    assert len(lines) == 1 + 10003
+    assert lines[10000] == '99.990000,5,,'
+    assert lines[10002] == '100.010000,1,0.5,stable'
+
+    model.clear()
+    assert model.rowCount() == 0
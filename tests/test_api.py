@@ -0,0 +1,64 @@
+import numpy as np
+import pytest
+
+import api
+import iad
+import protocol
+import simulator
+
+
+@pytest.fixture
+def board():
+    board = simulator.SimulatedBoard(seed=1)
+    board.start()
+    yield board
+    board.stop()
+
+
+def test_simulator_round_trip(board, tmp_path):
+    path = str(tmp_path / 'run.iad')
+    with api.Session(board.port, pin=[0, 2], rate=1000) as session:
+        assert session.protocol_mode == protocol.MODE_BINARY
+        session.record(path)
+        recorded = api.concatenate(list(session.blocks(0.3)))
+        session.stop()          # and the recording
+        session.start()
+        block = api.concatenate([recorded] + list(session.blocks(0.3)))
+
+    assert len(block) > 100
+    assert block.voltages.shape == (len(block), 2)
+    assert np.all((block.voltages >= 0) & (block.voltages <= protocol.ADC_REFERENCE))
+    assert not block.lost.any()
+    # the second reading carries the time line on
+    assert np.all(np.diff(block.times) > 0)
+
+    capture = iad.Capture(path)
+    assert capture.pins == [0, 2]
+    assert np.array_equal(capture.times, recorded.times)
+    assert np.array_equal(capture.channels, recorded.voltages)
+
+
+def test_lost_samples_are_reported():
+    board = simulator.SimulatedBoard(seed=2, drop_rate=0.05, garbage_rate=0.05)
+    board.start()
+    try:
+        with api.Session(board.port, rate=1000) as session:
+            block = api.concatenate(list(session.blocks(0.5)))
+            statistics = session.statistics
+    finally:
+        board.stop()
+
+    assert block.lost.sum() == statistics.lost > 0
+    assert statistics.discarded > 0
+    assert np.all(np.diff(block.times) > 0)
+    assert block.lost.max() < 10
+
+
+def test_refuses_rates_the_link_cannot_carry(board):
+    session = api.Session(board.port, pin=list(range(protocol.ANALOG_PINS)), rate=1000).open()
+    try:
+        with pytest.raises(protocol.RateTooHighError):
+            session.start()
+        assert not session.is_streaming
+    finally:
+        session.close()
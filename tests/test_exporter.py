@@ -0,0 +1,19 @@
+import numpy as np
+
+import exporter
+
+
+def test_only_missing_averages_are_blank(tmp_path):
+    path = str(tmp_path / 'export.csv')
+    exporter.exportText(path, np.arange(3.), np.array([1.5, np.nan, 2.]), np.array([np.nan, np.nan, 1.25]),
+                        np.array([0, 1, 0]), ('', 'nan'), ',')
+    with open(path) as export:
+        lines = export.read().splitlines()
+    assert lines[1:] == ['0.000000,1.5,,', '1.000000,nan,,nan', '2.000000,2,1.25,']
+
+
+def test_without_averages(tmp_path):
+    path = str(tmp_path / 'export.txt')
+    exporter.exportText(path, np.arange(2.), np.ones(2))
+    with open(path) as export:
+        assert export.read().splitlines()[1:] == ['0.000000\t1\t\t', '1.000000\t1\t\t']
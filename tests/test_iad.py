@@ -0,0 +1,89 @@
+import numpy as np
+import pytest
+
+import iad
+
+
+def writeCapture(path, metadata: dict, times: np.ndarray, voltages: np.ndarray):
+    records = np.empty(len(times), dtype=iad.recordDtype(len(iad.capturePins(metadata))))
+    records['time'] = times
+    records['voltage'] = voltages
+    with open(path, 'wb') as capture:
+        capture.write(iad.encodeHeader(metadata))
+        capture.write(records.tobytes())
+
+
+def test_header_round_trip(tmp_path):
+    path = str(tmp_path / 'run.iad')
+    metadata = {'name': 'noisr', 'pin': 2, 'rate': 500, 'notes': ['über', '']}
+    writeCapture(path, metadata, np.arange(10) / 500, np.linspace(0, 5, 10))
+
+    read, size = iad.readHeader(path)
+    assert read == metadata
+    assert size % iad.HEADER_BLOCK == 0
+
+    capture = iad.Capture(path)
+    assert len(capture) == 10
+    assert capture.pins == [2]
+    assert np.array_equal(capture.voltages, np.linspace(0, 5, 10))
+
+
+def test_update_header_in_place(tmp_path):
+    path = str(tmp_path / 'run.iad')
+    writeCapture(path, {'pin': 0, 'notes': []}, np.arange(4.), np.ones(4))
+    iad.updateHeader(path, {'pin': 0, 'notes': ['short']})
+    metadata, size = iad.readHeader(path)
+    assert metadata['notes'] == ['short']
+    assert size == iad.HEADER_BLOCK
+
+
+def test_update_header_grows(tmp_path):
+    path = str(tmp_path / 'run.iad')
+    times, voltages = np.arange(1000) / 100, np.random.default_rng(0).uniform(0, 5, 1000)
+    writeCapture(path, {'pin': 0, 'notes': []}, times, voltages)
+
+    notes = ['x' * 3 * iad.HEADER_BLOCK]
+    iad.updateHeader(path, {'pin': 0, 'notes': notes})
+    metadata, size = iad.readHeader(path)
+    assert metadata['notes'] == notes
+    assert size > iad.HEADER_BLOCK and size % iad.HEADER_BLOCK == 0
+
+    capture = iad.Capture(path)
+    assert np.array_equal(capture.times, times)
+    assert np.array_equal(capture.voltages, voltages)
+
+
+def test_rejects_other_files(tmp_path):
+    path = str(tmp_path / 'run.iad')
+    with open(path, 'wb') as capture:
+        capture.write(b'not a capture at all')
+    with pytest.raises(iad.InvalidCaptureError):
+        iad.readHeader(path)
+
+
+def test_runs_of_older_captures(tmp_path):
+    path = str(tmp_path / 'run.iad')
+    times = np.concatenate((np.arange(5), np.arange(3))) / 10
+    writeCapture(path, {'pin': 0, 'rate': 10}, times, np.zeros(8))
+
+    capture = iad.Capture(path)
+    assert np.array_equal(capture.runs, [0, 5])
+    assert np.allclose(capture.continuousTimes(), np.arange(8) / 10)
+    assert capture.sampleAt(0.6) == 6
+
+
+def test_append_capture(tmp_path):
+    first, second = str(tmp_path / 'first.iad'), str(tmp_path / 'second.iad')
+    writeCapture(first, {'pins': [0, 1]}, np.arange(3.), np.ones((3, 2)))
+    writeCapture(second, {'pins': [0, 1]}, np.arange(3., 5.), np.zeros((2, 2)))
+    with open(second, 'ab') as capture:
+        capture.write(b'\x00' * 5)      # part of a record
+
+    iad.appendCapture(first, second)
+    capture = iad.Capture(first)
+    assert np.array_equal(capture.times, np.arange(5.))
+    assert np.array_equal(capture.channels[3:], np.zeros((2, 2)))
+
+    writeCapture(second, {'pins': [0]}, np.arange(2.), np.zeros(2))
+    with pytest.raises(iad.InvalidCaptureError):
+        iad.appendCapture(first, second)
@@ -0,0 +1,65 @@
+import numpy as np
+import pytest
+
+import numeric
+
+# first 100 bits of the binary expansion of pi, as used by the SP 800-22 examples
+PI_100 = '1100100100001111110110101010001000100001011010001100001000110100110001001100011001100010100010111000'
+
+
+def bits(text: str) -> np.ndarray:
+    return np.frombuffer(text.encode(), dtype=np.uint8) - ord('0')
+
+
+# SP 800-22 rev. 1a worked examples (sections 2.x.4 and 2.x.8)
+@pytest.mark.parametrize('test, sequence, kwargs, expected', [
+    (numeric.frequency, '1011010101', {}, 0.527089),
+    (numeric.frequency, PI_100, {}, 0.109599),
+    (numeric.blockFrequency, '0110011010', {'block_size': 3}, 0.801252),
+    (numeric.blockFrequency, PI_100, {'block_size': 10}, 0.706438),
+    (numeric.runs, '1001101011', {}, 0.147232),
+    (numeric.runs, PI_100, {}, 0.500798),
+    (numeric.approximateEntropy, '0100110101', {'m': 3}, 0.261961),
+    (numeric.approximateEntropy, PI_100, {'m': 2}, 0.235301),
+])
+def test_worked_examples(test, sequence, kwargs, expected):
+    assert test(bits(sequence), **kwargs) == pytest.approx(expected, abs=1e-6)
+
+
+def test_longest_run_example():
+    sequence = '11001100000101010110110001001100111000000000001001001101010100010001' \
+               '001111010110100000001101011111001100111001101101100010110010'
+    # the example rounds its intermediate chi-squared
+    assert numeric.longestRun(bits(sequence)) == pytest.approx(0.180609, abs=2e-5)
+
+
+def test_serial_example():
+    assert numeric.serial(bits('0011011101'), m=3) == pytest.approx((0.808792, 0.670320), abs=1e-6)
+
+
+def test_cumulative_sums_examples():
+    # the 10-bit example reads the normal distribution off a table
+    assert numeric.cumulativeSums(bits('1011010111'))[0] == pytest.approx(0.4116588, abs=1e-4)
+    assert numeric.cumulativeSums(bits(PI_100)) == pytest.approx((0.219194, 0.114866), abs=1e-6)
+
+
+def test_spectral_detects_periodic_sequences():
+    # the section 2.6.8 example counts 4 peaks under the threshold where its own moduli give 5,
+    # so the test is checked on its behaviour instead
+    random_bits = np.random.default_rng(0).integers(0, 2, 1 << 14, dtype=np.uint8)
+    periodic = np.tile(bits('1101000'), (1 << 14) // 7)
+    assert numeric.spectral(random_bits) >= numeric.ALPHA
+    assert numeric.spectral(periodic) < numeric.ALPHA
+
+
+def test_battery_passes_random_bits():
+    data = np.random.default_rng(3).integers(0, 256, 1 << 15, dtype=np.uint8)
+    results = numeric.binary_tests(data)
+    assert set(results) == set(numeric.TESTS)
+    assert sum(result['passed'] for result in results.values()) >= len(results) - 1
+
+
+def test_battery_fails_constant_bits():
+    results = numeric.binary_tests(np.zeros(1 << 12, dtype=np.uint8))
+    assert not results['frequency']['passed']
+    assert not results['runs']['passed']
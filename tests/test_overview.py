@@ -0,0 +1,66 @@
+import os
+import numpy as np
+
+from iad import Capture
+from overview import Overview, OverviewBuilder, overviewPath, FIRST_LEVEL
+from test_iad import writeCapture
+
+
+def levels(path: str) -> list:
+    return [open(os.path.join(path, name), 'rb').read() for name in sorted(os.listdir(path))]
+
+
+def test_incremental_matches_batch(tmp_path):
+    rng = np.random.default_rng(1)
+    n = 1000 * (1 << FIRST_LEVEL) + 7
+    times, voltages = np.arange(n) / 1000, rng.normal(1.4, 0.5, (n, 2))
+    path = str(tmp_path / 'run.iad')
+    writeCapture(path, {'pins': [0, 1]}, times, voltages)
+
+    incremental = Overview(str(tmp_path / 'incremental'), channels=2)
+    start = 0
+    for size in rng.integers(1, 3000, 100):
+        incremental.append(times[start:start + size], voltages[start:start + size])
+        start += size
+    incremental.append(times[start:], voltages[start:])
+    incremental.close()
+
+    batch = Overview.build(Capture(path), chunk=4096)
+    assert incremental.counts == batch.counts
+    assert levels(incremental.path) == levels(batch.path)
+
+    level = batch.level(0)
+    assert np.array_equal(level['min'][:, 1], voltages[:len(level) << FIRST_LEVEL, 1].reshape(len(level), -1).min(axis=1))
+
+
+def test_resumes_a_growing_capture(tmp_path):
+    rng = np.random.default_rng(2)
+    n = 5000
+    times, voltages = np.arange(n) / 100, rng.uniform(0, 5, n)
+    path = str(tmp_path / 'run.iad')
+    writeCapture(path, {'pin': 0}, times[:1234], voltages[:1234])
+    Overview.build(Capture(path))
+
+    with open(path, 'ab') as capture:
+        records = np.empty(n - 1234, dtype=Capture(path).records.dtype)
+        records['time'], records['voltage'] = times[1234:], voltages[1234:]
+        capture.write(records.tobytes())
+    resumed = Overview.build(Capture(path))
+
+    fresh_path = str(tmp_path / 'fresh.iad')
+    writeCapture(fresh_path, {'pin': 0}, times, voltages)
+    fresh = Overview.build(Capture(fresh_path))
+    assert resumed.counts == fresh.counts
+    assert levels(resumed.path) == levels(fresh.path)
+
+
+def test_builder_catches_up(tmp_path):
+    path = str(tmp_path / 'run.iad')
+    writeCapture(path, {'pin': 0}, np.arange(4096.), np.zeros(4096))
+    builder = OverviewBuilder(path)
+    builder.start()
+    builder.finish()
+    builder.join()
+    assert builder.error is None
+    assert builder.overview.counts[0] == 4096 >> FIRST_LEVEL
+    assert os.path.isdir(overviewPath(path))
@@ -0,0 +1,101 @@
+import numpy as np
+import pytest
+
+from protocol import (
+    FrameDecoder, CONTROLS, MODE_BINARY, BAUDRATE, DEFAULT_RATE, ANALOG_PINS, RateTooHighError, maxRate, startStream
+)
+from simulator import encodeFrames
+
+
+def frames(counts: np.ndarray, first_sequence: int=0) -> bytes:
+    return encodeFrames(first_sequence, counts).tobytes()
+
+
+def decodeAll(decoder: FrameDecoder, data: bytes, chunk: int=None):
+    chunk = chunk or len(data)
+    blocks = [decoder.feed(data[i:i + chunk]) for i in range(0, len(data), chunk)]
+    return np.concatenate([indices for indices, _ in blocks]), np.concatenate([counts for _, counts in blocks])
+
+
+def test_decodes_clean_frames():
+    counts = np.arange(100, dtype=np.uint16) * 10
+    indices, decoded = decodeAll(FrameDecoder(), frames(counts))
+    assert np.array_equal(indices, np.arange(100))
+    assert np.array_equal(decoded, counts)
+
+
+def test_frames_split_across_reads():
+    counts = np.arange(50, dtype=np.uint16)
+    indices, decoded = decodeAll(FrameDecoder(), frames(counts), chunk=1)
+    assert np.array_equal(indices, np.arange(50))
+    assert np.array_equal(decoded, counts)
+
+
+def test_resyncs_on_garbage():
+    counts = np.arange(30, dtype=np.uint16) + 500
+    raw = encodeFrames(0, counts)
+    garbage = CONTROLS['SYNC'] + b'\x00' + CONTROLS['SYNC'] + b'\xff\x16\x03\x07'
+    data = raw[:10].tobytes() + garbage + raw[10:20].tobytes() + garbage[:3] + raw[20:].tobytes()
+
+    decoder = FrameDecoder()
+    indices, decoded = decodeAll(decoder, data)
+    assert np.array_equal(indices, np.arange(30))
+    assert np.array_equal(decoded, counts)
+    assert decoder.statistics.discarded == len(garbage) + 3
+
+
+def test_resyncs_on_dropped_bytes():
+    counts = np.arange(40, dtype=np.uint16) + 200
+    raw = encodeFrames(0, counts)
+    size = raw.shape[1]
+    data = raw.tobytes()
+    # frames 5 and 17 lose a byte each
+    data = data[:5 * size + 2] + data[5 * size + 3:17 * size + 4 - 1] + data[17 * size + 4:]
+
+    indices, decoded = decodeAll(FrameDecoder(), data, chunk=7)
+    expected = np.setdiff1d(np.arange(40), [5, 17])
+    assert np.array_equal(indices, expected)
+    assert np.array_equal(decoded, counts[expected])
+
+
+def test_misaligned_frames_never_shift_the_indices():
+    rng = np.random.default_rng(4)
+    counts = rng.integers(0, 1024, 20000).astype(np.uint16)
+    raw = encodeFrames(0, counts)
+    keep = np.ones(raw.shape, dtype=bool)
+    dropped = np.flatnonzero(rng.random(len(raw)) < 0.05)
+    keep[dropped, rng.integers(0, raw.shape[1], dropped.size)] = False
+    data = b''.join(frame[kept].tobytes() for frame, kept in zip(raw, keep))
+
+    indices, decoded = decodeAll(FrameDecoder(), data, chunk=4096)
+    assert np.all(np.diff(indices) > 0)
+    assert indices[-1] < len(counts)
+    assert np.count_nonzero(counts[indices] != decoded) <= 1
+
+
+def test_sequence_wraps_around():
+    counts = np.arange(40, dtype=np.uint16)
+    data = frames(counts[:16], 0xFFF0) + frames(counts[16:], 0)
+    indices, decoded = decodeAll(FrameDecoder(), data, chunk=25)
+    assert np.all(np.diff(indices) == 1)
+    assert np.array_equal(decoded, counts)
+
+
+class Link:
+    def __init__(self, baudrate: int):
+        self.baudrate = baudrate
+        self.written = b''
+
+    def write(self, data: bytes):
+        self.written += data
+
+
+def test_rate_limited_by_the_baud_rate():
+    assert maxRate(115200) == 1920
+    assert maxRate(115200, 6) == 720
+    assert maxRate(BAUDRATE, ANALOG_PINS) >= DEFAULT_RATE
+
+    link = Link(9600)
+    with pytest.raises(RateTooHighError):
+        startStream(link, 0, 1000, MODE_BINARY)
+    assert link.written == b''
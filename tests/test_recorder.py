@@ -0,0 +1,37 @@
+import os
+import numpy as np
+import pytest
+
+import iad
+from recorder import Recorder
+
+
+def record(path: str, metadata: dict, times: np.ndarray, voltages: np.ndarray):
+    recorder = Recorder(path, metadata, overview=False)
+    recorder.start()
+    recorder.write(times, voltages)
+    recorder.stop()
+    assert recorder.error is None
+
+
+def test_appends_readings_of_the_same_pins(tmp_path):
+    path = str(tmp_path / 'run.iad')
+    record(path, {'pins': [0, 1], 'rate': 100}, np.arange(5) / 100, np.ones((5, 2)))
+    record(path, {'pins': [0, 1], 'rate': 100}, np.arange(5, 8) / 100, np.zeros((3, 2)))
+
+    capture = iad.Capture(path)
+    assert np.allclose(capture.times, np.arange(8) / 100)
+    assert np.array_equal(capture.channels[5:], np.zeros((3, 2)))
+
+
+@pytest.mark.parametrize('metadata', [{'pins': [0, 1], 'rate': 100}, {'pins': [0], 'rate': 200}])
+def test_refuses_other_pins_or_rate(tmp_path, metadata):
+    path = str(tmp_path / 'run.iad')
+    record(path, {'pins': [0], 'rate': 100}, np.arange(5) / 100, np.ones(5))
+    size = os.path.getsize(path)
+
+    assert not iad.appendable(path, metadata)
+    with pytest.raises(iad.InvalidCaptureError):
+        Recorder(path, metadata)
+    assert os.path.getsize(path) == size
+    assert iad.Capture(path).pins == [0]
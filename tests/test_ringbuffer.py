@@ -0,0 +1,36 @@
+import numpy as np
+import pytest
+
+from ringbuffer import RingBuffer
+
+
+def test_extend_across_the_wrap():
+    buffer = RingBuffer(5, ('value',))
+    buffer.extend(np.arange(3.))
+    buffer.extend(np.arange(3., 7.))    # wraps past the end of the first half
+    assert np.array_equal(buffer.view('value'), np.arange(2., 7.))
+    assert buffer.first('value') == 2. and buffer.last('value') == 6.
+    assert np.array_equal(buffer.view('value', 2), [5., 6.])
+
+
+def test_extend_matches_the_last_samples():
+    rng = np.random.default_rng(0)
+    buffer = RingBuffer(17, ('time', 'value'))
+    times = np.empty(0)
+    for n in rng.integers(0, 40, 200):
+        block = np.arange(times.size, times.size + n, dtype=np.float64)
+        buffer.extend(block, -block)
+        times = np.concatenate((times, block))
+        assert np.array_equal(buffer.view('time'), times[-17:])
+        assert np.array_equal(buffer.view('value'), -times[-17:])
+
+
+def test_append_and_clear():
+    buffer = RingBuffer(3, ('value',))
+    for value in range(5):
+        buffer.append(float(value))
+    assert np.array_equal(buffer.view('value'), [2., 3., 4.])
+    buffer.clear()
+    assert not buffer
+    with pytest.raises(IndexError):
+        buffer.last('value')
@@ -0,0 +1,87 @@
+import numpy as np
+import pytest
+
+from sonic import MovingAverage, WelchSpectrum, welch
+
+FIR_METHODS = ('simple', 'cumulative', 'weighted', 'exponential', 'triangular', 'bartlett')
+
+
+def blocks(values: np.ndarray, seed: int=0):
+    sizes = np.random.default_rng(seed).integers(0, 300, len(values))
+    bounds = np.concatenate(([0], np.cumsum(sizes)))
+    bounds = bounds[bounds < len(values)]
+    return np.split(values, bounds[1:])
+
+
+@pytest.mark.parametrize('method', FIR_METHODS)
+@pytest.mark.parametrize('window_size', [2, 5, 32])
+def test_streaming_matches_batch(method, window_size):
+    values = np.random.default_rng(1).normal(1.4, 0.5, 5000)
+    stream = MovingAverage.Stream(window_size, method)
+    streamed = np.concatenate([stream.update(block) for block in blocks(values)])
+
+    assert np.all(np.isnan(streamed[:window_size - 1]))
+    assert np.allclose(streamed[window_size - 1:], MovingAverage(values, window_size)(method), rtol=1e-9, atol=1e-12)
+
+
+def test_running_sum_stays_exact_over_long_streams():
+    values = np.random.default_rng(2).normal(1e3, 1., 3 * MovingAverage.Stream.RESYNC_SAMPLES)
+    stream = MovingAverage.Stream(64, 'simple')
+    streamed = np.concatenate([stream.update(block) for block in np.array_split(values, 1000)])
+    assert np.allclose(streamed[63:], MovingAverage.simple(values, 64), rtol=1e-12)
+
+
+@pytest.mark.parametrize('window_size', [1, 4, 50, 5000])
+def test_streaming_recursive_matches_the_recurrence(window_size):
+    values = np.random.default_rng(3).uniform(0, 5, 4000)
+    alpha = 2 / (window_size + 1)
+    expected = np.empty_like(values)
+    average = values[0]
+    for i, value in enumerate(values):
+        average = expected[i] = average + alpha * (value - average)
+
+    stream = MovingAverage.Stream(window_size, 'recursive')
+    streamed = np.concatenate([stream.update(block) for block in blocks(values, 4)])
+    assert np.allclose(streamed, expected, rtol=1e-9)
+    assert np.allclose(MovingAverage.recursive(values, window_size), expected, rtol=1e-9)
+
+
+def referenceWelch(values: np.ndarray, rate: float, segment_size: int, hop: int) -> np.ndarray:
+    window = np.hanning(segment_size)
+    periodograms = []
+    for start in range(0, len(values) - segment_size + 1, hop):
+        segment = values[start:start + segment_size]
+        spectrum = np.abs(np.fft.rfft((segment - segment.mean()) * window)) ** 2 / (rate * np.sum(window ** 2))
+        spectrum[1:-1] *= 2
+        periodograms.append(spectrum)
+    return np.mean(periodograms, axis=0)
+
+
+def test_welch_spectrum_fed_in_blocks():
+    rng = np.random.default_rng(5)
+    rate = 1000.
+    times = np.arange(20000) / rate
+    values = np.sin(2 * np.pi * 125 * times) + rng.normal(0, 0.3, times.size)
+
+    spectrum = WelchSpectrum(256, 0.5, averages=1000, rate=rate)
+    for block in blocks(values, 6):
+        spectrum.feed(block)
+        spectrum.compute()
+    frequencies, psd = welch(values, rate, 256, 0.5)
+
+    assert np.array_equal(spectrum.frequencies, frequencies)
+    assert np.allclose(spectrum.psd, psd, rtol=1e-9)
+    assert np.allclose(psd, referenceWelch(values, rate, 256, 128), rtol=1e-9)
+    assert frequencies[np.argmax(psd)] == pytest.approx(125, abs=rate / 256)
+
+
+def test_welch_spectrum_averages_the_last_segments():
+    values = np.random.default_rng(7).normal(0, 1, 10000)
+    spectrum = WelchSpectrum(128, 0.5, averages=8, rate=100.)
+    for block in blocks(values, 8):
+        spectrum.feed(block)
+        spectrum.compute()
+
+    # the last 8 segments, hop 64, end at the last complete segment
+    end = (len(values) - 128) // 64 * 64 + 128
+    assert np.allclose(spectrum.psd, referenceWelch(values[end - 128 - 7 * 64:end], 100., 128, 64), rtol=1e-9)
@@ -0,0 +1,76 @@
+import os
+import asyncio
+import serial
+
+######################################################################
+# asyncio serial transport
+#
+# Instead of a thread blocking on each port, the event loop watches the
+# port file descriptors (loop.add_reader) and decodes whatever arrived, so
+# one thread serves any number of boards with a wakeup per burst of bytes:
+#
+#   transport = SerialTransport(session.connection, session.reader, onSamples)
+#   transport.start()       # from a coroutine, on the running loop
+######################################################################
+
+class SerialTransport:
+    """
+        Feeds a protocol.SampleReader from the event loop, without ever waiting on the port
+    """
+    def __init__(self, connection: serial.Serial, reader, on_samples, on_error=None, loop=None):
+        """
+            Args:
+                connection: open serial port, already streaming
+                reader: protocol.SampleReader decoding the stream
+                on_samples: called with (times, voltages, lost) for every non-empty block
+                on_error: called with the exception when the port fails (the transport is closed)
+                loop: event loop (the running one by default)
+        """
+        self.connection = connection
+        self.reader = reader
+        self.on_samples = on_samples
+        self.on_error = on_error
+        self.loop = loop or asyncio.get_running_loop()
+        self.fd = None
+        self.error = None
+
+    def start(self):
+        self.connection.timeout = 0     # reads return whatever is there
+        self.fd = self.connection.fileno()
+        self.loop.add_reader(self.fd, self.onReadable)
+
+    def close(self):
+        if self.fd is not None:
+            self.loop.remove_reader(self.fd)
+            self.fd = None
+
+    @property
+    def is_open(self) -> bool:
+        return self.fd is not None
+
+    def onReadable(self):
+        try:
+            data = self.connection.read(max(1, self.connection.in_waiting))
+            if not data:    # readable but empty: the device is gone
+                raise serial.SerialException('Device disconnected')
+        except (OSError, serial.SerialException) as error:
+            self.error = error
+            self.close()
+            if self.on_error:
+                self.on_error(error)
+            return
+
+        times, voltages, lost = self.reader.feed(data)
+        if len(times):
+            self.on_samples(times, voltages, lost)
+
+
+def supported(connection, loop) -> bool:
+    """
+        Returns:
+            Whether @connection can be watched by the event loop (POSIX ports with selector
+            based loops; Windows ports and proactor loops fall back to threads)
+    """
+    if os.name != 'posix' or not hasattr(connection, 'fileno'):
+        return False
+    return not isinstance(loop, getattr(asyncio, 'ProactorEventLoop', ()))